@@ -10,10 +10,10 @@ from vecgl.viewer import show, show_interactively
 # Get a predefined sphere model and choose nice colors.
 # The sphere will span from -1.0 to 1.0 in all dimensions.
 sphere = get_sphere_model(16, 32, "lightblue", "black")
-simple_sphere = get_sphere_model(4, 8, "lightblue", "black")
 
-# Look at the model interactively.
-show_interactively(sphere, simple_model=simple_sphere)
+# Look at the model interactively. A simplified preview is generated
+# automatically and shown while the camera moves.
+show_interactively(sphere)
 
 # Define the view and the projection transforms.
 view_mat4 = mul_mat4(
@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+from functools import partial
+from mmap import ACCESS_READ, mmap
+from multiprocessing import Pool, cpu_count
+from os import close, remove
+from tempfile import mkstemp
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from vecgl.bb3tree import FlatBB3Tree
+from vecgl.camera import get_orbit_camera_mat4s
+from vecgl.export import read_binary, write_binary, write_model
+from vecgl.linalg import Mat4
+from vecgl.model import AnyModel, Model
+from vecgl.rendering import create_flat_triangle_tree, render, render_part
+
+# The model and, if any, the triangle tree shared by all tasks that a worker
+# process runs.
+_worker_model: Optional[AnyModel] = None
+_worker_triangle_tree: Optional[FlatBB3Tree] = None
+
+
+def _init_worker(model_path: str, tree_path: Optional[str] = None) -> None:
+    global _worker_model, _worker_triangle_tree
+
+    # The shared files were written by the parent process and are trusted.
+    _worker_model = read_binary(model_path, validate=False)
+    if tree_path is not None:
+        with open(tree_path, "rb") as fin:
+            _worker_triangle_tree = FlatBB3Tree(
+                mmap(fin.fileno(), 0, access=ACCESS_READ))
+
+
+@contextmanager
+def _share_file(suffix: str, write_fn: Callable[[str], None]) -> Iterator[str]:
+
+    # Share data with the workers through a temporary file rather than pickling
+    # it per task. Workers map the file into memory without copying it.
+    fd, path = mkstemp(suffix=suffix)
+    close(fd)
+    try:
+        write_fn(path)
+        yield path
+    finally:
+        remove(path)
+
+
+def _write_bytes(data: bytes, path: str) -> None:
+    with open(path, "wb") as fout:
+        fout.write(data)
+
+
+def _render_frame(task: Tuple[Mat4, str]) -> str:
+    U, path = task
+    assert _worker_model is not None
+    write_model(render(_worker_model.transform(U)), path)
+    return path
+
+
+def _render_part(task: Tuple[int, int]) -> Model:
+    part, num_parts = task
+    assert _worker_model is not None
+    return render_part(_worker_model, part, num_parts, _worker_triangle_tree)
+
+
+def get_frame_paths(path_pattern: str, num_frames: int) -> List[str]:
+
+    # Number the frames, e.g. "frame-{frame:03d}.svg".
+    return [path_pattern.format(frame=i) for i in range(num_frames)]
+
+
+def render_frames(model: AnyModel,
+                  Us: Sequence[Mat4],
+                  path_pattern: str,
+                  num_workers: Optional[int] = None) -> List[str]:
+    paths = get_frame_paths(path_pattern, len(Us))
+    tasks = list(zip(Us, paths))
+
+    # Render in this process if no parallelism is requested.
+    if num_workers == 1 or len(tasks) <= 1:
+        for U, path in tasks:
+            write_model(render(model.transform(U)), path)
+        return paths
+
+    with _share_file(".vglm", partial(write_binary, model)) as model_path:
+        with Pool(num_workers, _init_worker, (model_path, )) as pool:
+            return pool.map(_render_frame, tasks, chunksize=1)
+
+
+def render_orbit(model: AnyModel,
+                 num_frames: int,
+                 path_pattern: str,
+                 num_workers: Optional[int] = None,
+                 aspect: float = 1.0,
+                 vrotate: float = 0.0,
+                 zoom: float = 6.0,
+                 perspective: bool = True) -> List[str]:
+    Us = get_orbit_camera_mat4s(num_frames, aspect, vrotate, zoom, perspective)
+    return render_frames(model, Us, path_pattern, num_workers)
+
+
+def render_in_parallel(model: AnyModel,
+                       num_workers: Optional[int] = None) -> Model:
+
+    # Render a single frame with its lines split across the workers.
+    num_parts = num_workers or cpu_count()
+    if num_parts == 1:
+        return render(model)
+    with _share_file(".vglm", partial(write_binary, model)) as model_path:
+
+        # Build the triangle tree only once and share it as a flat tree. It is
+        # built from the shared model, so that its triangle indices match
+        # those of the workers.
+        tree = create_flat_triangle_tree(
+            read_binary(model_path, validate=False))
+        with _share_file(".vb3t", partial(_write_bytes,
+                                          tree.tobytes())) as tree_path:
+            with Pool(num_parts, _init_worker,
+                      (model_path, tree_path)) as pool:
+                parts = pool.map(_render_part,
+                                 [(i, num_parts) for i in range(num_parts)])
+    rendered = Model()
+    for part in parts:
+        rendered.add_model(part)
+    return rendered
@@ -1,6 +1,10 @@
+from array import array
+from math import inf
+from struct import Struct
+from sys import byteorder
 from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
 
-from vecgl.linalg import Vec3, max_vec3, min_vec3
+from vecgl.linalg import Vec2, Vec3, max_vec3, min_vec3
 
 
 class BoundingBox3:
@@ -53,6 +57,36 @@ class BB3Tree:
         if self.rhs is not None:
             yield from self.rhs.find(query)
 
+    def find_in_front(self,
+                      footprint_xy: Tuple[Vec2, Vec2],
+                      max_z: float,
+                      min_z: float = -inf) -> Iterator[Any]:
+        (lb_x, lb_y), (ub_x, ub_y) = footprint_xy
+
+        # Traverse the tree in the same order as `find` but without allocating
+        # intermediate bounding boxes. Subtrees that lie entirely behind `max_z`
+        # (or in front of `min_z`) are pruned based on their z-bounds alone.
+        stack: List[BB3Tree] = [self]
+        while stack:
+            node = stack.pop()
+            bbox = node.bbox
+            if bbox is None:
+                continue
+            node_lb_x, node_lb_y, node_lb_z = bbox.lb
+            node_ub_x, node_ub_y, node_ub_z = bbox.ub
+            if node_lb_z > max_z or node_ub_z < min_z:
+                continue
+            if node_lb_x > ub_x or node_ub_x < lb_x:
+                continue
+            if node_lb_y > ub_y or node_ub_y < lb_y:
+                continue
+            if node.elem is not None:
+                yield node.elem
+            if node.rhs is not None:
+                stack.append(node.rhs)
+            if node.lhs is not None:
+                stack.append(node.lhs)
+
 
 def _create_bb3tree_recusrively(pairs: List[Tuple[BoundingBox3, Any]],
                                 split_dim: int) -> BB3Tree:
@@ -89,3 +123,150 @@ def create_bb3tree(elems: Iterable[Any], fn_bbox3: Callable[[Any],
     pairs = [(fn_bbox3(e), e) for e in elems]
     initial_split_dim = 0
     return _create_bb3tree_recusrively(pairs, initial_split_dim)
+
+
+# Flat bounding box trees.
+#
+# A flat tree stores the nodes of a `BB3Tree` in pre-order in two typed
+# little-endian arrays: 6 float64 bounds (lb and ub) and 3 int32 links (lhs,
+# rhs, and element index) per node. Absent links are encoded as -1. Elements are
+# referred to by their index, e.g. into the sequence that the tree was created
+# from. The buffer layout is
+#   header: magic, version, number of nodes, reserved (16 bytes),
+#   bounds: 6 * num_nodes float64,
+#   links:  3 * num_nodes int32.
+
+kFlatBB3TreeMagic = b"VB3T"
+kFlatBB3TreeVersion = 1
+
+_kFlatBB3TreeHeader = Struct("<4sIII")
+
+
+class FlatBB3Tree:
+
+    def __init__(self, buffer: Any):
+
+        # Parse and validate the header.
+        view = memoryview(buffer).cast("B")
+        header_size = _kFlatBB3TreeHeader.size
+        if len(view) < header_size:
+            raise ValueError("buffer too small for a flat bb3tree")
+        magic, version, num_nodes, _ = _kFlatBB3TreeHeader.unpack_from(view)
+        if magic != kFlatBB3TreeMagic:
+            raise ValueError("not a flat bb3tree")
+        if version != kFlatBB3TreeVersion:
+            raise ValueError(f"unsupported flat bb3tree version {version}")
+        bounds_size = 6 * 8 * num_nodes
+        links_size = 3 * 4 * num_nodes
+        nbytes = header_size + bounds_size + links_size
+        if len(view) < nbytes:
+            raise ValueError("buffer too small for a flat bb3tree")
+
+        # Refer to the arrays without copying them, if possible.
+        self.num_nodes = num_nodes
+        self.nbytes = nbytes
+        self._view = view[:nbytes]
+        bounds_view = self._view[header_size:header_size + bounds_size]
+        links_view = self._view[header_size + bounds_size:]
+        if byteorder == "little":
+            self._bounds = bounds_view.cast("d")
+            self._links = links_view.cast("i")
+        else:
+            self._bounds = array("d", bounds_view.tobytes())
+            self._bounds.byteswap()
+            self._links = array("i", links_view.tobytes())
+            self._links.byteswap()
+
+    def tobytes(self) -> bytes:
+        return self._view.tobytes()
+
+    def release(self) -> None:
+
+        # Release the views so that the underlying buffer, e.g. an `mmap` or a
+        # `SharedMemory`, can be closed.
+        for view in (self._bounds, self._links, self._view):
+            if isinstance(view, memoryview):
+                view.release()
+
+    def __reduce__(self):
+        return FlatBB3Tree, (self.tobytes(), )
+
+    def find(self, query: BoundingBox3) -> Iterator[int]:
+        lb_x, lb_y, lb_z = query.lb
+        ub_x, ub_y, ub_z = query.ub
+        yield from self._find(lb_x, lb_y, lb_z, ub_x, ub_y, ub_z)
+
+    def find_in_front(self,
+                      footprint_xy: Tuple[Vec2, Vec2],
+                      max_z: float,
+                      min_z: float = -inf) -> Iterator[int]:
+        (lb_x, lb_y), (ub_x, ub_y) = footprint_xy
+        yield from self._find(lb_x, lb_y, min_z, ub_x, ub_y, max_z)
+
+    def _find(self, lb_x: float, lb_y: float, lb_z: float, ub_x: float,
+              ub_y: float, ub_z: float) -> Iterator[int]:
+        if self.num_nodes == 0:
+            return
+        bounds = self._bounds
+        links = self._links
+
+        # Traverse in pre-order just like `BB3Tree.find`.
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            b = 6 * i
+            if bounds[b + 2] > ub_z or bounds[b + 5] < lb_z:
+                continue
+            if bounds[b] > ub_x or bounds[b + 3] < lb_x:
+                continue
+            if bounds[b + 1] > ub_y or bounds[b + 4] < lb_y:
+                continue
+            l = 3 * i
+            lhs, rhs, elem = links[l], links[l + 1], links[l + 2]
+            if elem >= 0:
+                yield elem
+            if rhs >= 0:
+                stack.append(rhs)
+            if lhs >= 0:
+                stack.append(lhs)
+
+
+def flatten_bb3tree(tree: BB3Tree, fn_index: Callable[[Any],
+                                                      int]) -> FlatBB3Tree:
+    bounds = array("d")
+    links = array("i")
+
+    # Number the nodes in pre-order and fill in the child links once they are
+    # known.
+    def flatten_recursively(node: BB3Tree) -> int:
+        assert node.bbox is not None
+        i = len(links) // 3
+        bounds.extend(node.bbox.lb)
+        bounds.extend(node.bbox.ub)
+        elem = -1 if node.elem is None else fn_index(node.elem)
+        links.extend((-1, -1, elem))
+        if node.lhs is not None:
+            links[3 * i] = flatten_recursively(node.lhs)
+        if node.rhs is not None:
+            links[3 * i + 1] = flatten_recursively(node.rhs)
+        return i
+
+    if tree.bbox is not None:
+        flatten_recursively(tree)
+
+    # Serialize as little-endian.
+    if byteorder != "little":
+        bounds.byteswap()
+        links.byteswap()
+    num_nodes = len(links) // 3
+    header = _kFlatBB3TreeHeader.pack(kFlatBB3TreeMagic, kFlatBB3TreeVersion,
+                                      num_nodes, 0)
+    return FlatBB3Tree(header + bounds.tobytes() + links.tobytes())
+
+
+def create_flat_bb3tree(
+        elems: Iterable[Any], fn_bbox3: Callable[[Any],
+                                                 BoundingBox3]) -> FlatBB3Tree:
+    bboxes = [fn_bbox3(e) for e in elems]
+    tree = create_bb3tree(range(len(bboxes)), lambda i: bboxes[i])
+    return flatten_bb3tree(tree, lambda i: i)
@@ -0,0 +1,79 @@
+from math import pi
+from typing import List
+
+from vecgl.linalg import (Mat4, get_frustum_mat4, get_lrbt_from_aspect,
+                          get_ortho_mat4, get_rotate_x_mat4, get_rotate_y_mat4,
+                          get_translate_mat4, mul_mat4)
+
+# Orbit cameras look at the origin. The camera state is given by a horizontal
+# and vertical rotation, where 1.0 corresponds to a quarter turn, and a zoom
+# level.
+
+kDefaultFov = 1.0
+kDefaultPerspectiveNear = 1.0
+kDefaultPerspectiveFar = 100.0
+kDefaultOrthoNear = -100.0
+kDefaultOrthoFar = 100.0
+
+
+def get_perspective_camera_mat4(aspect: float,
+                                hrotate: float,
+                                vrotate: float,
+                                zoom: float,
+                                fov: float = kDefaultFov,
+                                n: float = kDefaultPerspectiveNear,
+                                f: float = kDefaultPerspectiveFar) -> Mat4:
+
+    # Perspective projection.
+    l, r, b, t = get_lrbt_from_aspect(aspect, a=fov * n)
+    projection = get_frustum_mat4(l, r, b, t, n, f)
+
+    # View transform.
+    ax = 0.5 * pi * vrotate
+    ay = -0.5 * pi * hrotate
+    tz = -n - 1.1**zoom
+    view = mul_mat4(get_translate_mat4(0.0, 0.0, tz), get_rotate_x_mat4(ax),
+                    get_rotate_y_mat4(ay))
+
+    return mul_mat4(projection, view)
+
+
+def get_ortho_camera_mat4(aspect: float,
+                          hrotate: float,
+                          vrotate: float,
+                          zoom: float,
+                          n: float = kDefaultOrthoNear,
+                          f: float = kDefaultOrthoFar) -> Mat4:
+
+    # Orthogonal projection.
+    a = 1.1**zoom
+    l, r, b, t = get_lrbt_from_aspect(aspect, a)
+    projection = get_ortho_mat4(l, r, b, t, n, f)
+
+    # View transform.
+    ax = 0.5 * pi * vrotate
+    ay = -0.5 * pi * hrotate
+    view = mul_mat4(get_rotate_x_mat4(ax), get_rotate_y_mat4(ay))
+    return mul_mat4(projection, view)
+
+
+def get_orbit_camera_mat4s(num_frames: int,
+                           aspect: float = 1.0,
+                           vrotate: float = 0.0,
+                           zoom: float = 6.0,
+                           perspective: bool = True,
+                           hrotate_start: float = 0.0,
+                           hrotate_end: float = 4.0) -> List[Mat4]:
+
+    # Turn around the model horizontally, one full turn by default. The end
+    # state is excluded so that turntable animations loop seamlessly.
+    Us = []
+    for i in range(num_frames):
+        hrotate = hrotate_start + (hrotate_end -
+                                   hrotate_start) * i / num_frames
+        if perspective:
+            Us.append(
+                get_perspective_camera_mat4(aspect, hrotate, vrotate, zoom))
+        else:
+            Us.append(get_ortho_camera_mat4(aspect, hrotate, vrotate, zoom))
+    return Us
@@ -0,0 +1,213 @@
+from argparse import ArgumentParser
+from json import dumps, loads
+from os import stat
+from sys import stdin, stdout
+from typing import Any, Dict, List, Optional, Sequence, TextIO, Tuple
+
+from vecgl.batch import render_in_parallel, render_orbit
+from vecgl.camera import get_ortho_camera_mat4, get_perspective_camera_mat4
+from vecgl.export import read_model, read_ndjson, write_model
+from vecgl.model import AnyModel
+from vecgl.rendering import render
+
+# Jobs are dictionaries with the keys
+#   model:   model file, or "-" for an NDJSON stream on stdin,
+#   output:  output file, or a path pattern such as "frame-{frame:03d}.svg" if
+#            frames are given,
+#   camera:  "none", "perspective", or "ortho",
+#   aspect, hrotate, vrotate, zoom: the camera state,
+#   frames:  number of frames in one turn around the model, if any. Animations
+#            need a camera.
+# Single frames are rendered in this process unless more than one worker is
+# requested explicitly. Animations use all cores by default.
+
+kCameras = ("none", "perspective", "ortho")
+
+Job = Dict[str, Any]
+
+
+class _ModelCache:
+
+    def __init__(self):
+        self._key: Optional[Tuple[str, float]] = None
+        self._model: Optional[AnyModel] = None
+
+    def read(self, path: str) -> AnyModel:
+
+        # Models read from stdin are never cached.
+        if path == "-":
+            return read_ndjson(stdin.buffer)
+
+        # Reuse the last model unless its file changed.
+        key = path, stat(path).st_mtime
+        if key != self._key or self._model is None:
+            self._model = read_model(path)
+            self._key = key
+        return self._model
+
+
+def run_job(job: Job,
+            num_workers: Optional[int] = None,
+            cache: Optional[_ModelCache] = None) -> List[str]:
+    camera = job.get("camera", "none")
+    if camera not in kCameras:
+        raise ValueError(f"unknown camera '{camera}'")
+    if "frames" in job and camera == "none":
+        raise ValueError("animations need a camera")
+    cache = cache or _ModelCache()
+    model = cache.read(job["model"])
+    aspect = job.get("aspect", 1.0)
+    vrotate = job.get("vrotate", 0.0)
+    zoom = job.get("zoom", 6.0)
+
+    # Render a turntable animation.
+    if "frames" in job:
+        return render_orbit(model, job["frames"], job["output"], num_workers,
+                            aspect, vrotate, zoom, camera != "ortho")
+
+    # Render a single frame.
+    hrotate = job.get("hrotate", 0.0)
+    if camera == "perspective":
+        model = model.transform(
+            get_perspective_camera_mat4(aspect, hrotate, vrotate, zoom))
+    elif camera == "ortho":
+        model = model.transform(
+            get_ortho_camera_mat4(aspect, hrotate, vrotate, zoom))
+    if num_workers is None or num_workers == 1:
+        rendered = render(model)
+    else:
+        rendered = render_in_parallel(model, num_workers)
+    write_model(rendered, job["output"])
+    return [job["output"]]
+
+
+def serve(fin: TextIO,
+          fout: TextIO,
+          num_workers: Optional[int] = None) -> None:
+
+    # Process one job per line in this interpreter and report the outcome of
+    # each on its own line. Failing jobs do not stop the server.
+    cache = _ModelCache()
+    for line in fin:
+        if not line.strip():
+            continue
+        try:
+            job = loads(line)
+            if job.get("model") == "-":
+                raise ValueError("cannot read models from stdin while serving")
+            outputs = run_job(job, num_workers, cache)
+            result: Job = {"outputs": outputs}
+        except Exception as error:
+            result = {"error": f"{type(error).__name__}: {error}"}
+        fout.write(dumps(result) + "\n")
+        fout.flush()
+
+
+def _add_camera_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--camera",
+                        choices=kCameras,
+                        default="none",
+                        help="camera to apply to the model")
+    parser.add_argument("--hrotate",
+                        type=float,
+                        default=0.0,
+                        help="horizontal rotation, 1.0 is a quarter turn")
+    parser.add_argument("--vrotate",
+                        type=float,
+                        default=0.0,
+                        help="vertical rotation, 1.0 is a quarter turn")
+    parser.add_argument("--zoom", type=float, default=6.0, help="zoom level")
+    parser.add_argument("--aspect",
+                        type=float,
+                        default=1.0,
+                        help="aspect ratio of the output")
+
+
+def _add_orbit_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument("--frames",
+                        type=int,
+                        default=36,
+                        help="number of frames in one turn around the model")
+    parser.add_argument("--vrotate",
+                        type=float,
+                        default=0.0,
+                        help="vertical rotation, 1.0 is a quarter turn")
+    parser.add_argument("--zoom", type=float, default=6.0, help="zoom level")
+    parser.add_argument("--ortho",
+                        action="store_true",
+                        help="use an orthogonal rather than a perspective "
+                        "projection")
+
+
+def _add_workers_argument(parser: ArgumentParser, default_help: str) -> None:
+    parser.add_argument("--workers",
+                        type=int,
+                        default=None,
+                        help=f"number of worker processes, {default_help}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = ArgumentParser(prog="vecgl",
+                            description="Render models to vector graphics.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # Render a single frame.
+    render_parser = commands.add_parser("render", help="render a model")
+    render_parser.add_argument(
+        "model",
+        help="model file (.vglm, .json, .ndjson), or - for NDJSON "
+        "on stdin")
+    render_parser.add_argument(
+        "output",
+        help="output file; the format follows the suffix (.svg, .svgz, "
+        ".json, .ndjson, .vglm, .hpgl, .gcode)")
+    _add_camera_arguments(render_parser)
+    _add_workers_argument(render_parser, "1 by default")
+
+    # Render a turntable animation.
+    batch_parser = commands.add_parser(
+        "batch", help="render a turntable animation of a model")
+    batch_parser.add_argument("model",
+                              help="model file (.vglm, .json, .ndjson)")
+    batch_parser.add_argument(
+        "output", help="output path pattern, e.g. frame-{frame:03d}.svg")
+    _add_orbit_arguments(batch_parser)
+    _add_workers_argument(batch_parser, "all cores by default")
+
+    # Process jobs from stdin.
+    serve_parser = commands.add_parser(
+        "serve-stdin",
+        help="process one JSON job per line from stdin and report the "
+        "outcome of each as a JSON line on stdout")
+    _add_workers_argument(
+        serve_parser, "1 for single frames and all cores for animations by "
+        "default")
+
+    args = parser.parse_args(argv)
+    if args.command == "render":
+        run_job(
+            {
+                "model": args.model,
+                "output": args.output,
+                "camera": args.camera,
+                "aspect": args.aspect,
+                "hrotate": args.hrotate,
+                "vrotate": args.vrotate,
+                "zoom": args.zoom,
+            }, args.workers)
+    elif args.command == "batch":
+        run_job(
+            {
+                "model": args.model,
+                "output": args.output,
+                "camera": "ortho" if args.ortho else "perspective",
+                "vrotate": args.vrotate,
+                "zoom": args.zoom,
+                "frames": args.frames,
+            }, args.workers)
+    else:
+        serve(stdin, stdout, args.workers)
+
+
+if __name__ == "__main__":
+    main()
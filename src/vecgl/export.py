@@ -1,110 +1,515 @@
-from math import isfinite
-from typing import Iterator
+from array import array
+from contextlib import contextmanager
+from functools import partial
+from gzip import GzipFile
+from io import TextIOWrapper
+from itertools import groupby
+from json import JSONDecodeError, JSONDecoder, dumps, loads
+from math import copysign, floor, hypot, inf, isfinite, sqrt
+from mmap import ACCESS_READ, mmap
+from operator import itemgetter
+from os import PathLike
+from re import compile
+from struct import Struct
+from sys import byteorder
+from typing import (Any, BinaryIO, Callable, Dict, Iterable, Iterator, List,
+                    Optional, TextIO, Tuple, Union)
 
-from vecgl.linalg import Vec4, get_viewport_mat4, homogenious_vec4_to_vec3
-from vecgl.model import Model
+from vecgl.linalg import (Mat4, Vec2, Vec4, get_viewport_mat4,
+                          homogenious_vec4_to_vec3, mul_mat4)
+from vecgl.model import (AnyModel, IndexedModel, Model, TransformedModel,
+                         expand_instances)
+from vecgl.transforms import get_indexed_model
 
 kDefaultWidth = 600
 kDefaultHeight = 600
 kDefaultStrokeWidth = 1
+kDefaultBufferSize = 1 << 20
+
+# Files are either given by their path or as binary streams.
+PathOrStream = Union[str, PathLike, BinaryIO]
+
+kCompressedSuffixes = (".gz", ".svgz")
+
+
+def _is_compressed(path: PathOrStream, compress: Optional[bool]) -> bool:
+
+    # Unless specified, paths with a compressed suffix are compressed.
+    if compress is not None:
+        return compress
+    return isinstance(
+        path, (str, PathLike)) and str(path).endswith(kCompressedSuffixes)
+
+
+@contextmanager
+def _open_binary(path: PathOrStream, mode: str,
+                 compress: Optional[bool]) -> Iterator[BinaryIO]:
+    is_compressed = _is_compressed(path, compress)
+    if isinstance(path, (str, PathLike)):
+        with open(path, mode + "b") as f:
+            if is_compressed:
+                with GzipFile(fileobj=f, mode=mode + "b") as gz:
+                    yield gz
+            else:
+                yield f
+    elif is_compressed:
+
+        # Streams remain open such that the caller can continue to use them.
+        with GzipFile(fileobj=path, mode=mode + "b") as gz:
+            yield gz
+    else:
+        yield path
+
+
+@contextmanager
+def _open_text(path: PathOrStream, mode: str,
+               compress: Optional[bool]) -> Iterator[TextIO]:
+    with _open_binary(path, mode, compress) as f:
+        text = TextIOWrapper(f, encoding="utf-8", newline="")
+        try:
+            yield text
+        finally:
+            text.flush()
+            text.detach()
+
+
+def _write_chunks(chunks: Iterable[Union[str, bytes]],
+                  fout: BinaryIO,
+                  buffer_size: int = kDefaultBufferSize) -> None:
+
+    # Join the many small chunks into large writes.
+    batch: List[bytes] = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+        batch.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            fout.write(b"".join(batch))
+            batch.clear()
+            size = 0
+    if batch:
+        fout.write(b"".join(batch))
+
+
+def _format_quantized(a: float, precision: int) -> str:
+
+    # Format without trailing zeros and without a negative zero.
+    s = f"{a:.{precision}f}"
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+    return "0" if s == "-0" else s
+
+
+def _get_transformed_models(
+        model: AnyModel,
+        U: Mat4) -> Iterator[Tuple[Union[Model, IndexedModel], Mat4]]:
+
+    # Yield the model and its instances together with the transforms to apply,
+    # rather than applying them.
+    if isinstance(model, TransformedModel):
+        model, V = model.get_pending()
+        U = mul_mat4(U, V)
+    yield model, U
+    for inst in model.instances:
+        yield from _get_transformed_models(inst.model, mul_mat4(U, inst.U))
+
+
+def _get_xy_projection(U: Mat4) -> Callable[[Vec4], Vec2]:
+    (u00, u01, u02, u03), (u10, u11, u12, u13), _, (u30, u31, u32, u33) = U
+
+    # Fuse the transform with the perspective divide. The order of operations
+    # matches `mul_mat4_vec4` and `homogenious_vec4_to_vec3`.
+    def project(v: Vec4) -> Vec2:
+        vx, vy, vz, vw = v
+        x = u00 * vx + u01 * vy + u02 * vz + u03 * vw
+        y = u10 * vx + u11 * vy + u12 * vz + u13 * vw
+        w = u30 * vx + u31 * vy + u32 * vz + u33 * vw
+        if w == 0.0:
+            return copysign(inf, x), copysign(inf, y)
+        return x / w, y / w
+
+    return project
+
+
+# The primitives of a model projected to the xy-plane one at a time. Vertices
+# shared in an indexed model are projected only once.
+
+
+def _get_xy_triangles(model: AnyModel,
+                      U: Mat4) -> Iterator[Tuple[str, Vec2, Vec2, Vec2]]:
+    for model, U in _get_transformed_models(model, U):
+        project = _get_xy_projection(U)
+        if isinstance(model, IndexedModel):
+            xys = [project(v) for v in model.get_vertices()]
+            palette = model.palette
+            ids = model.triangle_indices
+            for i, j, k, c in zip(ids[0::3], ids[1::3], ids[2::3],
+                                  model.triangle_colors):
+                yield palette[c], xys[i], xys[j], xys[k]
+        else:
+            for tr in model.triangles:
+                yield tr.color, project(tr.p), project(tr.q), project(tr.r)
+
+
+def _get_xy_lines(model: AnyModel,
+                  U: Mat4) -> Iterator[Tuple[str, Vec2, Vec2]]:
+    for model, U in _get_transformed_models(model, U):
+        project = _get_xy_projection(U)
+        if isinstance(model, IndexedModel):
+            xys = [project(v) for v in model.get_vertices()]
+            palette = model.palette
+            ids = model.line_indices
+            for i, j, c in zip(ids[0::2], ids[1::2], model.line_colors):
+                yield palette[c], xys[i], xys[j]
+        else:
+            for ln in model.lines:
+                yield ln.color, project(ln.p), project(ln.q)
+
+
+def _get_xy_points(model: AnyModel, U: Mat4) -> Iterator[Tuple[str, Vec2]]:
+    for model, U in _get_transformed_models(model, U):
+        project = _get_xy_projection(U)
+        if isinstance(model, IndexedModel):
+            vs = model.vertices
+            palette = model.palette
+            for i, c in zip(model.point_indices, model.point_colors):
+                yield palette[c], project(
+                    (vs[4 * i], vs[4 * i + 1], vs[4 * i + 2], vs[4 * i + 3]))
+        else:
+            for pt in model.points:
+                yield pt.color, project(pt.p)
+
+
+def _get_svg_triangles(
+        model: AnyModel, U: Mat4, precision: Optional[int],
+        fmt: Callable[[float], str]) -> Iterator[Tuple[str, str]]:
+
+    # Yield the color and the geometry attributes of each triangle. Triangles
+    # that degenerate when rounded are dropped.
+    for color, (px, py), (qx, qy), (rx, ry) in _get_xy_triangles(model, U):
+        if all(isfinite(c) for c in (px, py, qx, qy, rx, ry)):
+            if precision is not None:
+                px, py, qx, qy, rx, ry = (round(c, precision)
+                                          for c in (px, py, qx, qy, rx, ry))
+                if (qx - px) * (ry - py) == (qy - py) * (rx - px):
+                    continue
+            yield color, f"points=\"{fmt(px)},{fmt(py)} {fmt(qx)},{fmt(qy)} {fmt(rx)},{fmt(ry)}\""
+
+
+def _get_svg_lines(model: AnyModel, U: Mat4, precision: Optional[int],
+                   fmt: Callable[[float], str]) -> Iterator[Tuple[str, str]]:
+
+    # Yield the color and the geometry attributes of each line. Lines that
+    # collapse to a point when rounded are dropped.
+    for color, (px, py), (qx, qy) in _get_xy_lines(model, U):
+        if all(isfinite(c) for c in (px, py, qx, qy)):
+            if precision is not None:
+                px, py, qx, qy = (round(c, precision)
+                                  for c in (px, py, qx, qy))
+                if px == qx and py == qy:
+                    continue
+            yield color, f"x1=\"{fmt(px)}\" y1=\"{fmt(py)}\" x2=\"{fmt(qx)}\" y2=\"{fmt(qy)}\""
+
+
+def _get_svg_points(model: AnyModel, U: Mat4,
+                    fmt: Callable[[float], str]) -> Iterator[str]:
+    for _, (px, py) in _get_xy_points(model, U):
+        if all(isfinite(c) for c in (px, py)):
+            yield f"cx=\"{fmt(px)}\" cy=\"{fmt(py)}\""
 
 
 def to_svg(
-    model: Model,
+    model: AnyModel,
     height: int = kDefaultHeight,
     width: int = kDefaultWidth,
     stroke_width: int = kDefaultStrokeWidth,
+    precision: Optional[int] = None,
+    group_by_color: bool = False,
 ) -> Iterator[str]:
 
-    # Transform to canvas space.
-    model = model.transform(get_viewport_mat4(0.0, height, width, -height))
+    # Transform to canvas space while streaming, vertex by vertex.
+    U = get_viewport_mat4(0.0, height, width, -height)
+
+    # Round the coordinates to the given number of decimals, if any.
+    fmt: Callable[[float], str] = str
+    if precision is not None:
+        if precision < 0:
+            raise ValueError(
+                f"expected a non-negative precision but got {precision}")
+        fmt = partial(_format_quantized, precision=precision)
 
     yield f"<svg version=\"1.1\" width=\"{width}\" height=\"{height}\" xmlns=\"http://www.w3.org/2000/svg\">\n"
+    triangles = _get_svg_triangles(model, U, precision, fmt)
+    lines = _get_svg_lines(model, U, precision, fmt)
+    points = _get_svg_points(model, U, fmt)
+    if not group_by_color:
 
-    # Add the triangles.
-    for tr in model.triangles:
-        px, py, _ = homogenious_vec4_to_vec3(tr.p)
-        qx, qy, _ = homogenious_vec4_to_vec3(tr.q)
-        rx, ry, _ = homogenious_vec4_to_vec3(tr.r)
-        if all(isfinite(c) for c in (px, py, qx, qy, rx, ry)):
-            yield f"  <polygon points=\"{px},{py} {qx},{qy} {rx},{ry}\" fill=\"{tr.color}\"/>\n"
+        # Add the triangles, lines, and points with their attributes.
+        for color, attrs in triangles:
+            yield f"  <polygon {attrs} fill=\"{color}\"/>\n"
+        for color, attrs in lines:
+            yield f"  <line {attrs} stroke=\"{color}\" stroke-linecap=\"round\" stroke-width=\"{stroke_width}\"/>\n"
+        for attrs in points:
+            yield f"  <circle {attrs} r=\"{stroke_width/2}\" fill=\"green\"/>\n"
+    else:
 
-    # Add the lines.
-    for ln in model.lines:
-        px, py, _ = homogenious_vec4_to_vec3(ln.p)
-        qx, qy, _ = homogenious_vec4_to_vec3(ln.q)
-        if all(isfinite(c) for c in (px, py, qx, qy)):
-            yield f"  <line x1=\"{px}\" y1=\"{py}\" x2=\"{qx}\" y2=\"{qy}\" stroke=\"{ln.color}\" stroke-linecap=\"round\" stroke-width=\"{stroke_width}\"/>\n"
+        # Group the triangles by color. Only consecutive triangles are grouped
+        # to preserve the painter's order.
+        for color, group in groupby(triangles, key=itemgetter(0)):
+            yield f"  <g fill=\"{color}\">\n"
+            for _, attrs in group:
+                yield f"    <polygon {attrs}/>\n"
+            yield "  </g>\n"
 
-    # Add the points.
-    for pt in model.points:
-        px, py, _ = homogenious_vec4_to_vec3(pt.p)
-        if all(isfinite(c) for c in (px, py)):
-            yield f"  <circle cx=\"{px}\" cy=\"{py}\" r=\"{stroke_width/2}\" fill=\"green\"/>\n"
+        # Group all lines by color, e.g. one group per pen.
+        lines_by_color: Dict[str, List[str]] = {}
+        for color, attrs in lines:
+            lines_by_color.setdefault(color, []).append(attrs)
+        for color, group_attrs in lines_by_color.items():
+            yield f"  <g stroke=\"{color}\" stroke-linecap=\"round\" stroke-width=\"{stroke_width}\">\n"
+            for attrs in group_attrs:
+                yield f"    <line {attrs}/>\n"
+            yield "  </g>\n"
+
+        # Group all points.
+        first = True
+        for attrs in points:
+            if first:
+                yield "  <g fill=\"green\">\n"
+                first = False
+            yield f"    <circle {attrs} r=\"{stroke_width/2}\"/>\n"
+        if not first:
+            yield "  </g>\n"
 
     yield f"</svg>\n"
 
 
 def write_svg(
-    model: Model,
-    path: str,
+    model: AnyModel,
+    path: PathOrStream,
     height: int = kDefaultHeight,
     width: int = kDefaultWidth,
     stroke_width: int = kDefaultStrokeWidth,
+    precision: Optional[int] = None,
+    group_by_color: bool = False,
+    compress: Optional[bool] = None,
 ) -> None:
-    with open(path, "w") as fout:
-        fout.writelines(to_svg(model, height, width, stroke_width))
+    with _open_binary(path, "w", compress) as fout:
+        _write_chunks(
+            to_svg(model, height, width, stroke_width, precision,
+                   group_by_color), fout)
 
 
 def _p_to_json(p: Vec4) -> str:
     return "[ " + ", ".join(str(a) for a in p) + " ]"
 
 
-def to_json(model: Model) -> Iterator[str]:
+def to_json(model: AnyModel) -> Iterator[str]:
+    model = expand_instances(model)
     yield "{\n"
 
     # Add the points.
     yield "  \"points\": [\n"
-    for pt in model.points:
-        is_last = pt == model.points[-1]
+    points = model.points
+    last = len(points) - 1
+    for i, pt in enumerate(points):
+        is_last = i == last
         yield f"    {{\n"
         yield f"      \"p\": {_p_to_json(pt.p)},\n"
-        yield f"      \"color\": \"{pt.color}\"\n"
+        yield f"      \"color\": {dumps(pt.color)}\n"
         yield f"    }}{'' if is_last else ','}\n"
     yield "  ],\n"
 
     # Add the lines.
     yield "  \"lines\": [\n"
-    for ln in model.lines:
-        is_last = ln == model.lines[-1]
+    lines = model.lines
+    last = len(lines) - 1
+    for i, ln in enumerate(lines):
+        is_last = i == last
         yield f"    {{\n"
         yield f"      \"p\": {_p_to_json(ln.p)},\n"
         yield f"      \"q\": {_p_to_json(ln.q)},\n"
-        yield f"      \"color\": \"{ln.color}\"\n"
+        yield f"      \"color\": {dumps(ln.color)}\n"
         yield f"    }}{'' if is_last else ','}\n"
     yield "  ],\n"
 
     # Add the triangles.
     yield "  \"triangles\": [\n"
-    for tr in model.triangles:
-        is_last = tr == model.triangles[-1]
+    triangles = model.triangles
+    last = len(triangles) - 1
+    for i, tr in enumerate(triangles):
+        is_last = i == last
         yield f"    {{\n"
         yield f"      \"p\": {_p_to_json(tr.p)},\n"
         yield f"      \"q\": {_p_to_json(tr.q)},\n"
         yield f"      \"r\": {_p_to_json(tr.r)},\n"
-        yield f"      \"color\": \"{tr.color}\"\n"
+        yield f"      \"color\": {dumps(tr.color)}\n"
         yield f"    }}{'' if is_last else ','}\n"
     yield "  ]\n"
 
     yield "}\n"
 
 
-def write_json(model: Model, path: str) -> None:
-    with open(path, "w") as fout:
-        fout.writelines(to_json(model))
+def write_json(model: AnyModel,
+               path: PathOrStream,
+               compress: Optional[bool] = None) -> None:
+    with _open_binary(path, "w", compress) as fout:
+        _write_chunks(to_json(model), fout)
+
+
+def to_ndjson(model: AnyModel) -> Iterator[str]:
+    model = expand_instances(model)
+
+    # Write one primitive per line.
+    for pt in model.points:
+        yield f"{{\"type\": \"point\", \"p\": {_p_to_json(pt.p)}, \"color\": {dumps(pt.color)}}}\n"
+    for ln in model.lines:
+        yield f"{{\"type\": \"line\", \"p\": {_p_to_json(ln.p)}, \"q\": {_p_to_json(ln.q)}, \"color\": {dumps(ln.color)}}}\n"
+    for tr in model.triangles:
+        yield f"{{\"type\": \"triangle\", \"p\": {_p_to_json(tr.p)}, \"q\": {_p_to_json(tr.q)}, \"r\": {_p_to_json(tr.r)}, \"color\": {dumps(tr.color)}}}\n"
+
+
+def write_ndjson(model: AnyModel,
+                 path: PathOrStream,
+                 compress: Optional[bool] = None) -> None:
+    with _open_binary(path, "w", compress) as fout:
+        _write_chunks(to_ndjson(model), fout)
+
+
+_kJsonPrimitiveKinds = {
+    "points": "point",
+    "lines": "line",
+    "triangles": "triangle"
+}
+
+
+def _add_json_primitive(model: Model, kind: str, obj: Any) -> None:
+    if kind == "point":
+        model.add_point(tuple(obj["p"]), obj["color"])
+    elif kind == "line":
+        model.add_line(tuple(obj["p"]), tuple(obj["q"]), obj["color"])
+    elif kind == "triangle":
+        model.add_triangle(tuple(obj["p"]), tuple(obj["q"]), tuple(obj["r"]),
+                           obj["color"])
+    else:
+        raise ValueError(f"unknown primitive type {kind}")
+
+
+kDefaultChunkSize = 1 << 16
+
+# Characters that end a json token.
+_kJsonDelimiter = compile(r"[\s,:\[\]{}\"]")
+
+
+class _JsonScanner:
+
+    def __init__(self, fin: TextIO, chunk_size: int):
+        self._fin = fin
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._decoder = JSONDecoder()
+
+    def _fill(self) -> bool:
+
+        # Drop the consumed text such that only a bounded window of the input is
+        # held in memory.
+        chunk = self._fin.read(self._chunk_size)
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return bool(chunk)
+
+    def peek(self) -> str:
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            while pos < len(buffer) and buffer[pos] in " \t\n\r":
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer) or not self._fill():
+                return buffer[pos:pos + 1]
+
+    def expect(self, c: str) -> None:
+        actual = self.peek()
+        if actual != c:
+            raise ValueError(
+                f"expected '{c}' but got '{actual}' in json model")
+        self._pos += 1
+
+    def skip(self, c: str) -> bool:
+        if self.peek() != c:
+            return False
+        self._pos += 1
+        return True
+
+    def _is_cut_off(self, error: JSONDecodeError) -> bool:
+
+        # An error may be due to the end of the buffer only if the offending
+        # token extends to it. Otherwise, the input is invalid and no more of it
+        # is read.
+        if error.msg.startswith("Unterminated string"):
+            return True
+        return _kJsonDelimiter.search(self._buffer, error.pos) is None
+
+    def decode(self) -> Any:
+        self.peek()
+        while True:
+
+            # Values that are incomplete or end with the buffer, e.g. numbers,
+            # are decoded again with more input.
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except JSONDecodeError as error:
+                if self._is_cut_off(error) and self._fill():
+                    continue
+                raise ValueError(f"invalid json model: {error}") from error
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
 
+def read_json(path: PathOrStream,
+              chunk_size: int = kDefaultChunkSize,
+              compress: Optional[bool] = None) -> Model:
+    model = Model()
+    with _open_text(path, "r", compress) as fin:
 
-def to_python(model: Model) -> Iterator[str]:
+        # Decode one primitive at a time rather than the whole document.
+        scanner = _JsonScanner(fin, chunk_size)
+        scanner.expect("{")
+        while not scanner.skip("}"):
+            kind = scanner.decode()
+            scanner.expect(":")
+            if kind in _kJsonPrimitiveKinds:
+                kind = _kJsonPrimitiveKinds[kind]
+                scanner.expect("[")
+                while not scanner.skip("]"):
+                    _add_json_primitive(model, kind, scanner.decode())
+                    if not scanner.skip(","):
+                        scanner.expect("]")
+                        break
+            else:
+                scanner.decode()
+            if not scanner.skip(","):
+                scanner.expect("}")
+                break
+    return model
+
+
+def read_ndjson(path: PathOrStream, compress: Optional[bool] = None) -> Model:
+    model = Model()
+    with _open_text(path, "r", compress) as fin:
+        for line in fin:
+            if line.strip():
+                obj = loads(line)
+                _add_json_primitive(model, obj["type"], obj)
+    return model
+
+
+def to_python(model: AnyModel) -> Iterator[str]:
+    model = expand_instances(model)
 
     # Add the points.
     for pt in model.points:
@@ -119,6 +524,473 @@ def to_python(model: Model) -> Iterator[str]:
         yield f"model.add_triangle({homogenious_vec4_to_vec3(tr.p)}, {homogenious_vec4_to_vec3(tr.q)}, {homogenious_vec4_to_vec3(tr.r)})\n"
 
 
-def write_python(model: Model, path: str) -> None:
-    with open(path, "w") as fout:
-        fout.writelines(to_python(model))
+def write_python(model: AnyModel,
+                 path: PathOrStream,
+                 compress: Optional[bool] = None) -> None:
+    with _open_binary(path, "w", compress) as fout:
+        _write_chunks(to_python(model), fout)
+
+
+# Pen plotters.
+#
+# Plotters draw the lines and points of a model, usually a rendered one.
+# Triangles are not drawn. Coordinates are in millimeters with the origin in
+# the lower left corner. Connected lines are chained into paths, and the paths
+# of each color are ordered greedily to keep pen-up travel short.
+
+kDefaultPlotWidth = 200.0
+kDefaultPlotHeight = 200.0
+kDefaultDrawSpeed = 25.0
+kDefaultTravelSpeed = 75.0
+kDefaultPenTime = 0.15
+kDefaultPenUpZ = 2.0
+kDefaultPenDownZ = 0.0
+
+# Plotter units per millimeter in HPGL.
+kHpglUnitsPerMm = 40.0
+
+PlotPath = List[Vec2]
+
+
+def _get_plot_distance(p: Vec2, q: Vec2) -> float:
+    px, py = p
+    qx, qy = q
+    return hypot(qx - px, qy - py)
+
+
+def _get_plot_key(p: Vec2) -> Vec2:
+
+    # End points are matched up to a nanometer.
+    px, py = p
+    return round(px, 6), round(py, 6)
+
+
+class _EndPointGrid:
+
+    def __init__(self, segments: List[Tuple[Vec2, Vec2]]):
+
+        # Hash the end points of all segments into a uniform grid with about one
+        # segment per cell.
+        xs = [p[0] for seg in segments for p in seg]
+        ys = [p[1] for seg in segments for p in seg]
+        extent = max(max(xs) - min(xs), max(ys) - min(ys))
+        self._cell_size = extent / sqrt(len(segments)) if extent > 0.0 else 1.0
+        self._cells: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        for i, seg in enumerate(segments):
+            for end, p in enumerate(seg):
+                self._cells.setdefault(self._get_cell(p), []).append((i, end))
+        self._segments = segments
+        self._lb = (min(c[0]
+                        for c in self._cells), min(c[1] for c in self._cells))
+        self._ub = (max(c[0]
+                        for c in self._cells), max(c[1] for c in self._cells))
+
+    def _get_cell(self, p: Vec2) -> Tuple[int, int]:
+        px, py = p
+        return floor(px / self._cell_size), floor(py / self._cell_size)
+
+    def find_nearest(self, p: Vec2, used: List[bool]) -> Tuple[int, int]:
+        px, py = p
+        cx, cy = self._get_cell(p)
+        cells = self._cells
+        (lb_x, lb_y), (ub_x, ub_y) = self._lb, self._ub
+        max_r = max(cx - lb_x, ub_x - cx, cy - lb_y, ub_y - cy)
+        best, best_d2 = (-1, -1), inf
+        for r in range(max_r + 1):
+
+            # Search the ring of cells at distance r. Cells at distance r + 1 are
+            # at least r cell sizes away.
+            if r == 0:
+                ring = [(cx, cy)]
+            else:
+                ring = [(cx + d, cy + e) for d in range(-r, r + 1)
+                        for e in (-r, r)]
+                ring += [(cx + e, cy + d) for d in range(-r + 1, r)
+                         for e in (-r, r)]
+            for cell in ring:
+                ends = cells.get(cell)
+                if ends is None:
+                    continue
+                ends[:] = [e for e in ends if not used[e[0]]]
+                if not ends:
+                    del cells[cell]
+                    continue
+                for i, end in ends:
+                    qx, qy = self._segments[i][end]
+                    d2 = (qx - px)**2 + (qy - py)**2
+                    if d2 < best_d2:
+                        best, best_d2 = (i, end), d2
+            if best_d2 <= (r * self._cell_size)**2:
+                break
+        return best
+
+
+def _chain_plot_paths(segments: List[Tuple[Vec2, Vec2]],
+                      start: Vec2) -> List[PlotPath]:
+    if not segments:
+        return []
+
+    # Index the segments by their end points to chain connected ones.
+    segments_by_end: Dict[Vec2, List[int]] = {}
+    for i, (p, q) in enumerate(segments):
+        segments_by_end.setdefault(_get_plot_key(p), []).append(i)
+        segments_by_end.setdefault(_get_plot_key(q), []).append(i)
+
+    # Start each path at the nearest end point of any remaining segment, which
+    # may reverse it, and follow connected segments as far as possible.
+    grid = _EndPointGrid(segments)
+    used = [False] * len(segments)
+    paths: List[PlotPath] = []
+    p = start
+    for _ in range(len(segments)):
+        i, end = grid.find_nearest(p, used)
+        if i < 0:
+            break
+        used[i] = True
+        path = [segments[i][end], segments[i][1 - end]]
+        while True:
+            key = _get_plot_key(path[-1])
+            j = next((j for j in segments_by_end[key] if not used[j]), None)
+            if j is None:
+                break
+            used[j] = True
+            q, r = segments[j]
+            path.append(r if _get_plot_key(q) == key else q)
+        paths.append(path)
+        p = path[-1]
+    return paths
+
+
+def get_plot_paths(
+    model: AnyModel,
+    height: float = kDefaultPlotHeight,
+    width: float = kDefaultPlotWidth,
+) -> List[Tuple[str, List[PlotPath]]]:
+
+    # Transform to plotter space. Points are drawn as dots. Lines and points
+    # are collected by color, in the order of their first appearance.
+    U = get_viewport_mat4(0.0, 0.0, width, height)
+    segments_by_color: Dict[str, List[Tuple[Vec2, Vec2]]] = {}
+    for color, (px, py), (qx, qy) in _get_xy_lines(model, U):
+        if all(isfinite(c) for c in (px, py, qx, qy)):
+            segments_by_color.setdefault(color, []).append(
+                ((px, py), (qx, qy)))
+    for color, (px, py) in _get_xy_points(model, U):
+        if all(isfinite(c) for c in (px, py)):
+            segments_by_color.setdefault(color, []).append(
+                ((px, py), (px, py)))
+
+    # Order the paths, continuing from where the previous color ended.
+    paths_by_color = []
+    p = 0.0, 0.0
+    for color, segments in segments_by_color.items():
+        paths = _chain_plot_paths(segments, p)
+        paths_by_color.append((color, paths))
+        p = paths[-1][-1]
+    return paths_by_color
+
+
+def get_plot_time(paths_by_color: List[Tuple[str, List[PlotPath]]],
+                  draw_speed: float = kDefaultDrawSpeed,
+                  travel_speed: float = kDefaultTravelSpeed,
+                  pen_time: float = kDefaultPenTime) -> float:
+
+    # Sum up drawing, pen-up travel, and lifting and lowering the pen.
+    draw_length = 0.0
+    travel_length = 0.0
+    num_paths = 0
+    p = 0.0, 0.0
+    for _, paths in paths_by_color:
+        for path in paths:
+            travel_length += _get_plot_distance(p, path[0])
+            draw_length += sum(map(_get_plot_distance, path[:-1], path[1:]))
+            p = path[-1]
+        num_paths += len(paths)
+    draw_time = draw_length / draw_speed
+    travel_time = travel_length / travel_speed
+    return draw_time + travel_time + 2.0 * num_paths * pen_time
+
+
+def to_hpgl(
+    model: AnyModel,
+    height: float = kDefaultPlotHeight,
+    width: float = kDefaultPlotWidth,
+) -> Iterator[str]:
+    yield "IN;\n"
+
+    # Select one pen per color.
+    for pen, (_, paths) in enumerate(get_plot_paths(model, height, width), 1):
+        yield f"SP{pen};\n"
+        for path in paths:
+            coords = [
+                f"{round(x * kHpglUnitsPerMm)},{round(y * kHpglUnitsPerMm)}"
+                for x, y in path
+            ]
+            yield f"PU{coords[0]};\n"
+            yield f"PD{','.join(coords[1:])};\n"
+
+    yield "PU;\n"
+    yield "SP0;\n"
+
+
+def to_gcode(
+    model: AnyModel,
+    height: float = kDefaultPlotHeight,
+    width: float = kDefaultPlotWidth,
+    draw_speed: float = kDefaultDrawSpeed,
+    travel_speed: float = kDefaultTravelSpeed,
+    pen_up_z: float = kDefaultPenUpZ,
+    pen_down_z: float = kDefaultPenDownZ,
+    pen_time: float = kDefaultPenTime,
+) -> Iterator[str]:
+    paths_by_color = get_plot_paths(model, height, width)
+    plot_time = get_plot_time(paths_by_color, draw_speed, travel_speed,
+                              pen_time)
+    yield f"; estimated plot time: {plot_time:.1f} s\n"
+
+    # Use millimeters, absolute positioning, and feed rates per minute.
+    draw_feed = _format_quantized(60.0 * draw_speed, 3)
+    travel_feed = _format_quantized(60.0 * travel_speed, 3)
+    yield "G21\n"
+    yield "G90\n"
+    yield f"G0 Z{_format_quantized(pen_up_z, 3)}\n"
+
+    # Pause for a pen change before each color but the first.
+    for n, (color, paths) in enumerate(paths_by_color):
+        yield f"M0 ; pen {color}\n" if n > 0 else f"; pen {color}\n"
+        for path in paths:
+            coords = [(_format_quantized(x, 3), _format_quantized(y, 3))
+                      for x, y in path]
+            x, y = coords[0]
+            yield f"G1 X{x} Y{y} F{travel_feed}\n"
+            yield f"G1 Z{_format_quantized(pen_down_z, 3)} F{draw_feed}\n"
+            for x, y in coords[1:]:
+                yield f"G1 X{x} Y{y}\n"
+            yield f"G0 Z{_format_quantized(pen_up_z, 3)}\n"
+
+    yield "M2\n"
+
+
+def write_hpgl(model: AnyModel,
+               path: PathOrStream,
+               height: float = kDefaultPlotHeight,
+               width: float = kDefaultPlotWidth,
+               compress: Optional[bool] = None) -> None:
+    with _open_binary(path, "w", compress) as fout:
+        _write_chunks(to_hpgl(model, height, width), fout)
+
+
+def write_gcode(model: AnyModel,
+                path: PathOrStream,
+                height: float = kDefaultPlotHeight,
+                width: float = kDefaultPlotWidth,
+                draw_speed: float = kDefaultDrawSpeed,
+                travel_speed: float = kDefaultTravelSpeed,
+                pen_up_z: float = kDefaultPenUpZ,
+                pen_down_z: float = kDefaultPenDownZ,
+                pen_time: float = kDefaultPenTime,
+                compress: Optional[bool] = None) -> None:
+    with _open_binary(path, "w", compress) as fout:
+        _write_chunks(
+            to_gcode(model, height, width, draw_speed, travel_speed, pen_up_z,
+                     pen_down_z, pen_time), fout)
+
+
+# Binary models.
+#
+# A binary model stores an `IndexedModel` as typed little-endian arrays. The
+# layout is
+#   header:   magic, version, number of vertices, points, lines, and triangles,
+#             palette size in bytes, reserved (32 bytes),
+#   vertices: 4 * num_vertices float64,
+#   points:   num_points uint32 vertex indices, num_points uint32 colors,
+#   lines:    2 * num_lines uint32 vertex indices, num_lines uint32 colors,
+#   triangles: 3 * num_triangles uint32 vertex indices, num_triangles uint32
+#             colors,
+#   palette:  UTF-8 color names, each prefixed with its size as uint32.
+# Colors refer to the palette by index.
+
+kBinaryModelMagic = b"VGLM"
+kBinaryModelVersion = 1
+
+_kBinaryModelHeader = Struct("<4sIIIIIII")
+_kBinaryModelPaletteEntrySize = Struct("<I")
+
+
+def _get_binary_palette(palette: List[str]) -> bytes:
+    chunks = []
+    for color in palette:
+        data = color.encode("utf-8")
+        chunks.append(_kBinaryModelPaletteEntrySize.pack(len(data)))
+        chunks.append(data)
+    return b"".join(chunks)
+
+
+def _parse_binary_palette(view: memoryview) -> List[str]:
+    palette = []
+    offset = 0
+    entry_size_size = _kBinaryModelPaletteEntrySize.size
+    while offset < len(view):
+        if offset + entry_size_size > len(view):
+            raise ValueError("truncated palette in binary model")
+        size, = _kBinaryModelPaletteEntrySize.unpack_from(view, offset)
+        offset += entry_size_size
+        if offset + size > len(view):
+            raise ValueError("truncated palette in binary model")
+        palette.append(bytes(view[offset:offset + size]).decode("utf-8"))
+        offset += size
+    return palette
+
+
+def _check_binary_indices(indices: Any, n: int, what: str) -> None:
+    if len(indices) > 0 and max(indices) >= n:
+        raise ValueError(f"{what} index out of range in binary model")
+
+
+def to_binary(model: AnyModel) -> Iterator[bytes]:
+    if not isinstance(model, IndexedModel):
+        model = get_indexed_model(model)
+    palette = _get_binary_palette(model.palette)
+    yield _kBinaryModelHeader.pack(kBinaryModelMagic, kBinaryModelVersion,
+                                   model.num_vertices, len(model.point_colors),
+                                   len(model.line_colors),
+                                   len(model.triangle_colors), len(palette), 0)
+
+    # Serialize the arrays as little-endian.
+    for typecode, data in (("d", model.vertices), ("I", model.point_indices),
+                           ("I", model.point_colors),
+                           ("I", model.line_indices), ("I", model.line_colors),
+                           ("I", model.triangle_indices),
+                           ("I", model.triangle_colors)):
+        data = array(typecode, data)
+        if byteorder != "little":
+            data.byteswap()
+        yield data.tobytes()
+    yield palette
+
+
+def write_binary(model: AnyModel,
+                 path: PathOrStream,
+                 compress: Optional[bool] = None) -> None:
+    with _open_binary(path, "w", compress) as fout:
+        _write_chunks(to_binary(model), fout)
+
+
+def from_binary(buffer: Any, validate: bool = True) -> IndexedModel:
+
+    # Parse and validate the header.
+    view = memoryview(buffer).cast("B")
+    header_size = _kBinaryModelHeader.size
+    if len(view) < header_size:
+        raise ValueError("buffer too small for a binary model")
+    (magic, version, num_vertices, num_points, num_lines, num_triangles,
+     palette_size, _) = _kBinaryModelHeader.unpack_from(view)
+    if magic != kBinaryModelMagic:
+        raise ValueError("not a binary model")
+    if version != kBinaryModelVersion:
+        raise ValueError(f"unsupported binary model version {version}")
+    sections = (("d", 4 * num_vertices), ("I", num_points), ("I", num_points),
+                ("I", 2 * num_lines), ("I", num_lines),
+                ("I", 3 * num_triangles), ("I", num_triangles))
+    nbytes = header_size + palette_size + sum(
+        (8 if typecode == "d" else 4) * n for typecode, n in sections)
+    if len(view) < nbytes:
+        raise ValueError("buffer too small for a binary model")
+
+    # Refer to the arrays without copying them, if possible. Models that refer
+    # to a buffer are read-only.
+    arrays = []
+    offset = header_size
+    for typecode, n in sections:
+        size = (8 if typecode == "d" else 4) * n
+        section_view = view[offset:offset + size]
+        if byteorder == "little":
+            arrays.append(section_view.cast(typecode))
+        else:
+            data = array(typecode, section_view.tobytes())
+            data.byteswap()
+            arrays.append(data)
+        offset += size
+    palette = _parse_binary_palette(view[offset:offset + palette_size])
+    model = IndexedModel()
+    (model.vertices, model.point_indices, model.point_colors,
+     model.line_indices, model.line_colors, model.triangle_indices,
+     model.triangle_colors) = arrays
+    model.palette = palette
+
+    # Fail early rather than during rendering if the indices are corrupt. This
+    # reads all indices, i.e. pages in most of a mapped file. Trusted buffers,
+    # e.g. those written by this process, can skip it.
+    if not validate:
+        return model
+    for indices in (model.point_indices, model.line_indices,
+                    model.triangle_indices):
+        _check_binary_indices(indices, num_vertices, "vertex")
+    for colors in (model.point_colors, model.line_colors,
+                   model.triangle_colors):
+        _check_binary_indices(colors, len(palette), "color")
+    return model
+
+
+def read_binary(path: PathOrStream,
+                use_mmap: bool = True,
+                compress: Optional[bool] = None,
+                validate: bool = True) -> IndexedModel:
+
+    # Streams and compressed files are read into memory.
+    if not isinstance(path, (str, PathLike)) or _is_compressed(path, compress):
+        with _open_binary(path, "r", compress) as fin:
+            return from_binary(fin.read(), validate)
+
+    # Map the file into memory rather than reading it. The mapping is closed
+    # once the returned model is no longer referenced.
+    with open(path, "rb") as fin:
+        if not use_mmap:
+            return from_binary(fin.read(), validate)
+        if fin.seek(0, 2) == 0:
+            raise ValueError("buffer too small for a binary model")
+        return from_binary(mmap(fin.fileno(), 0, access=ACCESS_READ), validate)
+
+
+# Models are read and written in the format given by the file name.
+
+_kModelReaders: Dict[str, Callable[[PathOrStream], AnyModel]] = {
+    ".json": read_json,
+    ".ndjson": read_ndjson,
+    ".vglm": read_binary,
+}
+
+_kModelWriters: Dict[str, Callable[[AnyModel, PathOrStream], None]] = {
+    ".svg": write_svg,
+    ".svgz": write_svg,
+    ".json": write_json,
+    ".ndjson": write_ndjson,
+    ".py": write_python,
+    ".vglm": write_binary,
+    ".hpgl": write_hpgl,
+    ".gcode": write_gcode,
+}
+
+
+def _get_format_suffix(path: Union[str, PathLike]) -> str:
+
+    # Ignore the suffix of compressed files.
+    path = str(path)
+    if path.endswith(".gz"):
+        path = path[:-len(".gz")]
+    i = path.rfind(".")
+    return path[i:].lower() if i >= 0 else ""
+
+
+def read_model(path: Union[str, PathLike]) -> AnyModel:
+    suffix = _get_format_suffix(path)
+    if suffix not in _kModelReaders:
+        raise ValueError(f"unsupported model format '{suffix}'")
+    return _kModelReaders[suffix](path)
+
+
+def write_model(model: AnyModel, path: Union[str, PathLike]) -> None:
+    suffix = _get_format_suffix(path)
+    if suffix not in _kModelWriters:
+        raise ValueError(f"unsupported model format '{suffix}'")
+    _kModelWriters[suffix](model, path)
@@ -1,7 +1,7 @@
 from functools import reduce
 from math import acos, atan2, copysign, cos, inf, isfinite, sin, sqrt
 from operator import add, sub
-from typing import Callable, List, Tuple, Union
+from typing import Callable, Iterable, List, Tuple, Union
 
 Vec2 = Tuple[float, float]
 Vec3 = Tuple[float, float, float]
@@ -326,6 +326,19 @@ def mul_mat4_vec4(U: Mat4, v: Vec4) -> Vec4:
     return tuple([dot_vec4(u, v) for u in U])
 
 
+def mul_mat4_vec4s(U: Mat4, vs: Iterable[Vec4]) -> List[Vec4]:
+
+    # Unpack the matrix once and apply it to all vectors in a single pass. The
+    # order of operations matches `mul_mat4_vec4` so that results are identical.
+    (u00, u01, u02, u03), (u10, u11, u12, u13), (u20, u21, u22,
+                                                 u23), (u30, u31, u32, u33) = U
+    return [(u00 * vx + u01 * vy + u02 * vz + u03 * vw,
+             u10 * vx + u11 * vy + u12 * vz + u13 * vw,
+             u20 * vx + u21 * vy + u22 * vz + u23 * vw,
+             u30 * vx + u31 * vy + u32 * vz + u33 * vw)
+            for vx, vy, vz, vw in vs]
+
+
 def _mul_mat4(U: Mat4, V: Mat4) -> Mat4:
     l = len(U)
     m = len(V)
@@ -1,13 +1,70 @@
-from typing import Iterable, List, Union
+from array import array
+from sys import intern
+from typing import (Any, Callable, Dict, Iterable, List, Optional, Sequence,
+                    Tuple, Union)
 
-from vecgl.linalg import (Mat4, Vec3, Vec4, mul_mat4, mul_mat4_vec4, str_vec4,
+from vecgl.linalg import (Mat4, Vec3, Vec4, get_unit_mat4, mul_mat4,
+                          mul_mat4_vec4, mul_mat4_vec4s, str_vec4,
                           vec3_to_homogenious_vec4)
 
 kDefaultSurfaceColor = "lightgray"
 kDefaultLineColor = "black"
 
 
+def _as_list(a: Any) -> list:
+
+    # Arrays, such as numpy's, are converted in bulk rather than element by
+    # element.
+    tolist = getattr(a, "tolist", None)
+    return tolist() if tolist is not None else list(a)
+
+
+def _as_vec4(p: Sequence[float]) -> Vec4:
+    if len(p) == 3:
+        return (*p, 1.0)
+    if len(p) == 4:
+        return tuple(p)
+    raise ValueError(f"expected a 3- or 4-vector but got {len(p)} components")
+
+
+def _as_vec4s(ps: Any) -> List[Vec4]:
+    return [_as_vec4(p) for p in _as_list(ps)]
+
+
+def _as_face_indices(faces: Any, num_vertices: int) -> array:
+
+    # Flatten the faces and ensure that they refer to the given vertices.
+    indices: List[int] = []
+    for f in _as_list(faces):
+        if len(f) != 3:
+            raise ValueError(
+                f"expected three vertex indices per face but got {len(f)}")
+        indices.extend(f)
+    if indices and (min(indices) < 0 or max(indices) >= num_vertices):
+        raise ValueError("face index out of range")
+    return array("I", indices)
+
+
+def _intern_color(color: Any) -> Any:
+
+    # Share equal color strings. Other color objects are passed through as they
+    # are, e.g. to Tk or SVG.
+    return intern(color) if isinstance(color, str) else color
+
+
+def _as_colors(colors: Union[str, Sequence[str]], n: int) -> List[str]:
+
+    # A single color applies to all primitives.
+    if isinstance(colors, str):
+        return [intern(colors)] * n
+    colors = [_intern_color(c) for c in _as_list(colors)]
+    if len(colors) != n:
+        raise ValueError(f"expected {n} colors but got {len(colors)}")
+    return colors
+
+
 class Point:
+    __slots__ = "p", "color"
 
     def __init__(self, p: Vec4, color: str):
         self.p = p
@@ -22,6 +79,7 @@ class Point:
 
 
 class Line:
+    __slots__ = "p", "q", "color"
 
     def __init__(self, p: Vec4, q: Vec4, color: str):
         self.p = p
@@ -43,6 +101,7 @@ class Line:
 
 
 class Triangle:
+    __slots__ = "p", "q", "r", "color"
 
     def __init__(self, p: Vec4, q: Vec4, r: Vec4, color: str):
         self.p = p
@@ -61,16 +120,39 @@ class Triangle:
         return f"{str_vec4(self.p)}, {str_vec4(self.q)}, {str_vec4(self.r)}"
 
 
+class Instance:
+
+    def __init__(self, model: "AnyModel", U: Mat4):
+        self.model = model
+        self.U = U
+
+
 class Model:
 
     def __init__(self):
+
+        # Every primitive is an object of its own, which makes models easy to
+        # build and edit. Large models are stored more compactly as IndexedModel.
         self.points: List[Point] = []
         self.lines: List[Line] = []
         self.triangles: List[Triangle] = []
+        self.instances: List[Instance] = []
+
+    @property
+    def num_points(self) -> int:
+        return len(self.points)
+
+    @property
+    def num_lines(self) -> int:
+        return len(self.lines)
+
+    @property
+    def num_triangles(self) -> int:
+        return len(self.triangles)
 
     def add_point(self, p: Union[Vec3, Vec4], color: str = kDefaultLineColor):
         p = vec3_to_homogenious_vec4(p)
-        self.points.append(Point(p, color))
+        self.points.append(Point(p, _intern_color(color)))
 
     def add_line(self,
                  p: Union[Vec3, Vec4],
@@ -78,7 +160,20 @@ class Model:
                  color: str = kDefaultLineColor):
         p = vec3_to_homogenious_vec4(p)
         q = vec3_to_homogenious_vec4(q)
-        self.lines.append(Line(p, q, color))
+        self.lines.append(Line(p, q, _intern_color(color)))
+
+    def add_lines_array(self,
+                        ps: Sequence[Union[Vec3, Vec4]],
+                        qs: Sequence[Union[Vec3, Vec4]],
+                        colors: Union[str, Sequence[str]] = kDefaultLineColor):
+        ps = _as_vec4s(ps)
+        qs = _as_vec4s(qs)
+        if len(ps) != len(qs):
+            raise ValueError(
+                f"expected as many end points as start points but got {len(qs)} "
+                f"and {len(ps)}")
+        colors = _as_colors(colors, len(ps))
+        self.lines += map(Line, ps, qs, colors)
 
     def add_line_chain(self,
                        ps: Iterable[Union[Vec3, Vec4]],
@@ -105,7 +200,20 @@ class Model:
         p = vec3_to_homogenious_vec4(p)
         q = vec3_to_homogenious_vec4(q)
         r = vec3_to_homogenious_vec4(r)
-        self.triangles.append(Triangle(p, q, r, color))
+        self.triangles.append(Triangle(p, q, r, _intern_color(color)))
+
+    def add_triangles_array(
+            self,
+            vs: Sequence[Union[Vec3, Vec4]],
+            faces: Sequence[Sequence[int]],
+            colors: Union[str, Sequence[str]] = kDefaultSurfaceColor):
+        vs = _as_vec4s(vs)
+        ids = _as_face_indices(faces, len(vs))
+        colors = _as_colors(colors, len(ids) // 3)
+        self.triangles += [
+            Triangle(vs[i], vs[j], vs[k], c)
+            for i, j, k, c in zip(ids[0::3], ids[1::3], ids[2::3], colors)
+        ]
 
     def add_triangle_strip(self,
                            ps: Iterable[Union[Vec3, Vec4]],
@@ -129,17 +237,387 @@ class Model:
                     self.add_triangle(p, q, r, color)
                 q = r
 
-    def add_model(self, model: "Model"):
+    def add_model(self, model: "AnyModel"):
         self.points += model.points
         self.lines += model.lines
         self.triangles += model.triangles
+        self.instances += model.instances
+
+    def add_instance(self, model: "AnyModel", U: Mat4, *Us: Mat4):
+
+        # Refer to the shared model rather than copying its primitives. Instances
+        # are expanded only when needed, e.g. during rendering.
+        self.instances.append(Instance(model, mul_mat4(U, *Us)))
 
     def _transform(self, U: Mat4):
+
+        # Gather all vertices, transform them in a single batch, and scatter them
+        # back to new primitives.
+        num_points = len(self.points)
+        num_line_vertices = 2 * len(self.lines)
+        vs = [pt.p for pt in self.points]
+        vs += [v for ln in self.lines for v in (ln.p, ln.q)]
+        vs += [v for tr in self.triangles for v in (tr.p, tr.q, tr.r)]
+        transformed_vs = mul_mat4_vec4s(U, vs)
+        point_vs = transformed_vs[:num_points]
+        line_vs = transformed_vs[num_points:num_points + num_line_vertices]
+        triangle_vs = transformed_vs[num_points + num_line_vertices:]
         transformed = Model()
-        transformed.points = [pt.transform(U) for pt in self.points]
-        transformed.lines = [ln.transform(U) for ln in self.lines]
-        transformed.triangles = [tr.transform(U) for tr in self.triangles]
+        transformed.points = [
+            Point(p, pt.color) for pt, p in zip(self.points, point_vs)
+        ]
+        transformed.lines = [
+            Line(p, q, ln.color)
+            for ln, p, q in zip(self.lines, line_vs[0::2], line_vs[1::2])
+        ]
+        transformed.triangles = [
+            Triangle(p, q, r, tr.color)
+            for tr, p, q, r in zip(self.triangles, triangle_vs[0::3],
+                                   triangle_vs[1::3], triangle_vs[2::3])
+        ]
+
+        # Instances are transformed by composing their transforms.
+        transformed.instances = [
+            Instance(inst.model, mul_mat4(U, inst.U))
+            for inst in self.instances
+        ]
         return transformed
 
-    def transform(self, *Us: Mat4):
-        return self._transform(mul_mat4(*Us))
+    def _snapshot(self) -> "Model":
+        snapshot = Model()
+        snapshot.points = list(self.points)
+        snapshot.lines = list(self.lines)
+        snapshot.triangles = list(self.triangles)
+        snapshot.instances = list(self.instances)
+        return snapshot
+
+    def transform(self, *Us: Mat4) -> "TransformedModel":
+        return TransformedModel(self, mul_mat4(*Us))
+
+
+class IndexedModel:
+
+    def __init__(self):
+
+        # Vertices are stored as a flat buffer of homogenious coordinates and
+        # primitives as flat buffers of vertex indices. Colors refer to the
+        # model's palette.
+        self.vertices = array("d")
+        self.palette: List[str] = []
+        self.point_indices = array("I")
+        self.point_colors = array("I")
+        self.line_indices = array("I")
+        self.line_colors = array("I")
+        self.triangle_indices = array("I")
+        self.triangle_colors = array("I")
+        self._palette_indices: Dict[str, int] = {}
+        self._primitives: Dict[str, Tuple[tuple, tuple]] = {}
+
+    @property
+    def num_vertices(self) -> int:
+        return len(self.vertices) // 4
+
+    @property
+    def num_points(self) -> int:
+        return len(self.point_indices)
+
+    @property
+    def num_lines(self) -> int:
+        return len(self.line_indices) // 2
+
+    @property
+    def num_triangles(self) -> int:
+        return len(self.triangle_indices) // 3
+
+    def get_vertex(self, i: int) -> Vec4:
+        vs = self.vertices
+        return vs[4 * i], vs[4 * i + 1], vs[4 * i + 2], vs[4 * i + 3]
+
+    def get_vertices(self) -> List[Vec4]:
+        vs = self.vertices
+        return list(zip(vs[0::4], vs[1::4], vs[2::4], vs[3::4]))
+
+    def add_vertex(self, p: Union[Vec3, Vec4]) -> int:
+        p = vec3_to_homogenious_vec4(p)
+        self.vertices.extend(p)
+        return self.num_vertices - 1
+
+    def add_vertices_array(self, vs: Sequence[Union[Vec3, Vec4]]) -> int:
+
+        # Return the index of the first added vertex.
+        i = self.num_vertices
+        self.vertices.extend(array("d", [a for v in _as_vec4s(vs) for a in v]))
+        return i
+
+    @property
+    def instances(self) -> Tuple[Instance, ...]:
+        return ()
+
+    def get_color_index(self, color: str) -> int:
+        if len(self._palette_indices) != len(self.palette):
+            self._palette_indices = {c: i for i, c in enumerate(self.palette)}
+        i = self._palette_indices.get(color)
+        if i is None:
+            i = len(self.palette)
+            self.palette.append(color)
+            self._palette_indices[color] = i
+        return i
+
+    def add_point(self, i: int, color: str = kDefaultLineColor):
+        self.point_indices.append(i)
+        self.point_colors.append(self.get_color_index(color))
+
+    def add_line(self, i: int, j: int, color: str = kDefaultLineColor):
+        self.line_indices.extend((i, j))
+        self.line_colors.append(self.get_color_index(color))
+
+    def add_triangle(self,
+                     i: int,
+                     j: int,
+                     k: int,
+                     color: str = kDefaultSurfaceColor):
+        self.triangle_indices.extend((i, j, k))
+        self.triangle_colors.append(self.get_color_index(color))
+
+    def _get_color_indices(self, colors: Union[str, Sequence[str]],
+                           n: int) -> array:
+        if isinstance(colors, str):
+            return array("I", [self.get_color_index(colors)]) * n
+        return array("I", map(self.get_color_index, _as_colors(colors, n)))
+
+    def add_lines_array(self,
+                        ps: Sequence[Union[Vec3, Vec4]],
+                        qs: Sequence[Union[Vec3, Vec4]],
+                        colors: Union[str, Sequence[str]] = kDefaultLineColor):
+
+        # Interleave the start and end points such that line n refers to the
+        # vertices 2n and 2n + 1.
+        ps = _as_vec4s(ps)
+        qs = _as_vec4s(qs)
+        if len(ps) != len(qs):
+            raise ValueError(
+                f"expected as many end points as start points but got {len(qs)} "
+                f"and {len(ps)}")
+        color_indices = self._get_color_indices(colors, len(ps))
+        i = self.num_vertices
+        self.vertices.extend(
+            array("d", [a for p, q in zip(ps, qs) for a in (*p, *q)]))
+        self.line_indices.extend(range(i, i + 2 * len(ps)))
+        self.line_colors.extend(color_indices)
+
+    def add_triangles_array(
+            self,
+            vs: Sequence[Union[Vec3, Vec4]],
+            faces: Sequence[Sequence[int]],
+            colors: Union[str, Sequence[str]] = kDefaultSurfaceColor):
+
+        # The face indices refer to the given vertices and are offset by the
+        # vertices already in the model.
+        vs = _as_vec4s(vs)
+        indices = _as_face_indices(faces, len(vs))
+        color_indices = self._get_color_indices(colors, len(indices) // 3)
+        i = self.add_vertices_array(vs)
+        if i != 0:
+            indices = array("I", [j + i for j in indices])
+        self.triangle_indices.extend(indices)
+        self.triangle_colors.extend(color_indices)
+
+    # The primitives are materialized on first access. Primitives that share a
+    # vertex also share its tuple. They are returned as read-only snapshots,
+    # i.e. as tuples, so that changes are not silently lost. Use the add methods
+    # to change the model. The snapshots are cached until the model grows or its
+    # buffers are replaced. Changes to individual elements are not detected.
+
+    def _get_primitives(
+            self, kind: str, indices: array, colors: array,
+            build: Callable[[List[Vec4], List[str]], tuple]) -> tuple:
+        key = (id(self.vertices), len(self.vertices), id(indices),
+               len(indices), id(colors), len(colors), id(self.palette),
+               len(self.palette))
+        cached = self._primitives.get(kind)
+        if cached is None or cached[0] != key:
+            cached = key, build(self.get_vertices(), self.palette)
+            self._primitives[kind] = cached
+        return cached[1]
+
+    @property
+    def points(self) -> Tuple[Point, ...]:
+        return self._get_primitives(
+            "points", self.point_indices, self.point_colors,
+            lambda vs, palette: tuple(
+                Point(vs[i], palette[c])
+                for i, c in zip(self.point_indices, self.point_colors)))
+
+    @property
+    def lines(self) -> Tuple[Line, ...]:
+        ids = self.line_indices
+        return self._get_primitives(
+            "lines", ids, self.line_colors, lambda vs, palette: tuple(
+                Line(vs[i], vs[j], palette[c])
+                for i, j, c in zip(ids[0::2], ids[1::2], self.line_colors)))
+
+    @property
+    def triangles(self) -> Tuple[Triangle, ...]:
+        ids = self.triangle_indices
+        return self._get_primitives(
+            "triangles", ids, self.triangle_colors, lambda vs, palette: tuple(
+                Triangle(vs[i], vs[j], vs[k], palette[c]) for i, j, k, c in
+                zip(ids[0::3], ids[1::3], ids[2::3], self.triangle_colors)))
+
+    def _transform(self, U: Mat4) -> "IndexedModel":
+
+        # Transform every shared vertex exactly once.
+        transformed = IndexedModel()
+        transformed_vs = mul_mat4_vec4s(U, self.get_vertices())
+        transformed.vertices = array("d",
+                                     [a for v in transformed_vs for a in v])
+        transformed.palette = list(self.palette)
+        transformed.point_indices = array("I", self.point_indices)
+        transformed.point_colors = array("I", self.point_colors)
+        transformed.line_indices = array("I", self.line_indices)
+        transformed.line_colors = array("I", self.line_colors)
+        transformed.triangle_indices = array("I", self.triangle_indices)
+        transformed.triangle_colors = array("I", self.triangle_colors)
+        return transformed
+
+    def _snapshot(self) -> "IndexedModel":
+
+        # Copy the growable buffers. Buffers that refer to memory, e.g. to a
+        # mapped file, cannot change and are shared.
+        snapshot = IndexedModel()
+        for name in ("vertices", "point_indices", "point_colors",
+                     "line_indices", "line_colors", "triangle_indices",
+                     "triangle_colors"):
+            data = getattr(self, name)
+            if isinstance(data, array):
+                data = array(data.typecode, data)
+            setattr(snapshot, name, data)
+        snapshot.palette = list(self.palette)
+        return snapshot
+
+    def transform(self, *Us: Mat4) -> "TransformedModel":
+        return TransformedModel(self, mul_mat4(*Us))
+
+
+class TransformedModel(Model):
+
+    def __init__(self, model: Union[Model, IndexedModel, "TransformedModel"],
+                 U: Mat4):
+
+        # Record the transform as pending and fold it into any pending transform
+        # of the underlying model. The vertices are transformed only once, when
+        # the primitives are first accessed. The underlying model is
+        # snapshotted, i.e. later changes to it are not visible. Transformed
+        # models support the Model API, and changing them materializes them.
+        if isinstance(model, TransformedModel) and model._transformed is None:
+            U = mul_mat4(U, model.U)
+            model = model.model
+        else:
+            model = model._snapshot()
+        self.model = model
+        self.U = U
+        self._transformed: Optional[Union[Model, IndexedModel]] = None
+
+    def get_pending(self) -> Tuple[Union[Model, IndexedModel], Mat4]:
+
+        # Once materialized, the transformed model has nothing pending. It may
+        # have been changed since.
+        if self._transformed is not None:
+            return self._transformed, get_unit_mat4()
+        return self.model, self.U
+
+    def materialize(self) -> Union[Model, IndexedModel]:
+        if self._transformed is None:
+            self._transformed = self.model._transform(self.U)
+        return self._transformed
+
+    def _as_model(self) -> Model:
+
+        # The primitives are accessed through the Model API, which may change
+        # them. Indexed models are converted once for that purpose.
+        transformed = self.materialize()
+        if isinstance(transformed, IndexedModel):
+            model = Model()
+            model.points = list(transformed.points)
+            model.lines = list(transformed.lines)
+            model.triangles = list(transformed.triangles)
+            self._transformed = transformed = model
+        return transformed
+
+    def _snapshot(self) -> Union[Model, IndexedModel]:
+        return self.materialize()._snapshot()
+
+    @property
+    def num_points(self) -> int:
+        return (self.model
+                if self._transformed is None else self._transformed).num_points
+
+    @property
+    def num_lines(self) -> int:
+        return (self.model
+                if self._transformed is None else self._transformed).num_lines
+
+    @property
+    def num_triangles(self) -> int:
+        return (self.model if self._transformed is None else
+                self._transformed).num_triangles
+
+    @property
+    def points(self) -> List[Point]:
+        return self._as_model().points
+
+    @points.setter
+    def points(self, points: List[Point]):
+        self._as_model().points = points
+
+    @property
+    def lines(self) -> List[Line]:
+        return self._as_model().lines
+
+    @lines.setter
+    def lines(self, lines: List[Line]):
+        self._as_model().lines = lines
+
+    @property
+    def triangles(self) -> List[Triangle]:
+        return self._as_model().triangles
+
+    @triangles.setter
+    def triangles(self, triangles: List[Triangle]):
+        self._as_model().triangles = triangles
+
+    @property
+    def instances(self) -> List[Instance]:
+        return self._as_model().instances
+
+    @instances.setter
+    def instances(self, instances: List[Instance]):
+        self._as_model().instances = instances
+
+    def transform(self, *Us: Mat4) -> "TransformedModel":
+        return TransformedModel(self, mul_mat4(*Us))
+
+
+AnyModel = Union[Model, IndexedModel, TransformedModel]
+
+
+def expand_instances(model: AnyModel) -> AnyModel:
+
+    # Models without instances are returned as they are, with pending
+    # transforms applied.
+    if isinstance(model, TransformedModel):
+        model = model.materialize()
+    if not model.instances:
+        return model
+
+    # Otherwise, collect all primitives, including those of nested instances.
+    expanded = Model()
+    expanded.points = list(model.points)
+    expanded.lines = list(model.lines)
+    expanded.triangles = list(model.triangles)
+    for inst in model.instances:
+        inst_model = expand_instances(inst.model.transform(inst.U))
+        expanded.points += inst_model.points
+        expanded.lines += inst_model.lines
+        expanded.triangles += inst_model.triangles
+    return expanded
@@ -1,16 +1,25 @@
-from typing import Iterable, Iterator, List, Optional, Tuple
+from math import inf
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from vecgl.bb3tree import BB3Tree, BoundingBox3, create_bb3tree
-from vecgl.linalg import (Vec3, add_vec3, cross_vec3, dot_vec3,
+from vecgl.bb3tree import (BB3Tree, BoundingBox3, FlatBB3Tree, create_bb3tree,
+                           create_flat_bb3tree)
+from vecgl.linalg import (Vec2, Vec3, add_vec3, cross_vec3, dot_vec3,
                           homogenious_vec4_to_vec3, is_finite_vec3,
-                          kDefaultEps, max_vec3, min_vec3, norm2_vec3,
-                          ortho_vec2, right_of_vec2, scale_vec3, sub_vec2,
-                          sub_vec3, unit_vec3, vec3_to_homogenious_vec4,
-                          vec3_to_xy_vec2, xy_vec2_to_vec3, z_vec3)
-from vecgl.model import Line, Model, Point, Triangle
+                          kDefaultEps, max_vec3, min_vec3, mul_mat4_vec4s,
+                          norm2_vec3, ortho_vec2, right_of_vec2, scale_vec3,
+                          sub_vec2, sub_vec3, uniform_vec3, unit_vec3,
+                          vec3_to_homogenious_vec4, vec3_to_xy_vec2, w_vec4,
+                          xy_vec2_to_vec3, z_vec3)
+from vecgl.model import (AnyModel, IndexedModel, Instance, Line, Model, Point,
+                         TransformedModel, Triangle)
 
 Plane3 = Tuple[Vec3, Vec3]
 
+# Primitives together with the cartesian coordinates of their vertices in NDC.
+NdcPoint = Tuple[Point, Vec3]
+NdcLine = Tuple[Line, Vec3, Vec3]
+NdcTriangle = Tuple[Triangle, Vec3, Vec3, Vec3]
+
 
 def _get_clipping_space_planes() -> Iterator[Plane3]:
 
@@ -27,12 +36,8 @@ def _get_clipping_space_planes() -> Iterator[Plane3]:
             yield pl
 
 
-def _get_triangle_front_plane(tr: Triangle) -> Optional[Plane3]:
-    p, q, r = tr.p, tr.q, tr.r
-
-    # Do this in non-homogenious coordinates.
-    p, q, r = homogenious_vec4_to_vec3(p), homogenious_vec4_to_vec3(
-        q), homogenious_vec4_to_vec3(r)
+def _get_triangle_front_plane(tr: NdcTriangle) -> Optional[Plane3]:
+    _, p, q, r = tr
 
     # Compute normal and ensure that it points away from the covered volume.
     pq = sub_vec3(q, p)
@@ -48,12 +53,8 @@ def _get_triangle_front_plane(tr: Triangle) -> Optional[Plane3]:
     return p, n
 
 
-def _get_triangle_side_planes(tr: Triangle) -> Iterator[Plane3]:
-    p, q, r = tr.p, tr.q, tr.r
-
-    # Do this in non-homogenious coordinates.
-    p, q, r = homogenious_vec4_to_vec3(p), homogenious_vec4_to_vec3(
-        q), homogenious_vec4_to_vec3(r)
+def _get_triangle_side_planes(tr: NdcTriangle) -> Iterator[Plane3]:
+    _, p, q, r = tr
 
     # Project to the xy-plane to compute the normals.
     p2 = vec3_to_xy_vec2(p)
@@ -86,41 +87,53 @@ def _get_triangle_side_planes(tr: Triangle) -> Iterator[Plane3]:
         yield r, n_rp
 
 
-def _get_relevant_triangles_query(bb: BoundingBox3) -> BoundingBox3:
+class _FlatTriangleTree:
+
+    def __init__(self, tree: FlatBB3Tree, ndc_triangles: List[NdcTriangle]):
+
+        # The flat tree refers to the triangles by their index.
+        self._tree = tree
+        self._ndc_triangles = ndc_triangles
+
+    def find_in_front(self,
+                      footprint_xy: Tuple[Vec2, Vec2],
+                      max_z: float,
+                      min_z: float = -inf) -> Iterator[NdcTriangle]:
+        ndc_triangles = self._ndc_triangles
+        for i in self._tree.find_in_front(footprint_xy, max_z, min_z):
+            yield ndc_triangles[i]
+
+
+TriangleTree = Union[BB3Tree, _FlatTriangleTree]
+
+
+def _find_relevant_triangles(triangle_tree: TriangleTree,
+                             bb: BoundingBox3) -> Iterator[NdcTriangle]:
 
     # Relevant triangle are all those that
     #   (i)  intersect the bounding box, or
     #   (ii) the clipping space in front of it.
+    # Subtrees that lie entirely behind the bounding box can be pruned.
     lb_x, lb_y, _ = bb.lb
-    query_lb = lb_x, lb_y, -1.0
-    query_ub = bb.ub
-    return BoundingBox3(query_lb, query_ub)
+    ub_x, ub_y, ub_z = bb.ub
+    footprint_xy = (lb_x, lb_y), (ub_x, ub_y)
+    return triangle_tree.find_in_front(footprint_xy, ub_z, min_z=-1.0)
 
 
-def _get_point_bbox(pt: Point) -> BoundingBox3:
-
-    # Do this in non-homogenious coordinates.
-    p = homogenious_vec4_to_vec3(pt.p)
-
+def _get_point_bbox(pt: NdcPoint) -> BoundingBox3:
+    _, p = pt
     return BoundingBox3(p, p)
 
 
-def _get_line_bbox(ln: Line) -> BoundingBox3:
-
-    # Do this in non-homogenious coordinates.
-    p, q = homogenious_vec4_to_vec3(ln.p), homogenious_vec4_to_vec3(ln.q)
-
+def _get_line_bbox(ln: NdcLine) -> BoundingBox3:
+    _, p, q = ln
     lb = min_vec3(p, q)
     ub = max_vec3(p, q)
     return BoundingBox3(lb, ub)
 
 
-def _get_triangle_bbox(tr: Triangle) -> BoundingBox3:
-
-    # Do this in non-homogenious coordinates.
-    p, q, r = homogenious_vec4_to_vec3(tr.p), homogenious_vec4_to_vec3(
-        tr.q), homogenious_vec4_to_vec3(tr.r)
-
+def _get_triangle_bbox(tr: NdcTriangle) -> BoundingBox3:
+    _, p, q, r = tr
     lb = min_vec3(p, q, r)
     ub = max_vec3(p, q, r)
     return BoundingBox3(lb, ub)
@@ -138,10 +151,8 @@ def _is_point_visible_wrt_plane(pl: Plane3, q: Vec3,
     return dot_vec3(pq, n) > threshold
 
 
-def _is_point_visible_wrt_clipping_space(pt: Point) -> bool:
-
-    # Do this in non-homogenious coordinates.
-    p = homogenious_vec4_to_vec3(pt.p)
+def _is_point_visible_wrt_clipping_space(pt: NdcPoint) -> bool:
+    _, p = pt
 
     # For a point to be visible, it must be on or within all clipping space
     # boundary planes.
@@ -152,10 +163,8 @@ def _is_point_visible_wrt_clipping_space(pt: Point) -> bool:
     return True
 
 
-def _is_point_visible_wrt_triangle(pt: Point, tr: Triangle) -> bool:
-
-    # Do this in non-homogenious coordinates.
-    p = homogenious_vec4_to_vec3(pt.p)
+def _is_point_visible_wrt_triangle(pt: NdcPoint, tr: NdcTriangle) -> bool:
+    _, p = pt
 
     # For a point to be visible, it must be
     #   (i)  on or in front of the triangle plane, or
@@ -172,8 +181,8 @@ def _is_point_visible_wrt_triangle(pt: Point, tr: Triangle) -> bool:
     return False
 
 
-def _get_visible_points(points: Iterable[Point],
-                        triangle_tree: BB3Tree) -> Iterable[Point]:
+def _get_visible_points(points: Iterable[NdcPoint],
+                        triangle_tree: TriangleTree) -> Iterable[Point]:
     for pt in points:
 
         # Points must be
@@ -181,10 +190,11 @@ def _get_visible_points(points: Iterable[Point],
         #   (ii) not covered by any triangle.
         if not _is_point_visible_wrt_clipping_space(pt):
             continue
-        query = _get_relevant_triangles_query(_get_point_bbox(pt))
-        rel_triangles = triangle_tree.find(query)
+        rel_triangles = _find_relevant_triangles(triangle_tree,
+                                                 _get_point_bbox(pt))
         if all(_is_point_visible_wrt_triangle(pt, tr) for tr in rel_triangles):
-            yield pt
+            pt_primitive, _ = pt
+            yield pt_primitive
 
 
 def _get_visible_line_fraction_wrt_plane(
@@ -216,14 +226,12 @@ def _get_visible_line_fraction_wrt_plane(
     return is_front, intersection
 
 
-def _get_line_fragment_from_fractions(ln: Line, fraction_start: float,
+def _get_line_fragment_from_fractions(ln: NdcLine, fraction_start: float,
                                       fraction_end: float,
-                                      inverted: bool) -> Iterator[Line]:
+                                      inverted: bool) -> Iterator[NdcLine]:
     assert 0.0 <= fraction_start and fraction_start <= 1.0
     assert 0.0 <= fraction_end and fraction_end <= 1.0
-
-    # Do this in non-homogenious coordinates.
-    p, q = homogenious_vec4_to_vec3(ln.p), homogenious_vec4_to_vec3(ln.q)
+    ln_primitive, p, q = ln
 
     if not is_finite_vec3(p, q):
         return
@@ -238,28 +246,31 @@ def _get_line_fragment_from_fractions(ln: Line, fraction_start: float,
 
     # Find the end points of the visible line fragment(s). Use the original
     # homogenious line points if possible to avoid numeric inconsistencies.
-    p_fraction_start = ln.p
+    # Carry the cartesian coordinates along with the fragments.
+    p_fraction_start, p_fraction_start3 = ln_primitive.p, p
     if fraction_start * pq_length > kDefaultEps:
-        p_fraction_start = vec3_to_homogenious_vec4(
-            add_vec3(p, scale_vec3(fraction_start, pq)))
-    q_fraction_end = ln.q
+        p_fraction_start3 = add_vec3(p, scale_vec3(fraction_start, pq))
+        p_fraction_start = vec3_to_homogenious_vec4(p_fraction_start3)
+    q_fraction_end, q_fraction_end3 = ln_primitive.q, q
     if fraction_end * pq_length < pq_length - kDefaultEps:
-        q_fraction_end = vec3_to_homogenious_vec4(
-            add_vec3(p, scale_vec3(fraction_end, pq)))
+        q_fraction_end3 = add_vec3(p, scale_vec3(fraction_end, pq))
+        q_fraction_end = vec3_to_homogenious_vec4(q_fraction_end3)
 
     # Yield the line fragments as requested.
-    if inverted and ln.p != p_fraction_start:
-        yield Line(ln.p, p_fraction_start, ln.color)
+    color = ln_primitive.color
+    if inverted and ln_primitive.p != p_fraction_start:
+        yield Line(ln_primitive.p, p_fraction_start,
+                   color), p, p_fraction_start3
     if not inverted:
-        yield Line(p_fraction_start, q_fraction_end, ln.color)
-    if inverted and q_fraction_end != ln.q:
-        yield Line(q_fraction_end, ln.q, ln.color)
+        yield Line(p_fraction_start, q_fraction_end,
+                   color), p_fraction_start3, q_fraction_end3
+    if inverted and q_fraction_end != ln_primitive.q:
+        yield Line(q_fraction_end, ln_primitive.q, color), q_fraction_end3, q
 
 
-def _get_visible_line_fragment_wrt_clipping_space(ln: Line) -> Iterator[Line]:
-
-    # Do this in non-homogenious coordinates.
-    p, q = homogenious_vec4_to_vec3(ln.p), homogenious_vec4_to_vec3(ln.q)
+def _get_visible_line_fragment_wrt_clipping_space(
+        ln: NdcLine) -> Iterator[NdcLine]:
+    _, p, q = ln
 
     # There will be at most one visible line fragment within the clipping space.
     # For a line fragment to be visible, it must be on or within all clipping
@@ -281,11 +292,9 @@ def _get_visible_line_fragment_wrt_clipping_space(ln: Line) -> Iterator[Line]:
                                                  inverted=False)
 
 
-def _get_visible_line_fragments_wrt_triangle(ln: Line,
-                                             tr: Triangle) -> Iterator[Line]:
-
-    # Do this in non-homogenious coordinates.
-    p, q = homogenious_vec4_to_vec3(ln.p), homogenious_vec4_to_vec3(ln.q)
+def _get_visible_line_fragments_wrt_triangle(
+        ln: NdcLine, tr: NdcTriangle) -> Iterator[NdcLine]:
+    _, p, q = ln
 
     # There will be at most two visible line fragments that are not covered by
     # the triangle:
@@ -327,8 +336,8 @@ def _get_visible_line_fragments_wrt_triangle(ln: Line,
                                                  inverted=True)
 
 
-def _get_visible_line_fragments(lines: List[Line],
-                                triangle_tree: BB3Tree) -> Iterable[Line]:
+def _get_visible_line_fragments(lines: Iterable[NdcLine],
+                                triangle_tree: TriangleTree) -> Iterable[Line]:
 
     # Visible line fragments must be
     #   (i)  in clipping space, and
@@ -336,26 +345,245 @@ def _get_visible_line_fragments(lines: List[Line],
     for ln in lines:
         for ln_root_fragment in _get_visible_line_fragment_wrt_clipping_space(
                 ln):
-            query = _get_relevant_triangles_query(
-                _get_line_bbox(ln_root_fragment))
-            rel_triangles = triangle_tree.find(query)
+            rel_triangles = _find_relevant_triangles(
+                triangle_tree, _get_line_bbox(ln_root_fragment))
             ln_fragment_list = [ln_root_fragment]
             for tr in rel_triangles:
-                ln_fragment_list_next: List[Line] = []
+                ln_fragment_list_next: List[NdcLine] = []
                 for ln_fragment in ln_fragment_list:
                     ln_fragment_list_next.extend(
                         _get_visible_line_fragments_wrt_triangle(
                             ln_fragment, tr))
                 ln_fragment_list = ln_fragment_list_next
-            for ln_fragment in ln_fragment_list:
+            for ln_fragment, _, _ in ln_fragment_list:
                 yield ln_fragment
 
 
-def render(model: Model) -> Model:
+def _get_ndc_points(points: Iterable[Point]) -> List[NdcPoint]:
+    return [(pt, homogenious_vec4_to_vec3(pt.p)) for pt in points]
+
+
+def _get_ndc_lines(lines: Iterable[Line]) -> List[NdcLine]:
+    return [(ln, homogenious_vec4_to_vec3(ln.p),
+             homogenious_vec4_to_vec3(ln.q)) for ln in lines]
+
+
+def _get_ndc_triangles(triangles: Iterable[Triangle]) -> List[NdcTriangle]:
+    return [(tr, homogenious_vec4_to_vec3(tr.p),
+             homogenious_vec4_to_vec3(tr.q), homogenious_vec4_to_vec3(tr.r))
+            for tr in triangles]
+
+
+def _get_indexed_ndc_primitives(
+    model: IndexedModel
+) -> Tuple[List[NdcPoint], List[NdcLine], List[NdcTriangle]]:
+
+    # Divide every shared vertex only once.
+    vs = model.get_vertices()
+    vs3 = [homogenious_vec4_to_vec3(v) for v in vs]
+    palette = model.palette
+    ndc_points = [(Point(vs[i], palette[c]), vs3[i])
+                  for i, c in zip(model.point_indices, model.point_colors)]
+    ids = model.line_indices
+    ndc_lines = [(Line(vs[i], vs[j], palette[c]), vs3[i], vs3[j])
+                 for i, j, c in zip(ids[0::2], ids[1::2], model.line_colors)]
+    ids = model.triangle_indices
+    ndc_triangles = [(Triangle(vs[i], vs[j], vs[k],
+                               palette[c]), vs3[i], vs3[j], vs3[k])
+                     for i, j, k, c in zip(ids[0::3], ids[1::3], ids[2::3],
+                                           model.triangle_colors)]
+    return ndc_points, ndc_lines, ndc_triangles
+
+
+def _get_model_bbox(model: AnyModel) -> Optional[BoundingBox3]:
+
+    # Models with instances are not bounded here. Their instances are considered
+    # individually.
+    if isinstance(model, TransformedModel):
+        model = model.materialize()
+    if model.instances:
+        return None
+
+    # Bound all vertices in non-homogenious coordinates.
+    if isinstance(model, IndexedModel):
+        vs = model.get_vertices()
+    else:
+        vs = [pt.p for pt in model.points]
+        vs += [v for ln in model.lines for v in (ln.p, ln.q)]
+        vs += [v for tr in model.triangles for v in (tr.p, tr.q, tr.r)]
+    if not vs:
+        return None
+    vs3 = [homogenious_vec4_to_vec3(v) for v in vs]
+    if not is_finite_vec3(*vs3):
+        return None
+    return BoundingBox3(min_vec3(*vs3), max_vec3(*vs3))
+
+
+def _is_instance_outside_of_clipping_space(
+        inst: Instance, model_bbox: Optional[BoundingBox3]) -> bool:
+    if model_bbox is None:
+        return False
+
+    # Transform the corners of the model's bounding box. The transformed
+    # corners bound the transformed model only if they are all in front of the
+    # eye, i.e. w > 0.
+    (lb_x, lb_y, lb_z), (ub_x, ub_y, ub_z) = model_bbox.lb, model_bbox.ub
+    corners = [(x, y, z, 1.0) for x in (lb_x, ub_x) for y in (lb_y, ub_y)
+               for z in (lb_z, ub_z)]
+    corners = mul_mat4_vec4s(inst.U, corners)
+    if any(w_vec4(c) <= 0.0 for c in corners):
+        return False
+    corners3 = [homogenious_vec4_to_vec3(c) for c in corners]
+    inst_bbox = BoundingBox3(min_vec3(*corners3), max_vec3(*corners3))
+
+    # The instance can be culled if its bounding box does not intersect the
+    # clipping space.
+    clipping_space_bbox = BoundingBox3(uniform_vec3(-1.0 - kDefaultEps),
+                                       uniform_vec3(1.0 + kDefaultEps))
+    return inst_bbox.intersect(clipping_space_bbox).empty()
+
+
+def _is_triangle_outside_of_clipping_space(tr: NdcTriangle) -> bool:
+
+    # Like instances, triangles with vertices behind the eye are always kept.
+    triangle, p, q, r = tr
+    if not (w_vec4(triangle.p) > 0.0 and w_vec4(triangle.q) > 0.0
+            and w_vec4(triangle.r) > 0.0):
+        return False
+
+    # The triangle can be culled if its bounding box does not intersect the
+    # clipping space.
+    bound = 1.0 + kDefaultEps
+    return any(
+        min(p[a], q[a], r[a]) > bound or max(p[a], q[a], r[a]) < -bound
+        for a in range(3))
+
+
+def _add_ndc_primitives(model: AnyModel, ndc_points: List[NdcPoint],
+                        ndc_lines: List[NdcLine],
+                        ndc_triangles: List[NdcTriangle],
+                        model_bboxes: Dict[int, Optional[BoundingBox3]]):
+
+    # Apply pending transforms, if any.
+    if isinstance(model, TransformedModel):
+        model = model.materialize()
+
+    # Prepare the primitives by computing their cartesian NDC coordinates once.
+    # These are carried along with the primitives through the pipeline.
+    if isinstance(model, IndexedModel):
+        points, lines, triangles = _get_indexed_ndc_primitives(model)
+        ndc_points += points
+        ndc_lines += lines
+    else:
+        ndc_points += _get_ndc_points(model.points)
+        ndc_lines += _get_ndc_lines(model.lines)
+        triangles = _get_ndc_triangles(model.triangles)
+
+    # Triangles entirely outside of the clipping space can neither be seen nor
+    # occlude anything. They are dropped, just like culled instances.
+    ndc_triangles += [
+        tr for tr in triangles
+        if not _is_triangle_outside_of_clipping_space(tr)
+    ]
+
+    # Expand the instances unless they are entirely outside of the clipping
+    # space. Bounding boxes are computed once per shared model.
+    for inst in model.instances:
+        key = id(inst.model)
+        if key not in model_bboxes:
+            model_bboxes[key] = _get_model_bbox(inst.model)
+        if _is_instance_outside_of_clipping_space(inst, model_bboxes[key]):
+            continue
+        _add_ndc_primitives(inst.model.transform(inst.U), ndc_points,
+                            ndc_lines, ndc_triangles, model_bboxes)
+
+
+def _get_ndc_primitives(
+    model: AnyModel
+) -> Tuple[List[NdcPoint], List[NdcLine], List[NdcTriangle]]:
+    ndc_points: List[NdcPoint] = []
+    ndc_lines: List[NdcLine] = []
+    ndc_triangles: List[NdcTriangle] = []
+    _add_ndc_primitives(model, ndc_points, ndc_lines, ndc_triangles, {})
+    return ndc_points, ndc_lines, ndc_triangles
+
+
+def _prepare(
+    model: AnyModel
+) -> Tuple[List[NdcPoint], List[NdcLine], List[NdcTriangle], BB3Tree]:
+    ndc_points, ndc_lines, ndc_triangles = _get_ndc_primitives(model)
+    triangle_tree = create_bb3tree(ndc_triangles, _get_triangle_bbox)
+    return ndc_points, ndc_lines, ndc_triangles, triangle_tree
+
+
+def create_flat_triangle_tree(model: AnyModel) -> FlatBB3Tree:
+
+    # The tree refers to the triangles of the model in the order in which they
+    # are rendered. It can be shared, e.g. with other processes, to render the
+    # same model without building the tree again.
+    _, _, ndc_triangles = _get_ndc_primitives(model)
+    return create_flat_bb3tree(ndc_triangles, _get_triangle_bbox)
+
+
+def render(model: AnyModel) -> Model:
+    ndc_points, ndc_lines, ndc_triangles, triangle_tree = _prepare(model)
+
+    rendered = Model()
+    rendered.points = list(_get_visible_points(ndc_points, triangle_tree))
+    rendered.lines = list(_get_visible_line_fragments(ndc_lines,
+                                                      triangle_tree))
+
+    # Triangles are passed through as they are. Not yet implemented.
+    rendered.triangles = [tr for tr, _, _, _ in ndc_triangles]
+    return rendered
+
+
+def render_part(model: AnyModel,
+                part: int,
+                num_parts: int,
+                flat_triangle_tree: Optional[FlatBB3Tree] = None) -> Model:
+
+    # Use the given triangle tree, if any. It must have been created from the
+    # same model.
+    triangle_tree: TriangleTree
+    if flat_triangle_tree is None:
+        ndc_points, ndc_lines, ndc_triangles, triangle_tree = _prepare(model)
+    else:
+        ndc_points, ndc_lines, ndc_triangles = _get_ndc_primitives(model)
+        triangle_tree = _FlatTriangleTree(flat_triangle_tree, ndc_triangles)
+
+    # Render one of `num_parts` consecutive slices of the lines. The first part
+    # also holds the triangles and the visible points. Together, the parts in
+    # order amount to the result of `render`.
     rendered = Model()
-    triangle_tree = create_bb3tree(model.triangles, _get_triangle_bbox)
-    rendered.points = list(_get_visible_points(model.points, triangle_tree))
+    if part == 0:
+        rendered.points = list(_get_visible_points(ndc_points, triangle_tree))
+        rendered.triangles = [tr for tr, _, _, _ in ndc_triangles]
+    start = part * len(ndc_lines) // num_parts
+    end = (part + 1) * len(ndc_lines) // num_parts
     rendered.lines = list(
-        _get_visible_line_fragments(model.lines, triangle_tree))
-    rendered.triangles = model.triangles  # Not yet implemented.
+        _get_visible_line_fragments(ndc_lines[start:end], triangle_tree))
     return rendered
+
+
+kDefaultChunkSize = 256
+
+
+def render_progressively(
+        model: AnyModel,
+        chunk_size: int = kDefaultChunkSize) -> Iterator[Model]:
+    ndc_points, ndc_lines, ndc_triangles, triangle_tree = _prepare(model)
+
+    # Yield the triangles and the visible points first. Then, yield the visible
+    # fragments of the lines in chunks. Together, the chunks amount to the
+    # result of `render`.
+    rendered = Model()
+    rendered.points = list(_get_visible_points(ndc_points, triangle_tree))
+    rendered.triangles = [tr for tr, _, _, _ in ndc_triangles]
+    yield rendered
+    for i in range(0, len(ndc_lines), chunk_size):
+        rendered = Model()
+        rendered.lines = list(
+            _get_visible_line_fragments(ndc_lines[i:i + chunk_size],
+                                        triangle_tree))
+        yield rendered
@@ -1,7 +1,15 @@
+from heapq import heappop, heappush, nlargest
+from math import floor, inf, isfinite
+from operator import add
 from random import sample
-from typing import Iterable, Iterator
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from vecgl.model import Line, Model, Triangle
+from vecgl.linalg import (Vec3, Vec4, cross_vec3, dot_vec3,
+                          homogenious_vec4_to_vec3, is_eq_vec3, is_finite_vec3,
+                          kDefaultEps, mean_vec3, norm2_vec3, scale_vec3,
+                          sub_vec3, vec3_to_homogenious_vec4)
+from vecgl.model import (AnyModel, IndexedModel, Line, Model, Point, Triangle,
+                         expand_instances)
 
 
 def _get_triangles_grid(triangles: Iterable[Triangle]) -> Iterator[Line]:
@@ -45,3 +53,521 @@ def get_colorized_model(model: Model,
         for tr in model.triangles:
             colorized_model.add_triangle(tr.p, tr.q, tr.r, color)
     return colorized_model
+
+
+def get_indexed_model(model: AnyModel) -> IndexedModel:
+    model = expand_instances(model)
+    indexed_model = IndexedModel()
+
+    # Share vertices that are exactly equal.
+    vertex_indices: Dict[Vec4, int] = {}
+
+    def get_vertex_index(p: Vec4) -> int:
+        i = vertex_indices.get(p)
+        if i is None:
+            i = indexed_model.add_vertex(p)
+            vertex_indices[p] = i
+        return i
+
+    for pt in model.points:
+        indexed_model.add_point(get_vertex_index(pt.p), pt.color)
+    for ln in model.lines:
+        indexed_model.add_line(get_vertex_index(ln.p), get_vertex_index(ln.q),
+                               ln.color)
+    for tr in model.triangles:
+        indexed_model.add_triangle(get_vertex_index(tr.p),
+                                   get_vertex_index(tr.q),
+                                   get_vertex_index(tr.r), tr.color)
+    return indexed_model
+
+
+class WeldReport:
+
+    def __init__(self):
+        self.num_vertices = 0
+        self.num_unique_vertices = 0
+        self.num_welded_vertices = 0
+        self.num_duplicate_points = 0
+        self.num_duplicate_lines = 0
+        self.num_duplicate_triangles = 0
+        self.num_degenerate_lines = 0
+        self.num_degenerate_triangles = 0
+
+    def num_removed_primitives(self) -> int:
+        return (self.num_duplicate_points + self.num_duplicate_lines +
+                self.num_duplicate_triangles + self.num_degenerate_lines +
+                self.num_degenerate_triangles)
+
+    def __str__(self) -> str:
+        return (
+            f"welded {self.num_vertices} vertices into "
+            f"{self.num_unique_vertices} ({self.num_welded_vertices} moved by "
+            f"at most eps), removed {self.num_duplicate_points} duplicate points, "
+            f"{self.num_duplicate_lines} duplicate lines, "
+            f"{self.num_duplicate_triangles} duplicate triangles, "
+            f"{self.num_degenerate_lines} degenerate lines, and "
+            f"{self.num_degenerate_triangles} degenerate triangles")
+
+
+class _VertexWelder:
+
+    def __init__(self, eps: float, report: WeldReport):
+        self.eps = eps
+        self.report = report
+        self.vertices: List[Vec4] = []
+        self._vertices3: List[Vec3] = []
+        self._cells: Dict[Tuple[int, int, int], List[int]] = {}
+        self._indices: Dict[Vec4, int] = {}
+
+    def _add(self, p: Vec4) -> int:
+        i = len(self.vertices)
+        self.report.num_unique_vertices += 1
+        self.vertices.append(p)
+        self._vertices3.append(homogenious_vec4_to_vec3(p))
+        self._indices[p] = i
+        return i
+
+    def weld(self, p: Vec4) -> int:
+        self.report.num_vertices += 1
+
+        # Exactly equal vertices are the common case.
+        i = self._indices.get(p)
+        if i is not None:
+            return i
+
+        # Vertices that cannot be hashed spatially are never welded. Without a
+        # tolerance, only exactly equal vertices are.
+        p3 = homogenious_vec4_to_vec3(p)
+        if self.eps == 0.0 or not is_finite_vec3(p3):
+            return self._add(p)
+
+        # Look for a close vertex in the neighbouring cells of the spatial hash.
+        # With cells of size eps, all vertices within eps are found there.
+        cx, cy, cz = (floor(a / self.eps) for a in p3)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for j in self._cells.get((cx + dx, cy + dy, cz + dz), []):
+                        if is_eq_vec3(p3, self._vertices3[j], self.eps):
+                            self.report.num_welded_vertices += 1
+                            return j
+
+        # Otherwise, this is a new vertex.
+        i = self._add(p)
+        self._cells.setdefault((cx, cy, cz), []).append(i)
+        return i
+
+
+def _is_degenerate_triangle(p: Vec3, q: Vec3, r: Vec3, eps: float) -> bool:
+
+    # A triangle is degenerate if it is no higher than the tolerance over its
+    # longest edge. This is independent of the model's scale. Without a
+    # tolerance, only triangles without any area are degenerate.
+    if not is_finite_vec3(p, q, r):
+        return False
+    twice_area = norm2_vec3(cross_vec3(sub_vec3(q, p), sub_vec3(r, p)))
+    longest_edge = max(norm2_vec3(sub_vec3(q, p)), norm2_vec3(sub_vec3(r, q)),
+                       norm2_vec3(sub_vec3(p, r)))
+    return twice_area <= eps * longest_edge
+
+
+def get_welded_model(model: AnyModel,
+                     eps: float = kDefaultEps) -> Tuple[Model, WeldReport]:
+    if not eps >= 0.0:
+        raise ValueError(f"expected a non-negative tolerance but got {eps}")
+    model = expand_instances(model)
+    report = WeldReport()
+    welder = _VertexWelder(eps, report)
+    vs = welder.vertices
+    welded_model = Model()
+
+    # Drop duplicate points.
+    seen_points: Set[Tuple[int, str]] = set()
+    for pt in model.points:
+        key = welder.weld(pt.p), pt.color
+        if key in seen_points:
+            report.num_duplicate_points += 1
+            continue
+        seen_points.add(key)
+        welded_model.points.append(Point(vs[key[0]], pt.color))
+
+    # Drop degenerate and duplicate lines, regardless of their direction.
+    seen_lines: Set[Tuple[int, int, str]] = set()
+    for ln in model.lines:
+        i, j = welder.weld(ln.p), welder.weld(ln.q)
+        if i == j:
+            report.num_degenerate_lines += 1
+            continue
+        key = min(i, j), max(i, j), ln.color
+        if key in seen_lines:
+            report.num_duplicate_lines += 1
+            continue
+        seen_lines.add(key)
+        welded_model.lines.append(Line(vs[i], vs[j], ln.color))
+
+    # Drop degenerate and duplicate triangles, regardless of their orientation.
+    # Triangles that are flat within the tolerance are degenerate, too.
+    seen_triangles: Set[Tuple[int, int, int, str]] = set()
+    for tr in model.triangles:
+        i, j, k = welder.weld(tr.p), welder.weld(tr.q), welder.weld(tr.r)
+        p, q, r = (homogenious_vec4_to_vec3(vs[i]),
+                   homogenious_vec4_to_vec3(vs[j]),
+                   homogenious_vec4_to_vec3(vs[k]))
+        if i == j or j == k or k == i or _is_degenerate_triangle(p, q, r, eps):
+            report.num_degenerate_triangles += 1
+            continue
+        key = tuple(sorted((i, j, k))) + (tr.color, )
+        if key in seen_triangles:
+            report.num_duplicate_triangles += 1
+            continue
+        seen_triangles.add(key)
+        welded_model.triangles.append(Triangle(vs[i], vs[j], vs[k], tr.color))
+
+    return welded_model, report
+
+
+# Mesh simplification.
+#
+# Triangles are simplified by quadric edge collapse. Every vertex accumulates
+# the quadric error of the planes of its adjacent triangles and boundary edges
+# are additionally constrained by perpendicular planes. Edges are collapsed in
+# order of increasing error onto the end point or midpoint with the least error.
+# Lines follow the collapsed vertices. Chains of lines that are not part of the
+# mesh are decimated by removing the vertices that deviate the least from the
+# line between their neighbours. If there are still too many lines, only the
+# longest ones are kept.
+
+# Symmetric 4x4 matrices as their 10 upper triangular coefficients.
+Quadric = Tuple[float, float, float, float, float, float, float, float, float,
+                float]
+
+kBoundaryQuadricWeight = 1000.0
+
+
+def _get_null_quadric() -> Quadric:
+    return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+
+
+def _get_plane_quadric(p: Vec3, n: Vec3, weight: float = 1.0) -> Quadric:
+    a, b, c = n
+    d = -dot_vec3(n, p)
+    return (weight * a * a, weight * a * b, weight * a * c, weight * a * d,
+            weight * b * b, weight * b * c, weight * b * d, weight * c * c,
+            weight * c * d, weight * d * d)
+
+
+def _add_quadrics(P: Quadric, Q: Quadric) -> Quadric:
+    return tuple(map(add, P, Q))
+
+
+def _get_quadric_error(Q: Quadric, v: Vec3) -> float:
+    x, y, z = v
+    q00, q01, q02, q03, q11, q12, q13, q22, q23, q33 = Q
+    return (q00 * x * x + 2.0 * q01 * x * y + 2.0 * q02 * x * z +
+            2.0 * q03 * x + q11 * y * y + 2.0 * q12 * y * z + 2.0 * q13 * y +
+            q22 * z * z + 2.0 * q23 * z + q33)
+
+
+def _get_unit_vec3(u: Vec3) -> Optional[Vec3]:
+
+    # Unlike `unit_vec3`, this is independent of the model's scale. Only null
+    # vectors have no direction.
+    norm = norm2_vec3(u)
+    if norm == 0.0:
+        return None
+    return scale_vec3(1.0 / norm, u)
+
+
+def _get_triangle_normal(p: Vec3, q: Vec3, r: Vec3) -> Optional[Vec3]:
+    return _get_unit_vec3(cross_vec3(sub_vec3(q, p), sub_vec3(r, p)))
+
+
+def _get_distance_to_line(p: Vec3, q: Vec3, r: Vec3) -> float:
+
+    # Distance of r to the line through p and q.
+    pq = sub_vec3(q, p)
+    pr = sub_vec3(r, p)
+    pq_length = norm2_vec3(pq)
+    if pq_length < kDefaultEps:
+        return norm2_vec3(pr)
+    return norm2_vec3(cross_vec3(pq, pr)) / pq_length
+
+
+class _MeshSimplifier:
+
+    def __init__(self, model: IndexedModel):
+        self.positions = [
+            homogenious_vec4_to_vec3(v) for v in model.get_vertices()
+        ]
+        num_vertices = len(self.positions)
+        self.parents = list(range(num_vertices))
+        self.versions = [0] * num_vertices
+        self.triangles: List[List[int]] = []
+        self.triangle_colors: List[str] = []
+        self.vertex_triangles: List[Set[int]] = [
+            set() for _ in range(num_vertices)
+        ]
+        self.num_triangles = 0
+        self.quadrics = [_get_null_quadric() for _ in range(num_vertices)]
+        self._heap: List[Tuple[float, int, int, int, int, Vec3]] = []
+
+        # Collect the triangles and their quadrics.
+        ids = model.triangle_indices
+        for i, j, k, c in zip(ids[0::3], ids[1::3], ids[2::3],
+                              model.triangle_colors):
+            t = len(self.triangles)
+            self.triangles.append([i, j, k])
+            self.triangle_colors.append(model.palette[c])
+            self.num_triangles += 1
+            for a in (i, j, k):
+                self.vertex_triangles[a].add(t)
+            p, q, r = self.positions[i], self.positions[j], self.positions[k]
+            n = _get_triangle_normal(p, q, r)
+            if n is None or not is_finite_vec3(p, q, r, n):
+                continue
+            K = _get_plane_quadric(p, n)
+            for a in (i, j, k):
+                self.quadrics[a] = _add_quadrics(self.quadrics[a], K)
+
+        # Constrain boundary edges, i.e. those with only one adjacent triangle.
+        edge_triangles: Dict[Tuple[int, int], List[int]] = {}
+        for t, tr in enumerate(self.triangles):
+            for a, b in ((tr[0], tr[1]), (tr[1], tr[2]), (tr[2], tr[0])):
+                edge_triangles.setdefault((min(a, b), max(a, b)), []).append(t)
+        for (a, b), ts in edge_triangles.items():
+            if len(ts) != 1:
+                continue
+            i, j, k = self.triangles[ts[0]]
+            p, q = self.positions[a], self.positions[b]
+            n = _get_triangle_normal(self.positions[i], self.positions[j],
+                                     self.positions[k])
+            if n is None or not is_finite_vec3(p, q, n):
+                continue
+            n_boundary = _get_unit_vec3(cross_vec3(sub_vec3(q, p), n))
+            if n_boundary is None:
+                continue
+            K = _get_plane_quadric(p, n_boundary, kBoundaryQuadricWeight)
+            for c in (a, b):
+                self.quadrics[c] = _add_quadrics(self.quadrics[c], K)
+
+        # Queue all edges.
+        for a, b in edge_triangles:
+            self._push_edge(a, b)
+
+    def find(self, a: int) -> int:
+        root = a
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while self.parents[a] != root:
+            self.parents[a], a = root, self.parents[a]
+        return root
+
+    def _push_edge(self, a: int, b: int):
+        p, q = self.positions[a], self.positions[b]
+        if not is_finite_vec3(p, q):
+            return
+        Q = _add_quadrics(self.quadrics[a], self.quadrics[b])
+        cost, target = min(
+            ((_get_quadric_error(Q, v), v) for v in (p, q, mean_vec3(p, q))),
+            key=lambda pair: pair[0])
+        heappush(self._heap,
+                 (cost, a, b, self.versions[a], self.versions[b], target))
+
+    def _is_flipping(self, a: int, b: int, target: Vec3) -> bool:
+
+        # Moving the end points of the edge must not flip any of the remaining
+        # adjacent triangles.
+        for t in self.vertex_triangles[a] | self.vertex_triangles[b]:
+            tr = self.triangles[t]
+            if a in tr and b in tr:
+                continue
+            ps = [self.positions[c] for c in tr]
+            n = _get_triangle_normal(*ps)
+            ps = [target if c in (a, b) else p for c, p in zip(tr, ps)]
+            n_moved = _get_triangle_normal(*ps)
+            if n is None or n_moved is None or not dot_vec3(n, n_moved) > 0.0:
+                return True
+        return False
+
+    def _collapse(self, a: int, b: int, target: Vec3):
+
+        # Merge b into a.
+        self.parents[b] = a
+        self.positions[a] = target
+        self.quadrics[a] = _add_quadrics(self.quadrics[a], self.quadrics[b])
+        self.versions[a] += 1
+        self.versions[b] += 1
+        for t in self.vertex_triangles[b]:
+            tr = self.triangles[t]
+            if a in tr:
+                for c in tr:
+                    if c != b:
+                        self.vertex_triangles[c].discard(t)
+                self.num_triangles -= 1
+            else:
+                tr[tr.index(b)] = a
+                self.vertex_triangles[a].add(t)
+        self.vertex_triangles[b] = set()
+
+        # Requeue the edges around the merged vertex.
+        neighbours = set(c for t in self.vertex_triangles[a]
+                         for c in self.triangles[t] if c != a)
+        for c in neighbours:
+            self._push_edge(a, c)
+
+    def simplify(self, max_triangles: int):
+        while self.num_triangles > max_triangles and self._heap:
+            _, a, b, version_a, version_b, target = heappop(self._heap)
+            if version_a != self.versions[a] or version_b != self.versions[b]:
+                continue
+            if self._is_flipping(a, b, target):
+                continue
+            self._collapse(a, b, target)
+
+    def get_alive_triangles(self) -> Iterator[Tuple[int, int, int, str]]:
+        for t, (i, j, k) in enumerate(self.triangles):
+            if t in self.vertex_triangles[i]:
+                yield i, j, k, self.triangle_colors[t]
+
+
+class _LineChainSimplifier:
+
+    def __init__(self, positions: List[Vec3],
+                 lines: List[Tuple[int, int, str]], locked: Set[int]):
+        self.positions = positions
+        self.lines: List[Optional[List]] = [[i, j, c] for i, j, c in lines]
+        self.num_lines = len(lines)
+        self.vertex_lines: Dict[int, Set[int]] = {}
+        for l, (i, j, _) in enumerate(lines):
+            self.vertex_lines.setdefault(i, set()).add(l)
+            self.vertex_lines.setdefault(j, set()).add(l)
+        self.locked = locked
+        self.versions: Dict[int, int] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        for v in self.vertex_lines:
+            self._push_vertex(v)
+
+    def _get_chain(self, v: int) -> Optional[Tuple[int, int, int, int]]:
+
+        # A vertex can be removed if it connects exactly two lines of the same
+        # color and is not part of the mesh.
+        if v in self.locked or len(self.vertex_lines[v]) != 2:
+            return None
+        l, m = self.vertex_lines[v]
+        ln, mn = self.lines[l], self.lines[m]
+        if ln[2] != mn[2]:
+            return None
+        a = ln[0] if ln[1] == v else ln[1]
+        b = mn[0] if mn[1] == v else mn[1]
+        if a == b or a == v or b == v:
+            return None
+        return l, m, a, b
+
+    def _push_vertex(self, v: int):
+        chain = self._get_chain(v)
+        if chain is None:
+            return
+        _, _, a, b = chain
+        p, q, r = self.positions[a], self.positions[b], self.positions[v]
+        if not is_finite_vec3(p, q, r):
+            return
+        cost = _get_distance_to_line(p, q, r)
+        heappush(self._heap, (cost, v, self.versions.get(v, 0)))
+
+    def simplify(self, max_lines: int):
+        while self.num_lines > max_lines and self._heap:
+            _, v, version = heappop(self._heap)
+            if version != self.versions.get(v, 0):
+                continue
+            chain = self._get_chain(v)
+            if chain is None:
+                continue
+
+            # Replace the two lines a-v and v-b with a-b.
+            l, m, a, b = chain
+            self.lines[l] = [a, b, self.lines[l][2]]
+            self.lines[m] = None
+            self.num_lines -= 1
+            self.vertex_lines[v] = set()
+            self.vertex_lines[b].discard(m)
+            self.vertex_lines[b].add(l)
+            for c in (v, a, b):
+                self.versions[c] = self.versions.get(c, 0) + 1
+            self._push_vertex(a)
+            self._push_vertex(b)
+
+    def drop_shortest(self, max_lines: int):
+
+        # Lines that are part of the mesh cannot be decimated as chains. Keep
+        # only the longest lines if there are still too many.
+        if self.num_lines <= max_lines:
+            return
+        alive = [l for l, ln in enumerate(self.lines) if ln is not None]
+
+        def get_length(l: int) -> float:
+            i, j, _ = self.lines[l]
+            p, q = self.positions[i], self.positions[j]
+            length = norm2_vec3(sub_vec3(q, p))
+            return length if isfinite(length) else inf
+
+        kept = set(nlargest(max_lines, alive, key=get_length))
+        for l in alive:
+            if l not in kept:
+                self.lines[l] = None
+        self.num_lines = len(kept)
+
+    def get_alive_lines(self) -> Iterator[Tuple[int, int, str]]:
+        for ln in self.lines:
+            if ln is not None:
+                yield ln[0], ln[1], ln[2]
+
+
+def get_simplified_model(model: AnyModel,
+                         max_triangles: Optional[int] = None,
+                         max_lines: Optional[int] = None) -> Model:
+
+    # Share vertices to establish the connectivity of the mesh.
+    welded_model, _ = get_welded_model(model)
+    indexed_model = get_indexed_model(welded_model)
+
+    # Simplify the triangles.
+    mesh_simplifier = _MeshSimplifier(indexed_model)
+    mesh_simplifier.simplify(inf if max_triangles is None else max_triangles)
+    positions = mesh_simplifier.positions
+    vs = [vec3_to_homogenious_vec4(p) for p in positions]
+    find = mesh_simplifier.find
+
+    # Let the lines follow their collapsed vertices and drop the ones that
+    # became degenerate or duplicate.
+    lines: List[Tuple[int, int, str]] = []
+    seen_lines: Set[Tuple[int, int, str]] = set()
+    ids = indexed_model.line_indices
+    for i, j, c in zip(ids[0::2], ids[1::2], indexed_model.line_colors):
+        i, j = find(i), find(j)
+        color = indexed_model.palette[c]
+        key = min(i, j), max(i, j), color
+        if i == j or key in seen_lines:
+            continue
+        seen_lines.add(key)
+        lines.append((i, j, color))
+
+    # Decimate the remaining line chains.
+    locked = set(c for i, j, k, _ in mesh_simplifier.get_alive_triangles()
+                 for c in (i, j, k))
+    line_simplifier = _LineChainSimplifier(positions, lines, locked)
+    if max_lines is not None:
+        line_simplifier.simplify(max_lines)
+        line_simplifier.drop_shortest(max_lines)
+
+    # Assemble the simplified model.
+    simplified_model = Model()
+    simplified_model.points = welded_model.points
+    simplified_model.lines = [
+        Line(vs[i], vs[j], color)
+        for i, j, color in line_simplifier.get_alive_lines()
+    ]
+    simplified_model.triangles = [
+        Triangle(vs[i], vs[j], vs[k], color)
+        for i, j, k, color in mesh_simplifier.get_alive_triangles()
+    ]
+    return simplified_model
@@ -1,82 +1,172 @@
-from math import isfinite, pi
-from tkinter import ROUND, Canvas, Tk
-from typing import Callable, Optional
-
-from vecgl.linalg import (get_frustum_mat4, get_lrbt_from_aspect,
-                          get_ortho_mat4, get_rotate_x_mat4, get_rotate_y_mat4,
-                          get_scale_z_mat4, get_translate_mat4,
-                          get_viewport_mat4, homogenious_vec4_to_vec3,
-                          mul_mat4)
-from vecgl.model import Model
-from vecgl.rendering import render
+from collections import OrderedDict
+from math import isfinite
+from queue import Empty, Queue
+from threading import Condition, Thread
+from time import monotonic
+from tkinter import ROUND, Canvas, Misc, Tk
+from traceback import print_exc
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from vecgl.camera import (get_ortho_camera_mat4, get_perspective_camera_mat4,
+                          kDefaultFov, kDefaultOrthoFar, kDefaultOrthoNear,
+                          kDefaultPerspectiveFar, kDefaultPerspectiveNear)
+from vecgl.linalg import (get_scale_z_mat4, get_viewport_mat4,
+                          homogenious_vec4_to_vec3)
+from vecgl.model import AnyModel, Model, expand_instances
+from vecgl.rendering import render, render_progressively
+from vecgl.transforms import get_simplified_model
 
 kDefaultWidth = 600
 kDefaultHeight = 600
 kDefaultStrokeWidth = 1
-
-
-def _render_on_canvas(canvas: Canvas,
-                      model_in_ndc: Model,
-                      height: int,
-                      width: int,
-                      background_color: str,
-                      stroke_width: int,
-                      render_fn: Optional[Callable[[Model], Model]],
-                      text: Optional[str] = None):
-    # Clear canvas.
-    coords = 0, 0, width + 1, 0, width + 1, height + 1, 0, height + 1
-    canvas.create_polygon(*coords, fill=background_color)
-
-    # Render and transform to screen coordinates.
-    if render_fn:
-        model_in_ndc = render_fn(model_in_ndc)
-    model_in_screen_coords = model_in_ndc.transform(
-        get_viewport_mat4(0.0, height, width, -height))
-
-    # Draw the triangles first so that later drawn lines and points are visible.
-    for tr in model_in_screen_coords.triangles:
-        px, py, _ = homogenious_vec4_to_vec3(tr.p)
-        qx, qy, _ = homogenious_vec4_to_vec3(tr.q)
-        rx, ry, _ = homogenious_vec4_to_vec3(tr.r)
-        coords = px, py, qx, qy, rx, ry
-        if all(isfinite(c) for c in coords):
-            canvas.create_polygon(coords, fill=tr.color)
-
-    # Draw the lines.
-    for ln in model_in_screen_coords.lines:
-        px, py, _ = homogenious_vec4_to_vec3(ln.p)
-        qx, qy, _ = homogenious_vec4_to_vec3(ln.q)
-        coords = px, py, qx, qy
-        if all(isfinite(c) for c in coords):
-            canvas.create_line(*coords,
-                               width=stroke_width,
-                               fill=ln.color,
-                               capstyle=ROUND,
-                               joinstyle=ROUND)
-
-    # Draw the points.
-    for pt in model_in_screen_coords.points:
-        px, py, _ = homogenious_vec4_to_vec3(pt.p)
-        coords = px, py
-        if all(isfinite(c) for c in coords):
-            canvas.create_line(*coords,
-                               *coords,
-                               width=stroke_width,
-                               fill=pt.color,
-                               capstyle=ROUND,
-                               joinstyle=ROUND)
-
-    # Overlay text.
-    if text:
-        canvas.create_text(width / 2, height - 10, text=text, fill="black")
-
-
-def show(model_in_ndc: Model,
+kPreviewMaxTriangles = 256
+kPreviewMaxLines = 256
+kPollInterval = 20
+
+# Kinds of results of background rendering.
+kRenderChunk = "chunk"
+kRenderDone = "done"
+kRenderFailed = "failed"
+kDefaultMaxFps = 60.0
+kDefaultIdleRenderDelay = 300
+kDefaultRenderCacheSize = 32
+
+# Camera states are quantized to this step for caching.
+kCameraStateQuantum = 1e-3
+
+# Kinds of canvas items in drawing order.
+kItemKinds = ("triangle", "line", "point")
+
+
+class _CanvasPainter:
+
+    def __init__(self, canvas: Canvas, height: int, width: int,
+                 background_color: str, stroke_width: int):
+        self._canvas = canvas
+        self._height = height
+        self._width = width
+        self._stroke_width = stroke_width
+        canvas.configure(bg=background_color)
+
+        # Canvas items are reused across frames rather than created anew. Per
+        # kind, the items are kept in drawing order together with their color
+        # and the number of currently visible items.
+        self._items: Dict[str, List[int]] = {k: [] for k in kItemKinds}
+        self._colors: Dict[str, List[str]] = {k: [] for k in kItemKinds}
+        self._num_visible: Dict[str, int] = {k: 0 for k in kItemKinds}
+        self._num_used: Dict[str, int] = {k: 0 for k in kItemKinds}
+        self._text: Optional[int] = None
+        self._is_stacking_dirty = False
+
+    def _create(self, kind: str, coords: Sequence[float], color: str) -> int:
+        if kind == "triangle":
+            return self._canvas.create_polygon(*coords, fill=color, tags=kind)
+        return self._canvas.create_line(*coords,
+                                        width=self._stroke_width,
+                                        fill=color,
+                                        capstyle=ROUND,
+                                        joinstyle=ROUND,
+                                        tags=kind)
+
+    def _draw(self, kind: str, coords: Sequence[float], color: str) -> None:
+        items = self._items[kind]
+        colors = self._colors[kind]
+        i = self._num_used[kind]
+        self._num_used[kind] = i + 1
+
+        # Create a new item only if all existing ones are in use. New items are
+        # drawn on top of all others, so the later drawn kinds must be raised
+        # above them again.
+        if i == len(items):
+            items.append(self._create(kind, coords, color))
+            colors.append(color)
+            self._is_stacking_dirty = True
+            return
+
+        # Otherwise, move an existing item and update only what changed.
+        item = items[i]
+        self._canvas.coords(item, *coords)
+        if colors[i] != color:
+            self._canvas.itemconfigure(item, fill=color)
+            colors[i] = color
+        if i >= self._num_visible[kind]:
+            self._canvas.itemconfigure(item, state="normal")
+
+    def begin(self) -> None:
+        for kind in kItemKinds:
+            self._num_used[kind] = 0
+        self._is_stacking_dirty = False
+
+    def add(self, model_in_ndc: AnyModel) -> None:
+
+        # Transform to screen coordinates.
+        model_in_screen_coords = expand_instances(
+            model_in_ndc.transform(
+                get_viewport_mat4(0.0, self._height, self._width,
+                                  -self._height)))
+
+        # Draw the triangles first so that later drawn lines and points are
+        # visible.
+        for tr in model_in_screen_coords.triangles:
+            px, py, _ = homogenious_vec4_to_vec3(tr.p)
+            qx, qy, _ = homogenious_vec4_to_vec3(tr.q)
+            rx, ry, _ = homogenious_vec4_to_vec3(tr.r)
+            coords = px, py, qx, qy, rx, ry
+            if all(isfinite(c) for c in coords):
+                self._draw("triangle", coords, tr.color)
+
+        # Draw the lines.
+        for ln in model_in_screen_coords.lines:
+            px, py, _ = homogenious_vec4_to_vec3(ln.p)
+            qx, qy, _ = homogenious_vec4_to_vec3(ln.q)
+            coords = px, py, qx, qy
+            if all(isfinite(c) for c in coords):
+                self._draw("line", coords, ln.color)
+
+        # Draw the points.
+        for pt in model_in_screen_coords.points:
+            px, py, _ = homogenious_vec4_to_vec3(pt.p)
+            coords = px, py, px, py
+            if all(isfinite(c) for c in coords):
+                self._draw("point", coords, pt.color)
+
+    def finish(self, text: Optional[str] = None) -> None:
+
+        # Hide the items that are no longer in use.
+        for kind in kItemKinds:
+            items = self._items[kind]
+            for item in items[self._num_used[kind]:self._num_visible[kind]]:
+                self._canvas.itemconfigure(item, state="hidden")
+            self._num_visible[kind] = self._num_used[kind]
+
+        # Overlay text.
+        if self._text is None:
+            self._text = self._canvas.create_text(self._width / 2,
+                                                  self._height - 10,
+                                                  text="",
+                                                  fill="black")
+            self._is_stacking_dirty = True
+        self._canvas.itemconfigure(self._text, text=text or "")
+
+        # Restore the drawing order if new items were created.
+        if self._is_stacking_dirty:
+            for kind in kItemKinds[1:]:
+                self._canvas.tag_raise(kind)
+            self._canvas.tag_raise(self._text)
+            self._is_stacking_dirty = False
+
+    def paint(self, model_in_ndc: AnyModel, text: Optional[str] = None):
+        self.begin()
+        self.add(model_in_ndc)
+        self.finish(text)
+
+
+def show(model_in_ndc: AnyModel,
          height: int = kDefaultHeight,
          width: int = kDefaultWidth,
          background_color: str = "white",
          stroke_width: int = kDefaultStrokeWidth,
-         render_fn: Optional[Callable[[Model], Model]] = render) -> None:
+         render_fn: Optional[Callable[[AnyModel], Model]] = render) -> None:
 
     # Create a canvas.
     frame = Tk()
@@ -85,88 +175,269 @@ def show(model_in_ndc: Model,
     canvas.pack()
 
     # Draw and enter loop.
-    _render_on_canvas(canvas, model_in_ndc, height, width, background_color,
-                      stroke_width, render_fn)
+    painter = _CanvasPainter(canvas, height, width, background_color,
+                             stroke_width)
+    painter.paint(render_fn(model_in_ndc) if render_fn else model_in_ndc)
     frame.mainloop()
 
 
 def perspective_update_fn(
-        fov: float = 1.0,
-        n: float = 1.0,
-        f: float = 100.0
-) -> Callable[[Model, float, float, float, float], Model]:
-
-    def update(model: Model, aspect: float, hrotate: float, vrotate: float,
-               zoom: float) -> Model:
-
-        # Perspective projection.
-        l, r, b, t = get_lrbt_from_aspect(aspect, a=fov * n)
-        projection = get_frustum_mat4(l, r, b, t, n, f)
+    fov: float = kDefaultFov,
+    n: float = kDefaultPerspectiveNear,
+    f: float = kDefaultPerspectiveFar
+) -> Callable[[AnyModel, float, float, float, float], AnyModel]:
 
-        # View transform.
-        ax = 0.5 * pi * vrotate
-        ay = -0.5 * pi * hrotate
-        tz = -n - 1.1**zoom
-        view = mul_mat4(get_translate_mat4(0.0, 0.0, tz),
-                        get_rotate_x_mat4(ax), get_rotate_y_mat4(ay))
-
-        return model.transform(projection, view)
+    def update(model: AnyModel, aspect: float, hrotate: float, vrotate: float,
+               zoom: float) -> AnyModel:
+        return model.transform(
+            get_perspective_camera_mat4(aspect, hrotate, vrotate, zoom, fov, n,
+                                        f))
 
     return update
 
 
 def ortho_update_fn(
-    n: float = -100.0,
-    f: float = 100.0,
+    n: float = kDefaultOrthoNear,
+    f: float = kDefaultOrthoFar,
     in_ndc: bool = False
-) -> Callable[[Model, float, float, float, float], Model]:
+) -> Callable[[AnyModel, float, float, float, float], AnyModel]:
 
-    def update(model: Model, aspect: float, hrotate: float, vrotate: float,
-               zoom: float) -> Model:
+    def update(model: AnyModel, aspect: float, hrotate: float, vrotate: float,
+               zoom: float) -> AnyModel:
 
         # Transform back from NDC to world space, if needed.
         if in_ndc:
             model = model.transform(get_scale_z_mat4(-1.0))
-
-        # Orthogonal projection.
-        a = 1.1**zoom
-        l, r, b, t = get_lrbt_from_aspect(aspect, a)
-        projection = get_ortho_mat4(l, r, b, t, n, f)
-
-        # View transform.
-        ax = 0.5 * pi * vrotate
-        ay = -0.5 * pi * hrotate
-        view = mul_mat4(get_rotate_x_mat4(ax), get_rotate_y_mat4(ay))
-        return model.transform(projection, view)
+        return model.transform(
+            get_ortho_camera_mat4(aspect, hrotate, vrotate, zoom, n, f))
 
     return update
 
 
 def ortho_ndc_update_fn(
-        n: float = -100.0,
-        f: float = 100.0
-) -> Callable[[Model, float, float, float, float], Model]:
+    n: float = kDefaultOrthoNear,
+    f: float = kDefaultOrthoFar
+) -> Callable[[AnyModel, float, float, float, float], AnyModel]:
     return ortho_update_fn(n, f, in_ndc=True)
 
 
-def show_interactively(model: Model,
-                       simple_model: Optional[Model] = None,
-                       update_fn: Callable[[Model, float, float, float, float],
-                                           Model] = ortho_update_fn(),
-                       height: int = kDefaultHeight,
-                       width: int = kDefaultWidth,
-                       background_color: str = "white",
-                       stroke_width: int = kDefaultStrokeWidth,
-                       render_fn: Optional[Callable[[Model], Model]] = render,
-                       hrotate: float = 0.0,
-                       vrotate: float = 0.0,
-                       zoom: float = 6.0) -> None:
+def _get_preview_model(model: AnyModel) -> Optional[AnyModel]:
+
+    # Small models can be previewed as they are.
+    model = expand_instances(model)
+    if (model.num_triangles <= kPreviewMaxTriangles
+            and model.num_lines <= kPreviewMaxLines):
+        return None
+    return get_simplified_model(model, kPreviewMaxTriangles, kPreviewMaxLines)
+
+
+class _BackgroundRenderer:
+
+    def __init__(self, render_fn: Callable[[AnyModel], Iterable[Model]]):
+
+        # The render function yields the result in one or more chunks.
+        self._render_fn = render_fn
+        self._condition = Condition()
+        self._request: Optional[Tuple[int, AnyModel]] = None
+        self._cancelled_generation = -1
+        self._is_stopped = False
+        self._results: Queue = Queue()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, generation: int, model: AnyModel) -> None:
+
+        # Replace any request that has not been started yet. Only the latest
+        # camera state is worth rendering.
+        with self._condition:
+            self._request = generation, model
+            self._condition.notify()
+
+    def cancel(self, generation: int) -> None:
+
+        # Drop all requests up to the given generation, including the one in
+        # progress, if any.
+        with self._condition:
+            self._cancelled_generation = generation
+            if self._request is not None and self._request[0] <= generation:
+                self._request = None
+
+    def stop(self) -> None:
+
+        # Let the thread end. A render in progress is abandoned after its
+        # current chunk.
+        with self._condition:
+            self._is_stopped = True
+            self._request = None
+            self._condition.notify()
+
+    def _is_superseded(self, generation: int) -> bool:
+        with self._condition:
+            return (self._request is not None or self._is_stopped
+                    or self._cancelled_generation >= generation)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._request is None and not self._is_stopped:
+                    self._condition.wait()
+                if self._is_stopped:
+                    return
+                generation, model = self._request
+                self._request = None
+
+            # Post every chunk as it completes and stop as soon as the request is
+            # superseded. Failures are reported rather than ending the thread.
+            try:
+                for chunk in self._render_fn(model):
+                    if self._is_superseded(generation):
+                        break
+                    self._results.put((generation, kRenderChunk, chunk))
+                else:
+                    self._results.put((generation, kRenderDone, None))
+            except Exception:
+                print_exc()
+                self._results.put((generation, kRenderFailed, None))
+
+    def poll(self) -> List[Tuple[int, str, Optional[Model]]]:
+
+        # Return all results in order.
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except Empty:
+                return results
+
+
+class _RedrawScheduler:
+
+    def __init__(self,
+                 widget: Misc,
+                 redraw_fn: Callable[[], None],
+                 idle_fn: Callable[[], None],
+                 max_fps: float,
+                 idle_delay: Optional[int],
+                 clock: Callable[[], float] = monotonic):
+        if not max_fps > 0.0:
+            raise ValueError(
+                f"expected a positive frame rate but got {max_fps}")
+        self._widget = widget
+        self._redraw_fn = redraw_fn
+        self._idle_fn = idle_fn
+        self._min_interval = 1.0 / max_fps
+        self._idle_delay = idle_delay
+        self._clock = clock
+        self._is_redraw_scheduled = False
+        self._last_redraw_time: Optional[float] = None
+        self._idle_job: Optional[str] = None
+
+    def request(self) -> None:
+
+        # Redraw at most at the maximum frame rate. Requests that arrive while a
+        # redraw is scheduled are coalesced into it.
+        self.cancel_idle()
+        if self._is_redraw_scheduled:
+            return
+        self._is_redraw_scheduled = True
+        delay = 0.0
+        if self._last_redraw_time is not None:
+            delay = self._last_redraw_time + self._min_interval - self._clock()
+        self._widget.after(max(0, int(1000.0 * delay)), self.redraw)
+
+    def redraw(self) -> None:
+        self.cancel_idle()
+        self._is_redraw_scheduled = False
+        self._last_redraw_time = self._clock()
+        self._redraw_fn()
+
+        # Call the idle function once there was no request for a while, if
+        # requested.
+        if self._idle_delay is not None:
+            self._idle_job = self._widget.after(self._idle_delay,
+                                                self._on_idle)
+
+    def cancel_idle(self) -> None:
+        if self._idle_job is not None:
+            self._widget.after_cancel(self._idle_job)
+            self._idle_job = None
+
+    def _on_idle(self) -> None:
+        self._idle_job = None
+        self._idle_fn()
+
+
+CameraState = Tuple[int, int, int]
+
+
+def _get_camera_state(hrotate: float, vrotate: float,
+                      zoom: float) -> CameraState:
+    return (round(hrotate / kCameraStateQuantum),
+            round(vrotate / kCameraStateQuantum),
+            round(zoom / kCameraStateQuantum))
+
+
+class _RenderCache:
+
+    def __init__(self, max_size: int):
+
+        # Keep the rendered chunks of the most recently used camera states.
+        self.max_size = max_size
+        self.num_hits = 0
+        self.num_misses = 0
+        self._entries: "OrderedDict[CameraState, List[Model]]" = OrderedDict()
+
+    def get(self, state: CameraState) -> Optional[List[Model]]:
+        chunks = self._entries.get(state)
+        if chunks is None:
+            self.num_misses += 1
+            return None
+        self.num_hits += 1
+        self._entries.move_to_end(state)
+        return chunks
+
+    def put(self, state: CameraState, chunks: List[Model]) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[state] = chunks
+        self._entries.move_to_end(state)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        num_lookups = self.num_hits + self.num_misses
+        rate = self.num_hits / num_lookups if num_lookups else 0.0
+        return f"Render cache: {self.num_hits}/{num_lookups} hits ({rate:.0%})"
+
+
+def show_interactively(
+        model: AnyModel,
+        simple_model: Optional[AnyModel] = None,
+        update_fn: Callable[[AnyModel, float, float, float, float],
+                            AnyModel] = ortho_update_fn(),
+        height: int = kDefaultHeight,
+        width: int = kDefaultWidth,
+        background_color: str = "white",
+        stroke_width: int = kDefaultStrokeWidth,
+        render_fn: Optional[Callable[[AnyModel], Model]] = render,
+        hrotate: float = 0.0,
+        vrotate: float = 0.0,
+        zoom: float = 6.0,
+        max_fps: float = kDefaultMaxFps,
+        idle_render_delay: Optional[int] = kDefaultIdleRenderDelay,
+        progressive: Optional[bool] = None,
+        render_cache_size: int = kDefaultRenderCacheSize) -> None:
 
     # Create a canvas.
     frame = Tk()
     frame.title("Interactive viewer")
     canvas = Canvas(frame, bg="white", height=height, width=width)
     canvas.pack()
+    painter = _CanvasPainter(canvas, height, width, background_color,
+                             stroke_width)
 
     # Changes to viewing state: h/v rotation per pixel and zoom per wheel click.
     dhrotate = 2.0 / width
@@ -179,49 +450,180 @@ def show_interactively(model: Model,
     # Aspect ration to be passed to the update function.
     aspect = width / height
 
+    # Render in the background so that the viewer remains responsive. Every
+    # change of the camera starts a new generation. Results of earlier
+    # generations are stale and dropped. In progressive mode, the result is
+    # rendered and painted in chunks by `render_progressively`, the chunked
+    # equivalent of `render`. Custom render functions cannot be split into
+    # chunks. Progressive mode is used by default if possible.
+    if progressive is None:
+        progressive = render_fn is render
+    elif progressive and render_fn is not render:
+        raise ValueError("only the default render function can render "
+                         "progressively")
+    renderer = None
+    if progressive:
+        renderer = _BackgroundRenderer(render_progressively)
+    elif render_fn is not None:
+        renderer = _BackgroundRenderer(lambda m: [render_fn(m)])
+    generation = 0
+    rendering_generation = -1
+    is_painting = False
+
+    # Generate a preview level of detail in the background if none is given.
+    # Until it is available, the full model is drawn instead.
+    previews: Queue = Queue()
+
+    def build_preview():
+        try:
+            previews.put(_get_preview_model(model))
+        except Exception:
+            print_exc()
+            previews.put(None)
+
+    def poll_previews():
+        nonlocal simple_model
+        try:
+            simple_model = previews.get_nowait()
+        except Empty:
+            frame.after(kPollInterval, poll_previews)
+
+    # Cache the rendered chunks by camera state so that revisiting a view is
+    # instant.
+    cache = _RenderCache(render_cache_size)
+    rendering_state: Optional[CameraState] = None
+    rendered_chunks: List[Model] = []
+
+    def poll_renderer():
+        nonlocal rendering_generation, is_painting
+
+        # Stop polling once the camera moved on.
+        if rendering_generation != generation:
+            rendering_generation = -1
+            return
+        assert renderer is not None
+
+        # Paint the chunks of the current generation as they arrive.
+        is_done = False
+        is_failed = False
+        num_chunks = 0
+        for result_generation, kind, chunk in renderer.poll():
+            if result_generation != generation:
+                continue
+            if kind == kRenderChunk:
+                if not is_painting:
+                    painter.begin()
+                    is_painting = True
+                painter.add(chunk)
+                rendered_chunks.append(chunk)
+                num_chunks += 1
+            is_done = kind == kRenderDone
+            is_failed = kind == kRenderFailed
+        if is_failed:
+            if simple_model is not None:
+                draw_preview("Rendering failed")
+            else:
+                painter.finish("Rendering failed")
+        elif is_done:
+            assert rendering_state is not None
+            cache.put(rendering_state, list(rendered_chunks))
+            painter.finish(str(cache))
+        elif num_chunks > 0:
+            painter.finish("Rendering...")
+        if is_done or is_failed:
+            rendering_generation = -1
+            return
+        frame.after(kPollInterval, poll_renderer)
+
     def full_update_canvas():
-        nonlocal model, aspect, hrotate, vrotate, zoom, canvas, height, width
+        nonlocal generation, rendering_generation, is_painting, rendering_state
+        if renderer is None:
+            painter.paint(update_fn(model, aspect, hrotate, vrotate, zoom))
+            return
+
+        # Paint cached results right away.
+        generation += 1
+        state = _get_camera_state(hrotate, vrotate, zoom)
+        chunks = cache.get(state)
+        if chunks is not None:
+            renderer.cancel(generation)
+            painter.begin()
+            for chunk in chunks:
+                painter.add(chunk)
+            painter.finish(str(cache))
+            return
+
+        # Otherwise, keep showing the preview until the first chunk is
+        # available.
         transformed_model = update_fn(model, aspect, hrotate, vrotate, zoom)
-        _render_on_canvas(canvas, transformed_model, height, width,
-                          background_color, stroke_width, render_fn)
+        renderer.submit(generation, transformed_model)
+        rendering_state = state
+        rendered_chunks.clear()
+        is_painting = False
+        if simple_model is not None:
+            draw_preview("Rendering...")
+        if rendering_generation < 0:
+            frame.after(kPollInterval, poll_renderer)
+        rendering_generation = generation
+
+    def draw_preview(text: str):
+        transformed_model = update_fn(simple_model, aspect, hrotate, vrotate,
+                                      zoom)
+        if render_fn:
+            transformed_model = render_fn(transformed_model)
+        painter.paint(transformed_model, text)
 
-    def quick_update_canvas():
-        nonlocal simple_model, aspect, hrotate, vrotate, zoom, canvas, height, width
+    def quick_update_canvas(text: str = "Press space to render"):
+        nonlocal generation
         if simple_model is None:
             return full_update_canvas()
-        transformed_model = update_fn(simple_model, aspect, hrotate, vrotate,
-                                      zoom)
-        text = "Press space to render"
-        _render_on_canvas(canvas, transformed_model, height, width,
-                          background_color, stroke_width, render_fn, text)
+        generation += 1
+        if renderer is not None:
+            renderer.cancel(generation)
+        draw_preview(text)
+
+    # Redraw at most at the maximum frame rate and always draw the latest
+    # camera state. Event handlers only update the camera state, so that
+    # events that arrive faster than frames are drawn are coalesced. Render
+    # the full model once the camera was idle for the given delay in ms, unless
+    # the delay is None. Without a preview, the full model is rendered on every
+    # redraw anyway.
+    def on_idle():
+        if simple_model is not None:
+            full_update_canvas()
+
+    scheduler = _RedrawScheduler(frame, quick_update_canvas, on_idle, max_fps,
+                                 idle_render_delay)
+    request_redraw = scheduler.request
 
     def on_mouse_wheel_up(_):
         nonlocal zoom, dzoom
         zoom += dzoom
-        quick_update_canvas()
+        request_redraw()
 
     def on_mouse_wheel_down(_):
         nonlocal zoom, dzoom
         zoom -= dzoom
-        quick_update_canvas()
+        request_redraw()
 
     def on_mouse_button(e):
         nonlocal x0, y0
         x0, y0 = e.x, e.y
-        quick_update_canvas()
+        request_redraw()
 
     def on_mouse_button_release(_):
-        quick_update_canvas()
+        request_redraw()
 
     def on_motion(e):
         nonlocal x0, y0, hrotate, dhrotate, vrotate, dvrotate
         hrotate += (e.x - x0) * dhrotate
         vrotate = max(-1.0, min(vrotate - (e.y - y0) * dvrotate, 1.0))
         x0, y0 = e.x, e.y
-        quick_update_canvas()
+        request_redraw()
 
     def on_key(e):
         if e.char == " ":
+            scheduler.cancel_idle()
             full_update_canvas()
 
     # Register event handlers.
@@ -232,6 +634,13 @@ def show_interactively(model: Model,
     frame.bind("<B1-Motion>", on_motion)
     frame.bind("<Key>", on_key)
 
-    # Draw and enter loop.
-    quick_update_canvas()
-    frame.mainloop()
+    # Draw and enter loop. Stop rendering once the window is closed.
+    if simple_model is None:
+        Thread(target=build_preview, daemon=True).start()
+        frame.after(kPollInterval, poll_previews)
+    scheduler.redraw()
+    try:
+        frame.mainloop()
+    finally:
+        if renderer is not None:
+            renderer.stop()
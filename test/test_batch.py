@@ -0,0 +1,38 @@
+from vecgl.batch import render_frames, render_in_parallel, render_orbit
+from vecgl.camera import get_orbit_camera_mat4s
+from vecgl.export import read_json
+from vecgl.modellib import get_cube_model, get_sphere_model
+from vecgl.rendering import render
+
+
+def test_render_frames_in_parallel(tmp_path):
+    model = get_sphere_model(4, 8)
+    Us = get_orbit_camera_mat4s(3)
+    serial = render_frames(model, Us, str(tmp_path / "serial-{frame}.svg"), 1)
+    parallel = render_frames(model, Us, str(tmp_path / "parallel-{frame}.svg"),
+                             2)
+    assert len(serial) == len(parallel) == 3
+    for serial_path, parallel_path in zip(serial, parallel):
+        with open(serial_path) as serial_file, open(
+                parallel_path) as parallel_file:
+            assert serial_file.read() == parallel_file.read()
+
+
+def test_render_orbit(tmp_path):
+    paths = render_orbit(get_cube_model(), 4,
+                         str(tmp_path / "{frame:02d}.json"), 1)
+    assert paths == [str(tmp_path / f"0{i}.json") for i in range(4)]
+
+    # The cube looks the same after every quarter turn.
+    models = [read_json(path) for path in paths]
+    assert all(len(m.lines) == len(models[0].lines) for m in models)
+
+
+def test_render_in_parallel():
+    model = get_sphere_model(8, 16).transform(get_orbit_camera_mat4s(1)[0])
+    expected = render(model)
+    for num_workers in (1, 3):
+        rendered = render_in_parallel(model, num_workers)
+        assert len(rendered.points) == len(expected.points)
+        assert rendered.lines == expected.lines
+        assert len(rendered.triangles) == len(expected.triangles)
@@ -1,6 +1,11 @@
+from mmap import ACCESS_READ, mmap
+from pickle import dumps, loads
 from typing import List
 
-from vecgl.bb3tree import BoundingBox3, create_bb3tree
+from pytest import raises
+
+from vecgl.bb3tree import (BoundingBox3, FlatBB3Tree, create_bb3tree,
+                           create_flat_bb3tree)
 
 
 def test_disjoint_bboxes():
@@ -69,3 +74,108 @@ def test_yield_tangent_bboxes():
         assert value == "the bbox"
         count += 1
     assert count == 1
+
+
+def test_find_in_front():
+
+    # Create a stack of 5 unit bounding boxes along the z-axis.
+    bboxes: List[BoundingBox3] = []
+    for k in range(5):
+        lb = 0.0, 0.0, 2.0 * k
+        ub = 1.0, 1.0, 2.0 * k + 1.0
+        bboxes.append(BoundingBox3(lb, ub))
+    bbtree = create_bb3tree(bboxes, lambda bb: bb)
+
+    # Only the bounding boxes starting at or before the max depth are found.
+    footprint_xy = (0.5, 0.5), (0.75, 0.75)
+    found = list(bbtree.find_in_front(footprint_xy, 4.0))
+    assert sorted(bb.lb[2] for bb in found) == [0.0, 2.0, 4.0]
+
+    # The minimum depth prunes bounding boxes that lie entirely in front.
+    found = list(bbtree.find_in_front(footprint_xy, 4.0, min_z=1.5))
+    assert sorted(bb.lb[2] for bb in found) == [2.0, 4.0]
+
+    # Nothing is found outside of the footprint.
+    assert list(bbtree.find_in_front(((2.0, 2.0), (3.0, 3.0)), 10.0)) == []
+
+
+def test_find_in_front_matches_find():
+    bboxes: List[BoundingBox3] = []
+    for i in range(4):
+        for j in range(4):
+            for k in range(4):
+                lb = 1.0 * i, 1.0 * j, 1.0 * k
+                ub = 1.0 * i + 1.5, 1.0 * j + 1.5, 1.0 * k + 1.5
+                bboxes.append(BoundingBox3(lb, ub))
+    bbtree = create_bb3tree(bboxes, lambda bb: bb)
+    query = BoundingBox3((0.5, 1.5, -1.0), (2.5, 2.0, 2.25))
+    footprint_xy = (0.5, 1.5), (2.5, 2.0)
+    expected = list(bbtree.find(query))
+    actual = list(bbtree.find_in_front(footprint_xy, 2.25, min_z=-1.0))
+    assert actual == expected
+
+
+def test_find_in_front_empty_tree():
+    bbtree = create_bb3tree([], lambda e: e)
+    assert list(bbtree.find_in_front(((0.0, 0.0), (1.0, 1.0)), 1.0)) == []
+
+
+def _get_overlapping_bboxes() -> List[BoundingBox3]:
+    bboxes: List[BoundingBox3] = []
+    for i in range(3):
+        for j in range(3):
+            for k in range(3):
+                lb = 1.0 * i, 1.0 * j, 1.0 * k
+                ub = 1.0 * i + 2.0, 1.0 * j + 2.0, 1.0 * k + 2.0
+                bboxes.append(BoundingBox3(lb, ub))
+    return bboxes
+
+
+def test_flat_bb3tree_matches_bb3tree():
+    bboxes = _get_overlapping_bboxes()
+    bbtree = create_bb3tree(bboxes, lambda bb: bb)
+    flat_bbtree = create_flat_bb3tree(bboxes, lambda bb: bb)
+    assert flat_bbtree.num_nodes == 2 * len(bboxes) - 1
+
+    query = BoundingBox3((0.5, 2.5, 3.5), (1.5, 3.5, 4.0))
+    expected = list(bbtree.find(query))
+    actual = [bboxes[i] for i in flat_bbtree.find(query)]
+    assert actual == expected
+
+    footprint_xy = (0.5, 2.5), (1.5, 3.5)
+    expected = list(bbtree.find_in_front(footprint_xy, 1.5))
+    actual = [bboxes[i] for i in flat_bbtree.find_in_front(footprint_xy, 1.5)]
+    assert actual == expected
+
+
+def test_flat_bb3tree_empty():
+    flat_bbtree = create_flat_bb3tree([], lambda e: e)
+    assert flat_bbtree.num_nodes == 0
+    query = BoundingBox3((0.0, 0.0, 0.0), (1.0, 1.0, 1.0))
+    assert list(flat_bbtree.find(query)) == []
+
+
+def test_flat_bb3tree_pickle():
+    bboxes = _get_overlapping_bboxes()
+    flat_bbtree = create_flat_bb3tree(bboxes, lambda bb: bb)
+    unpickled = loads(dumps(flat_bbtree))
+    assert unpickled.tobytes() == flat_bbtree.tobytes()
+
+
+def test_flat_bb3tree_mmap(tmp_path):
+    bboxes = _get_overlapping_bboxes()
+    flat_bbtree = create_flat_bb3tree(bboxes, lambda bb: bb)
+    path = tmp_path / "tree.vb3t"
+    path.write_bytes(flat_bbtree.tobytes())
+    query = BoundingBox3((0.5, 0.5, 0.5), (1.0, 1.0, 1.0))
+    with open(path, "rb") as fin:
+        with mmap(fin.fileno(), 0, access=ACCESS_READ) as buffer:
+            mapped_bbtree = FlatBB3Tree(buffer)
+            assert list(mapped_bbtree.find(query)) == list(
+                flat_bbtree.find(query))
+            mapped_bbtree.release()
+
+
+def test_flat_bb3tree_invalid_buffer():
+    with raises(ValueError):
+        FlatBB3Tree(b"not a tree, just some bytes")
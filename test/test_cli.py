@@ -0,0 +1,77 @@
+from io import StringIO
+from json import dumps, loads
+
+from vecgl.cli import main, serve
+from vecgl.export import read_json, write_binary, write_json
+from vecgl.modellib import get_cube_model
+
+
+def test_render(tmp_path):
+    write_json(get_cube_model(), tmp_path / "cube.json")
+    main([
+        "render",
+        str(tmp_path / "cube.json"),
+        str(tmp_path / "rendered.json"), "--camera", "perspective",
+        "--hrotate", "0.5"
+    ])
+    rendered = read_json(tmp_path / "rendered.json")
+    assert len(rendered.lines) > 0
+
+
+def test_render_with_workers(tmp_path):
+    write_json(get_cube_model(), tmp_path / "cube.json")
+    for num_workers in ("1", "2"):
+        main([
+            "render",
+            str(tmp_path / "cube.json"),
+            str(tmp_path / f"rendered-{num_workers}.svg"), "--camera", "ortho",
+            "--vrotate", "0.3", "--workers", num_workers
+        ])
+    assert (tmp_path /
+            "rendered-1.svg").read_text() == (tmp_path /
+                                              "rendered-2.svg").read_text()
+
+
+def test_batch(tmp_path):
+    write_binary(get_cube_model(), tmp_path / "cube.vglm")
+    main([
+        "batch",
+        str(tmp_path / "cube.vglm"),
+        str(tmp_path / "frame-{frame}.svg"), "--frames", "2", "--workers", "1"
+    ])
+    assert (tmp_path / "frame-0.svg").exists()
+    assert (tmp_path / "frame-1.svg").exists()
+
+
+def test_serve(tmp_path):
+    write_binary(get_cube_model(), tmp_path / "cube.vglm")
+    jobs = [{
+        "model": str(tmp_path / "cube.vglm"),
+        "output": str(tmp_path / "single.svg"),
+        "camera": "ortho",
+        "vrotate": 0.3
+    }, {
+        "model": str(tmp_path / "missing.vglm"),
+        "output": str(tmp_path / "missing.svg")
+    }, {
+        "model": str(tmp_path / "cube.vglm"),
+        "output": str(tmp_path / "frame-{frame}.json"),
+        "camera": "perspective",
+        "frames": 2
+    }, {
+        "model": str(tmp_path / "cube.vglm"),
+        "output": str(tmp_path / "frame-{frame}.json"),
+        "frames": 2
+    }]
+    fin = StringIO("".join(dumps(job) + "\n" for job in jobs))
+    fout = StringIO()
+    serve(fin, fout, 1)
+    results = [loads(line) for line in fout.getvalue().splitlines()]
+    assert results[0] == {"outputs": [str(tmp_path / "single.svg")]}
+    assert results[1]["error"].startswith("FileNotFoundError")
+    assert results[2] == {
+        "outputs":
+        [str(tmp_path / "frame-0.json"),
+         str(tmp_path / "frame-1.json")]
+    }
+    assert results[3]["error"].startswith("ValueError")
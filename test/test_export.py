@@ -1,5 +1,17 @@
-from vecgl.export import to_json, to_svg
-from vecgl.model import Model
+from gzip import decompress
+from io import BytesIO
+
+from pytest import raises
+
+from vecgl.export import (from_binary, get_plot_paths, get_plot_time,
+                          read_binary, read_json, read_ndjson, to_binary,
+                          to_gcode, to_hpgl, to_json, to_ndjson, to_python,
+                          to_svg, write_binary, write_json, write_ndjson,
+                          write_svg)
+from vecgl.linalg import get_translate_x_mat4
+from vecgl.model import IndexedModel, Model, expand_instances
+from vecgl.modellib import get_sphere_model
+from vecgl.transforms import get_indexed_model
 
 
 def test_to_svg():
@@ -21,6 +33,56 @@ def test_to_svg():
     assert actual == expected
 
 
+def test_to_svg_precision():
+    model = Model()
+    model.add_line((-1.0, 0.0, 0.0), (1.0 / 3.0, 1.0, 0.0), "green")
+    model.add_line((0.0, 0.0, 0.0), (0.00001, 0.0, 0.0), "hidden")
+    model.add_triangle((-1.0, -1.0, 0.0), (1.0, -1.0, 0.0), (-1.0, 1.0, 0.0),
+                       "blue")
+    model.add_triangle((-1.0, -1.0, 0.0), (1.0, -1.0, 0.0),
+                       (0.0, -0.99999, 0.0), "hidden")
+    expected = [
+        "<svg version=\"1.1\" width=\"300\" height=\"400\" xmlns=\"http://www.w3.org/2000/svg\">\n",
+        "  <polygon points=\"0,400 300,400 0,0\" fill=\"blue\"/>\n",
+        "  <line x1=\"0\" y1=\"200\" x2=\"200\" y2=\"0\" stroke=\"green\" stroke-linecap=\"round\" stroke-width=\"1\"/>\n",
+        "</svg>\n"
+    ]
+    assert list(to_svg(model, 400, 300, precision=2)) == expected
+    with raises(ValueError, match="precision"):
+        list(to_svg(model, 400, 300, precision=-1))
+
+
+def test_to_svg_group_by_color():
+    model = Model()
+    model.add_point((0.5, 1.0, 0.0), "red")
+    model.add_line((-1.0, 0.0, 0.0), (1.0, 1.0, 0.0), "green")
+    model.add_line((-1.0, 1.0, 0.0), (1.0, 1.0, 0.0), "red")
+    model.add_line((-1.0, -1.0, 0.0), (1.0, 1.0, 0.0), "green")
+    model.add_triangle((-1.0, -1.0, 0.0), (1.0, -1.0, 0.0), (-1.0, 1.0, 0.0),
+                       "blue")
+    model.add_triangle((-1.0, -1.0, 0.0), (1.0, 1.0, 0.0), (-1.0, 1.0, 0.0),
+                       "gray")
+    model.add_triangle((-1.0, -1.0, 0.0), (1.0, -1.0, 0.0), (1.0, 1.0, 0.0),
+                       "blue")
+    expected = [
+        "<svg version=\"1.1\" width=\"300\" height=\"400\" xmlns=\"http://www.w3.org/2000/svg\">\n",
+        "  <g fill=\"blue\">\n",
+        "    <polygon points=\"0,400 300,400 0,0\"/>\n", "  </g>\n",
+        "  <g fill=\"gray\">\n", "    <polygon points=\"0,400 300,0 0,0\"/>\n",
+        "  </g>\n", "  <g fill=\"blue\">\n",
+        "    <polygon points=\"0,400 300,400 300,0\"/>\n", "  </g>\n",
+        "  <g stroke=\"green\" stroke-linecap=\"round\" stroke-width=\"1\">\n",
+        "    <line x1=\"0\" y1=\"200\" x2=\"300\" y2=\"0\"/>\n",
+        "    <line x1=\"0\" y1=\"400\" x2=\"300\" y2=\"0\"/>\n", "  </g>\n",
+        "  <g stroke=\"red\" stroke-linecap=\"round\" stroke-width=\"1\">\n",
+        "    <line x1=\"0\" y1=\"0\" x2=\"300\" y2=\"0\"/>\n", "  </g>\n",
+        "  <g fill=\"green\">\n",
+        "    <circle cx=\"225\" cy=\"0\" r=\"0.5\"/>\n", "  </g>\n", "</svg>\n"
+    ]
+    actual = list(to_svg(model, 400, 300, precision=2, group_by_color=True))
+    assert actual == expected
+
+
 def test_to_json():
     model = Model()
     model.add_point((0.5, 1.0, 0.0), "red")
@@ -59,3 +121,258 @@ def test_to_json():
     ]
     actual = list(to_json(model))
     assert actual == expected
+
+
+def test_export_indexed_model():
+    model = get_sphere_model(4, 8)
+    indexed_model = get_indexed_model(model)
+    assert list(to_svg(indexed_model)) == list(to_svg(model))
+    assert list(to_json(indexed_model)) == list(to_json(model))
+    assert list(to_python(indexed_model)) == list(to_python(model))
+
+
+def test_export_instances():
+    mesh = get_sphere_model(4, 8)
+    model = Model()
+    model.add_instance(mesh, get_translate_x_mat4(-0.5))
+    model.add_instance(mesh, get_translate_x_mat4(0.5))
+    expanded = expand_instances(model)
+    assert len(list(to_svg(model))) == len(list(to_svg(expanded)))
+    assert list(to_json(model)) == list(to_json(expanded))
+    assert list(to_python(model)) == list(to_python(expanded))
+
+
+def _get_primitives(model):
+    return ([(pt.p, pt.color) for pt in model.points], [
+        (ln.p, ln.q, ln.color) for ln in model.lines
+    ], [(tr.p, tr.q, tr.r, tr.color) for tr in model.triangles])
+
+
+def test_binary_roundtrip(tmp_path):
+    model = get_sphere_model(4, 8)
+    model.add_point((0.5, 1.0, 0.0), "red")
+    model.add_line((-1.0, 0.0, 0.0), (1.0, 1.0, 0.0, 2.0), "gr\u00fcn")
+    path = tmp_path / "model.vglm"
+    write_binary(model, path)
+    expected = _get_primitives(model)
+    for use_mmap in (False, True):
+        loaded = read_binary(path, use_mmap)
+        assert _get_primitives(loaded) == expected
+        assert _get_primitives(loaded.transform(
+            get_translate_x_mat4(1.0))) == _get_primitives(
+                model.transform(get_translate_x_mat4(1.0)))
+
+
+def test_binary_empty_model():
+    loaded = from_binary(b"".join(to_binary(Model())))
+    assert _get_primitives(loaded) == ([], [], [])
+    assert loaded.palette == []
+
+
+def test_binary_invalid_buffer():
+    data = b"".join(to_binary(get_sphere_model(4, 8)))
+    with raises(ValueError):
+        from_binary(data[:16])
+    with raises(ValueError):
+        from_binary(b"XXXX" + data[4:])
+    with raises(ValueError):
+        from_binary(data[:len(data) // 2])
+
+
+def test_binary_palette_roundtrip():
+    model = IndexedModel()
+    i = model.add_vertex((0.0, 0.0, 0.0))
+    j = model.add_vertex((1.0, 0.0, 0.0))
+    for color in ("", "multi\nline", "gr\u00fcn"):
+        model.add_line(i, j, color)
+    loaded = from_binary(b"".join(to_binary(model)))
+    assert loaded.palette == model.palette
+    assert _get_primitives(loaded) == _get_primitives(model)
+
+
+def test_binary_invalid_indices():
+    model = IndexedModel()
+    i = model.add_vertex((0.0, 0.0, 0.0))
+    model.add_line(i, i + 1, "red")
+    with raises(ValueError, match="vertex"):
+        from_binary(b"".join(to_binary(model)))
+    model.line_indices[1] = i
+    model.line_colors[0] = 1
+    with raises(ValueError, match="color"):
+        from_binary(b"".join(to_binary(model)))
+
+    # Trusted buffers are not validated.
+    loaded = from_binary(b"".join(to_binary(model)), validate=False)
+    assert list(loaded.line_colors) == [1]
+
+
+def test_to_json_duplicates():
+    model = Model()
+    model.add_line((-1.0, 0.0, 0.0), (1.0, 1.0, 0.0), "green")
+    model.add_line((-1.0, 0.0, 0.0), (1.0, 1.0, 0.0), "green")
+    actual = "".join(to_json(model))
+    assert actual.count("},\n") == 1
+
+
+def test_to_ndjson():
+    model = Model()
+    model.add_point((0.5, 1.0, 0.0), "red")
+    model.add_line((-1.0, 0.0, 0.0), (1.0, 1.0, 0.0), "green")
+    expected = [
+        "{\"type\": \"point\", \"p\": [ 0.5, 1.0, 0.0, 1.0 ], \"color\": \"red\"}\n",
+        "{\"type\": \"line\", \"p\": [ -1.0, 0.0, 0.0, 1.0 ], \"q\": [ 1.0, 1.0, 0.0, 1.0 ], \"color\": \"green\"}\n"
+    ]
+    assert list(to_ndjson(model)) == expected
+
+
+def test_json_roundtrip(tmp_path):
+    model = get_sphere_model(4, 8)
+    model.add_point((0.5, 1.0, 0.0), "red")
+    model.add_line((-1.0, 0.0, 0.0), (1.0, 1.0, 0.0, 2.0), "green")
+    model.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), 'say "hi"')
+    model.add_point((0.0, 0.0, 0.0), "back\\slash\n")
+    expected = _get_primitives(model)
+    write_json(model, tmp_path / "model.json")
+    write_ndjson(model, tmp_path / "model.ndjson")
+
+    # Use tiny chunks such that values are split across chunk boundaries.
+    for chunk_size in (1, 7, 1 << 16):
+        assert _get_primitives(read_json(tmp_path / "model.json",
+                                         chunk_size)) == expected
+    assert _get_primitives(read_ndjson(tmp_path / "model.ndjson")) == expected
+    write_json(Model(), tmp_path / "empty.json")
+    assert _get_primitives(read_json(tmp_path / "empty.json")) == ([], [], [])
+
+
+def test_read_json_invalid(tmp_path):
+    path = tmp_path / "invalid.json"
+    path.write_text("{ \"points\": [ { \"p\": [ 0.5, 1.0")
+    with raises(ValueError):
+        read_json(path)
+
+
+class _CountingStream(BytesIO):
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.num_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.num_read += len(data)
+        return data
+
+    def read1(self, size=-1):
+        data = super().read1(size)
+        self.num_read += len(data)
+        return data
+
+
+def test_read_json_invalid_stops_early():
+    data = "{ \"points\": [ { \"p\": [ 0.5x, 1.0" + ", 1.0" * (1 << 20)
+    stream = _CountingStream(data.encode("utf-8"))
+    with raises(ValueError):
+        read_json(stream, chunk_size=1 << 10)
+    assert stream.num_read < 1 << 16
+
+
+def test_write_compressed(tmp_path):
+    model = get_sphere_model(4, 8)
+    expected = "".join(to_svg(model))
+    write_svg(model, tmp_path / "model.svg")
+    write_svg(model, tmp_path / "model.svgz")
+    assert (tmp_path / "model.svg").read_text() == expected
+    assert decompress(
+        (tmp_path / "model.svgz").read_bytes()).decode() == expected
+
+    # Compressed models can be read back.
+    expected = _get_primitives(model)
+    write_json(model, tmp_path / "model.json.gz")
+    write_ndjson(model, tmp_path / "model.ndjson.gz")
+    write_binary(model, tmp_path / "model.vglm.gz")
+    assert _get_primitives(read_json(tmp_path / "model.json.gz")) == expected
+    assert _get_primitives(read_ndjson(tmp_path /
+                                       "model.ndjson.gz")) == expected
+    assert _get_primitives(read_binary(tmp_path / "model.vglm.gz")) == expected
+
+
+def test_write_to_stream():
+    model = get_sphere_model(4, 8)
+    expected = _get_primitives(model)
+    for compress in (False, True):
+        stream = BytesIO()
+        write_json(model, stream, compress)
+        assert not stream.closed
+        stream.seek(0)
+        assert _get_primitives(read_json(stream,
+                                         compress=compress)) == expected
+        stream = BytesIO()
+        write_binary(model, stream, compress)
+        stream.seek(0)
+        assert _get_primitives(read_binary(stream,
+                                           compress=compress)) == expected
+
+
+def _get_plot_test_model() -> Model:
+
+    # A square whose lines are shuffled and partly reversed, a far away line,
+    # and a point.
+    model = Model()
+    model.add_line((0.5, 0.5, 0.0), (-0.5, 0.5, 0.0), "red")
+    model.add_line((-0.5, -0.5, 0.0), (0.5, -0.5, 0.0), "red")
+    model.add_line((0.5, -0.5, 0.0), (0.5, 0.5, 0.0), "red")
+    model.add_line((-0.5, 0.5, 0.0), (-0.5, -0.5, 0.0), "red")
+    model.add_line((1.0, 1.0, 0.0), (0.9, 0.9, 0.0), "blue")
+    model.add_point((-0.9, -0.9, 0.0), "red")
+    model.add_triangle((-1.0, -1.0, 0.0), (1.0, -1.0, 0.0), (-1.0, 1.0, 0.0))
+    return model
+
+
+def test_get_plot_paths():
+    paths_by_color = get_plot_paths(_get_plot_test_model(), 100.0, 100.0)
+    expected = [("red", [[(5.0, 5.0), (5.0, 5.0)],
+                         [(25.0, 25.0), (75.0, 25.0), (75.0, 75.0),
+                          (25.0, 75.0), (25.0, 25.0)]]),
+                ("blue", [[(95.0, 95.0), (100.0, 100.0)]])]
+    assert paths_by_color == expected
+    plot_time = get_plot_time(paths_by_color, 10.0, 100.0, 0.0)
+    assert abs(plot_time - (200.0 + 50.0**0.5) / 10.0 -
+               (50.0**0.5 + 800.0**0.5 + 9800.0**0.5) / 100.0) < 1e-9
+
+
+def test_get_plot_paths_reduces_travel():
+    model = get_sphere_model(8, 16)
+    paths_by_color = get_plot_paths(model)
+    assert sum(len(paths) for _, paths in paths_by_color) < len(model.lines)
+    num_drawn = sum(
+        len(path) - 1 for _, paths in paths_by_color for path in paths)
+    assert num_drawn == len(model.lines)
+
+
+def test_to_hpgl():
+    expected = [
+        "IN;\n", "SP1;\n", "PU200,200;\n", "PD200,200;\n", "PU1000,1000;\n",
+        "PD3000,1000,3000,3000,1000,3000,1000,1000;\n", "SP2;\n",
+        "PU3800,3800;\n", "PD4000,4000;\n", "PU;\n", "SP0;\n"
+    ]
+    assert list(to_hpgl(_get_plot_test_model(), 100.0, 100.0)) == expected
+
+
+def test_to_gcode():
+    actual = list(to_gcode(_get_plot_test_model(), 100.0, 100.0))
+    assert actual[0].startswith("; estimated plot time: ")
+    assert actual[1:4] == ["G21\n", "G90\n", "G0 Z2\n"]
+    assert actual[-6:] == [
+        "M0 ; pen blue\n", "G1 X95 Y95 F4500\n", "G1 Z0 F1500\n",
+        "G1 X100 Y100\n", "G0 Z2\n", "M2\n"
+    ]
+
+
+def test_to_gcode_plot_time():
+    model = _get_plot_test_model()
+    paths_by_color = get_plot_paths(model, 100.0, 100.0)
+    for pen_time in (0.0, 2.5):
+        plot_time = get_plot_time(paths_by_color, 25.0, 75.0, pen_time)
+        header = next(
+            to_gcode(model, 100.0, 100.0, 25.0, 75.0, pen_time=pen_time))
+        assert header == f"; estimated plot time: {plot_time:.1f} s\n"
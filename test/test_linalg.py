@@ -6,8 +6,8 @@ from pytest import approx
 from vecgl.linalg import (angle_vec2, cwise_angle_vec2, get_frustum_mat4,
                           get_ortho_mat4, homogenious_vec4_to_vec3,
                           is_colinear_vec2, left_of_vec2, left_ortho_vec2,
-                          mul_mat4_vec4, ortho_vec2, right_of_vec2,
-                          right_ortho_vec2, scale_vec2,
+                          mul_mat4_vec4, mul_mat4_vec4s, ortho_vec2,
+                          right_of_vec2, right_ortho_vec2, scale_vec2,
                           vec3_to_homogenious_vec4)
 from vecgl.random import get_random_vec2
 
@@ -102,3 +102,11 @@ def test_cwise_angle_vec2():
     u = 0.0, 1.0
     v = -1.0, 1.0
     assert cwise_angle_vec2(u, v) == approx(-0.25 * pi)
+
+
+def test_mul_mat4_vec4s():
+    U = get_frustum_mat4(-2.0, 2.0, -1.0, 1.0, 1.0, 3.0)
+    vs = [(1.0, -1.0, -3.0, 1.0), (0.5, 0.25, -2.0, 1.0), (0.0, 0.0, 0.0, 0.0)]
+    expected = [mul_mat4_vec4(U, v) for v in vs]
+    actual = mul_mat4_vec4s(U, vs)
+    assert expected == actual
@@ -0,0 +1,312 @@
+from pytest import raises
+
+from vecgl.linalg import (get_frustum_mat4, get_rotate_x_mat4,
+                          get_translate_mat4, get_translate_x_mat4, mul_mat4)
+from vecgl.model import (IndexedModel, Line, Model, TransformedModel,
+                         expand_instances, kDefaultLineColor)
+from vecgl.modellib import get_sphere_model
+from vecgl.transforms import get_indexed_model
+
+
+def _get_test_model() -> Model:
+    model = get_sphere_model(4, 8)
+    model.add_point((0.5, 1.0, 0.0), "red")
+    model.add_point((-0.5, -0.5, 0.5, 2.0), "blue")
+    return model
+
+
+def test_transform_matches_reference():
+    model = _get_test_model()
+    U = mul_mat4(get_frustum_mat4(-1.0, 1.0, -1.0, 1.0, 1.0, 100.0),
+                 get_translate_mat4(0.0, 0.0, -3.0), get_rotate_x_mat4(0.3))
+    transformed = model.transform(U)
+
+    # The batched transform must be identical to transforming each primitive
+    # individually.
+    assert len(transformed.points) == len(model.points)
+    for pt, expected in zip(transformed.points, model.points):
+        expected = expected.transform(U)
+        assert pt.p == expected.p and pt.color == expected.color
+    assert len(transformed.lines) == len(model.lines)
+    for ln, expected in zip(transformed.lines, model.lines):
+        assert ln == expected.transform(U)
+    assert len(transformed.triangles) == len(model.triangles)
+    for tr, expected in zip(transformed.triangles, model.triangles):
+        expected = expected.transform(U)
+        assert (tr.p, tr.q, tr.r) == (expected.p, expected.q, expected.r)
+        assert tr.color == expected.color
+
+
+def test_transform_empty_model():
+    transformed = Model().transform(get_rotate_x_mat4(0.3))
+    assert transformed.points == []
+    assert transformed.lines == []
+    assert transformed.triangles == []
+
+
+def test_indexed_model():
+    model = IndexedModel()
+    i = model.add_vertex((0.0, 0.0, 0.0))
+    j = model.add_vertex((1.0, 0.0, 0.0))
+    k = model.add_vertex((0.0, 1.0, 0.0, 1.0))
+    model.add_point(i, "red")
+    model.add_line(i, j, "green")
+    model.add_line(j, k)
+    model.add_triangle(i, j, k, "blue")
+    assert model.num_vertices == 3
+    assert model.get_vertices() == [(0.0, 0.0, 0.0, 1.0), (1.0, 0.0, 0.0, 1.0),
+                                    (0.0, 1.0, 0.0, 1.0)]
+    assert model.get_vertex(1) == (1.0, 0.0, 0.0, 1.0)
+    assert model.palette == ["red", "green", kDefaultLineColor, "blue"]
+    assert [(pt.p, pt.color)
+            for pt in model.points] == [((0.0, 0.0, 0.0, 1.0), "red")]
+    assert model.lines == (
+        Line((0.0, 0.0, 0.0, 1.0), (1.0, 0.0, 0.0, 1.0), "green"),
+        Line((1.0, 0.0, 0.0, 1.0), (0.0, 1.0, 0.0, 1.0), kDefaultLineColor),
+    )
+    assert len(model.triangles) == 1
+
+
+def test_indexed_model_transform_matches_model():
+    model = _get_test_model()
+    indexed_model = get_indexed_model(model)
+    assert indexed_model.num_vertices == 4 * 8 + 2 + 2
+    U = mul_mat4(get_frustum_mat4(-1.0, 1.0, -1.0, 1.0, 1.0, 100.0),
+                 get_translate_mat4(0.0, 0.0, -3.0), get_rotate_x_mat4(0.3))
+    expected = model.transform(U)
+    actual = indexed_model.transform(U)
+    assert [pt.p for pt in actual.points] == [pt.p for pt in expected.points]
+    assert list(actual.lines) == expected.lines
+    assert [(tr.p, tr.q, tr.r, tr.color) for tr in actual.triangles
+            ] == [(tr.p, tr.q, tr.r, tr.color) for tr in expected.triangles]
+
+
+def test_indexed_model_primitives_are_read_only():
+    model = IndexedModel()
+    i = model.add_vertex((0.0, 0.0, 0.0))
+    j = model.add_vertex((1.0, 0.0, 0.0))
+    model.add_line(i, j)
+    with raises(AttributeError):
+        model.lines.append(
+            Line((0.0, 0.0, 0.0, 1.0), (0.0, 1.0, 0.0, 1.0),
+                 kDefaultLineColor))
+    assert len(model.lines) == 1
+    assert model.points == ()
+    assert model.triangles == ()
+    assert model.instances == ()
+
+
+def test_indexed_model_primitives_are_cached():
+    model = get_indexed_model(_get_test_model())
+    assert model.num_points == 2
+    assert model.num_lines == len(model.lines)
+    assert model.num_triangles == len(model.triangles)
+    assert model.triangles is model.triangles
+    assert model.points is model.points
+    triangles = model.triangles
+    i = model.add_vertex((0.0, 0.0, 0.0))
+    model.add_triangle(i, i, i)
+    assert model.num_triangles == len(triangles) + 1
+    assert len(model.triangles) == len(triangles) + 1
+    assert model.triangles[0] is not triangles[0]
+
+
+def test_num_primitives():
+    model = _get_test_model()
+    assert model.num_points == 2
+    assert model.num_triangles == len(model.triangles)
+    transformed = model.transform(get_translate_x_mat4(1.0))
+    assert transformed.num_points == 2
+    assert transformed.num_triangles == model.num_triangles
+    assert transformed._transformed is None
+
+
+def test_non_string_colors_are_passed_through():
+    color = (255, 0, 0)
+    model = Model()
+    model.add_point((0.0, 0.0, 0.0), color)
+    model.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), color)
+    model.add_triangle((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0),
+                       color)
+    model.add_lines_array([(0.0, 0.0, 0.0)], [(0.0, 1.0, 0.0)], [color])
+    assert model.points[0].color is color
+    assert model.lines[0].color is color
+    assert model.triangles[0].color is color
+    assert model.lines[1].color is color
+
+
+def test_primitives_have_no_instance_dict():
+    model = _get_test_model()
+    for primitive in (model.points[0], model.lines[0], model.triangles[0]):
+        assert not hasattr(primitive, "__dict__")
+
+
+def test_indexed_model_palette():
+    model = IndexedModel()
+    i = model.add_vertex((0.0, 0.0, 0.0))
+    j = model.add_vertex((1.0, 0.0, 0.0))
+    for _ in range(16):
+        model.add_line(i, j, "red")
+        model.add_line(j, i, "green")
+    assert model.palette == ["red", "green"]
+    assert list(model.line_colors) == [0, 1] * 16
+    transformed = model.transform(get_rotate_x_mat4(0.3)).materialize()
+    assert transformed.palette == model.palette
+    assert [ln.color for ln in transformed.lines] == ["red", "green"] * 16
+
+
+def test_transforms_are_lazy_and_folded():
+    model = _get_test_model()
+    A = get_rotate_x_mat4(0.3)
+    B = get_translate_mat4(0.0, 0.0, -3.0)
+    C = get_frustum_mat4(-1.0, 1.0, -1.0, 1.0, 1.0, 100.0)
+    transformed = model.transform(B, A).transform(C)
+    assert isinstance(transformed, TransformedModel)
+    assert transformed.model.lines == model.lines
+    assert transformed.U == mul_mat4(C, B, A)
+
+    # Primitives are transformed once, on first access.
+    lines = transformed.lines
+    assert transformed.lines == lines
+    assert len(lines) == len(model.lines)
+    assert transformed.materialize() is transformed.materialize()
+    for ln, expected in zip(lines, model.lines):
+        expected = expected.transform(mul_mat4(C, B, A))
+        assert ln == expected
+
+
+def test_transformed_model_is_a_snapshot():
+    model = _get_test_model()
+    num_lines = len(model.lines)
+    transformed = model.transform(get_translate_x_mat4(1.0))
+    model.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+    model.add_instance(model, get_translate_x_mat4(2.0))
+    assert transformed.num_lines == num_lines
+    assert len(transformed.lines) == num_lines
+    assert transformed.instances == []
+
+    # The same holds for indexed models.
+    indexed_model = get_indexed_model(_get_test_model())
+    transformed = indexed_model.transform(get_translate_x_mat4(1.0))
+    indexed_model.add_line(0, 1)
+    assert transformed.num_lines == num_lines
+    assert len(transformed.materialize().lines) == num_lines
+
+
+def test_transformed_model_can_be_changed():
+    other = Model()
+    other.add_line((0.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    for model in (_get_test_model(), get_indexed_model(_get_test_model())):
+        num_lines = model.num_lines
+        transformed = model.transform(get_translate_x_mat4(1.0))
+        transformed.add_model(other)
+        transformed.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+        transformed.add_instance(other, get_translate_x_mat4(2.0))
+        assert transformed.num_lines == num_lines + 2
+        assert transformed.lines[-2] == other.lines[0]
+        assert len(transformed.instances) == 1
+        assert model.num_lines == num_lines
+
+        # Further transforms apply to the changed model as of then.
+        moved = transformed.transform(get_translate_x_mat4(1.0))
+        transformed.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+        assert moved.num_lines == num_lines + 2
+        assert moved.lines[-2] == other.lines[0].transform(
+            get_translate_x_mat4(1.0))
+        assert len(moved.instances) == 1
+
+
+def test_instances():
+    mesh = _get_test_model()
+    model = Model()
+    model.add_line((0.0, 0.0, 0.0), (1.0, 1.0, 1.0))
+    for i in range(3):
+        model.add_instance(mesh, get_translate_x_mat4(2.0 * i))
+    assert len(model.lines) == 1
+    assert len(model.instances) == 3
+    assert all(inst.model is mesh for inst in model.instances)
+    with raises(TypeError, match="U"):
+        model.add_instance(mesh)
+
+    # Transforming the model composes the instance transforms.
+    U = get_rotate_x_mat4(0.3)
+    transformed = model.transform(U)
+    for inst, transformed_inst in zip(model.instances, transformed.instances):
+        assert transformed_inst.model is mesh
+        assert transformed_inst.U == mul_mat4(U, inst.U)
+
+    # Expanding the instances yields all primitives.
+    expected = Model()
+    expected.add_line((0.0, 0.0, 0.0), (1.0, 1.0, 1.0))
+    for i in range(3):
+        expected.add_model(mesh.transform(get_translate_x_mat4(2.0 * i)))
+    expanded = expand_instances(model)
+    assert expanded.lines == expected.lines
+    assert len(expanded.points) == len(expected.points)
+    assert len(expanded.triangles) == len(expected.triangles)
+    assert expand_instances(mesh) is mesh
+
+
+class _ArrayLike:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def tolist(self):
+        return [list(r) for r in self.rows]
+
+
+def test_add_lines_array():
+    ps = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0)]
+    qs = _ArrayLike([(1.0, 0.0, 0.0, 1.0), (1.0, 1.0, 0.0, 1.0)])
+    expected = Model()
+    expected.add_line(ps[0], qs.rows[0], "red")
+    expected.add_line(ps[1], qs.rows[1], "green")
+    model = Model()
+    model.add_lines_array(ps, qs, ["red", "green"])
+    assert model.lines == expected.lines
+    indexed = IndexedModel()
+    indexed.add_lines_array(ps, qs, ["red", "green"])
+    assert list(indexed.lines) == expected.lines
+    model.add_lines_array(ps, ps)
+    assert [ln.color for ln in model.lines[2:]] == [kDefaultLineColor] * 2
+
+
+def test_add_triangles_array():
+    vs = _ArrayLike([(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0),
+                     (1.0, 1.0, 0.0)])
+    faces = _ArrayLike([(0, 1, 2), (1, 3, 2)])
+    model = Model()
+    model.add_triangles_array(vs, faces, "blue")
+    indexed = IndexedModel()
+    indexed.add_vertex((5.0, 5.0, 5.0))
+    indexed.add_triangles_array(vs, faces, "blue")
+    assert indexed.num_vertices == 5
+    for tr, indexed_tr in zip(model.triangles, indexed.triangles):
+        assert (tr.p, tr.q, tr.r) == (indexed_tr.p, indexed_tr.q, indexed_tr.r)
+        assert tr.color == indexed_tr.color == "blue"
+    assert (model.triangles[1].q) == (1.0, 1.0, 0.0, 1.0)
+
+
+def test_add_arrays_invalid():
+    model = Model()
+    with raises(ValueError):
+        model.add_lines_array([(0.0, 0.0, 0.0)], [(1.0, 0.0, 0.0)],
+                              ["red", "green"])
+    indexed = IndexedModel()
+    with raises(ValueError):
+        indexed.add_triangles_array([(0.0, 0.0, 0.0)], [(0, 0, 1)])
+    assert indexed.num_vertices == 0
+    vs = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0)]
+    for faces in ([(0, 1, -1)], [(0, 1)], [(0, 1, 2, 0)], [(0, 1, 3)]):
+        with raises(ValueError):
+            model.add_triangles_array(vs, faces)
+        with raises(ValueError):
+            indexed.add_triangles_array(vs, faces)
+    assert model.triangles == []
+    assert indexed.num_vertices == 0
+    for ps in ([(0.0, 0.0)], [(0.0, 0.0, 0.0, 1.0, 0.0)]):
+        with raises(ValueError):
+            model.add_lines_array(ps, ps)
+        with raises(ValueError):
+            indexed.add_vertices_array(ps)
@@ -1,8 +1,11 @@
-from vecgl.linalg import (get_frustum_mat4, get_rotate_y_mat4,
+from vecgl.linalg import (get_frustum_mat4, get_rotate_x_mat4,
+                          get_rotate_y_mat4, get_scale_mat4,
                           get_translate_mat4, mul_mat4)
-from vecgl.model import Model
-from vecgl.modellib import get_cube_model
-from vecgl.rendering import render
+from vecgl.model import Model, expand_instances
+from vecgl.modellib import get_cube_model, get_sphere_model
+from vecgl.rendering import (create_flat_triangle_tree, render, render_part,
+                             render_progressively)
+from vecgl.transforms import get_indexed_model
 
 
 def test_render_points_outside_of_clipping_space():
@@ -284,3 +287,75 @@ def test_rendering_bas_triangle():
     model.add_triangle((-0.5, 0.5, -0.1), (0.5, -0.5, -0.1), (-0.1, 0.1, -0.1))
     rendered = render(model)
     assert len(rendered.lines) == 1
+
+
+def test_render_indexed_sphere():
+    sphere = get_sphere_model()
+    view_mat4 = mul_mat4(get_translate_mat4(0.0, 0.0, -3.0),
+                         get_rotate_y_mat4(0.5))
+    projection_mat4 = get_frustum_mat4(-1.0, 1.0, -1.0, 1.0, 1.0, 100.0)
+    transform_mat4 = mul_mat4(projection_mat4, view_mat4)
+    expected = render(sphere.transform(transform_mat4))
+    actual = render(get_indexed_model(sphere).transform(transform_mat4))
+    assert actual.lines == expected.lines
+    assert len(actual.points) == len(expected.points)
+    assert len(actual.triangles) == len(expected.triangles)
+
+
+def test_render_instances():
+    cube = get_cube_model()
+    model = Model()
+    for i in range(-2, 3):
+        model.add_instance(cube, get_translate_mat4(2.5 * i, 0.0, 0.0))
+    view_mat4 = mul_mat4(get_translate_mat4(0.0, 0.0, -6.0),
+                         get_rotate_y_mat4(0.5))
+    projection_mat4 = get_frustum_mat4(-1.0, 1.0, -1.0, 1.0, 1.0, 100.0)
+    model_in_ndc = model.transform(projection_mat4, view_mat4)
+    expected = render(expand_instances(model_in_ndc))
+    actual = render(model_in_ndc)
+    assert actual.lines == expected.lines
+    assert len(actual.triangles) == len(expected.triangles)
+
+
+def test_render_instances_outside_of_clipping_space():
+    cube = get_cube_model()
+    model = Model()
+    model.add_instance(cube, get_scale_mat4(0.5, 0.5, 0.5))
+    model.add_instance(cube, get_translate_mat4(3.0, 0.0, 0.0),
+                       get_scale_mat4(0.5, 0.5, 0.5))
+    rendered = render(model)
+    expected = render(cube.transform(get_scale_mat4(0.5, 0.5, 0.5)))
+    assert rendered.lines == expected.lines
+    assert len(rendered.triangles) == 12
+
+    # Triangles outside of the clipping space are dropped alike.
+    model = expand_instances(model)
+    rendered = render(model)
+    assert rendered.lines == expected.lines
+    assert len(rendered.triangles) == 12
+
+
+def test_render_progressively():
+    model = get_sphere_model(8, 16).transform(get_rotate_x_mat4(0.3))
+    rendered = render(model)
+    chunks = list(render_progressively(model, 16))
+    assert len(chunks) == 1 + (len(model.lines) + 15) // 16
+    assert [ln for chunk in chunks for ln in chunk.lines] == rendered.lines
+    assert [pt.p for chunk in chunks
+            for pt in chunk.points] == [pt.p for pt in rendered.points]
+    assert len([tr for chunk in chunks
+                for tr in chunk.triangles]) == len(rendered.triangles)
+
+
+def test_render_part_with_flat_triangle_tree():
+    model = get_indexed_model(get_sphere_model(8, 16)).transform(
+        get_rotate_x_mat4(0.3))
+    rendered = render(model)
+    tree = create_flat_triangle_tree(model)
+    for flat_triangle_tree in (None, tree):
+        parts = [
+            render_part(model, i, 3, flat_triangle_tree) for i in range(3)
+        ]
+        assert [ln for part in parts for ln in part.lines] == rendered.lines
+        assert len(parts[0].points) == len(rendered.points)
+        assert len(parts[0].triangles) == len(rendered.triangles)
@@ -0,0 +1,139 @@
+from typing import Dict, Tuple
+
+from pytest import raises
+
+from vecgl.linalg import (Vec4, get_scale_mat4, homogenious_vec4_to_vec3,
+                          norm2_vec3)
+from vecgl.model import Model
+from vecgl.modellib import get_heart_model, get_sphere_model
+from vecgl.transforms import (get_indexed_model, get_simplified_model,
+                              get_welded_model)
+
+
+def test_welded_model_removes_duplicates():
+    model = Model()
+    noise = 1e-9
+    model.add_point((0.0, 0.0, 0.0))
+    model.add_point((noise, 0.0, -noise))
+    model.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+    model.add_line((1.0, noise, 0.0), (0.0, 0.0, noise))
+    model.add_line((0.0, 0.0, 0.0), (noise, noise, noise))
+    model.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), "red")
+    model.add_triangle((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    model.add_triangle((0.0, 1.0, 0.0), (0.0, 0.0, noise), (1.0, 0.0, 0.0))
+    model.add_triangle((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (2.0, 0.0, 0.0))
+    welded_model, report = get_welded_model(model)
+    assert len(welded_model.points) == 1
+    assert len(welded_model.lines) == 2
+    assert len(welded_model.triangles) == 1
+    assert report.num_unique_vertices == 4
+    assert report.num_duplicate_points == 1
+    assert report.num_duplicate_lines == 1
+    assert report.num_degenerate_lines == 1
+    assert report.num_duplicate_triangles == 1
+    assert report.num_degenerate_triangles == 1
+    assert report.num_removed_primitives() == 5
+    assert welded_model.lines[0].p is welded_model.triangles[0].p
+
+
+def test_welded_model_keeps_clean_models():
+    model = get_sphere_model(4, 8)
+    welded_model, report = get_welded_model(model)
+    assert report.num_removed_primitives() == 0
+    assert report.num_welded_vertices == 0
+    assert report.num_unique_vertices == get_indexed_model(model).num_vertices
+    assert welded_model.lines == model.lines
+    assert len(welded_model.triangles) == len(model.triangles)
+
+
+def test_welded_model_with_tolerance():
+    model = Model()
+    model.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+    model.add_line((1.05, 0.0, 0.0), (2.0, 0.0, 0.0))
+    model.add_line((2.0, 0.0, 0.0), (2.0, 0.09, 0.0))
+    welded_model, report = get_welded_model(model, eps=0.1)
+    assert len(welded_model.lines) == 2
+    assert welded_model.lines[0].q == welded_model.lines[1].p
+    assert report.num_welded_vertices == 2
+    assert report.num_degenerate_lines == 1
+
+
+def test_welded_model_degenerate_triangles_with_tolerance():
+    model = Model()
+    model.add_triangle((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    model.add_triangle((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.05, 0.05, 0.0))
+    model.add_triangle((0.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 1.5, 0.0))
+    welded_model, report = get_welded_model(model, eps=0.1)
+    assert len(welded_model.triangles) == 1
+    assert report.num_degenerate_triangles == 2
+    welded_model, report = get_welded_model(model, eps=1e-3)
+    assert len(welded_model.triangles) == 2
+    assert report.num_degenerate_triangles == 1
+
+
+def test_welded_model_without_tolerance():
+    model = Model()
+    model.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+    model.add_line((1e-12, 0.0, 0.0), (1.0, 0.0, 0.0))
+    model.add_line((0.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+    welded_model, report = get_welded_model(model, eps=0.0)
+    assert len(welded_model.lines) == 2
+    assert report.num_unique_vertices == 3
+    assert report.num_duplicate_lines == 1
+    with raises(ValueError):
+        get_welded_model(model, eps=-1.0)
+
+
+def test_welded_model_at_small_scale():
+    model = get_sphere_model(8, 16).transform(get_scale_mat4(1e-4, 1e-4, 1e-4))
+    num_triangles = len(model.triangles)
+    for eps in (0.0, 1e-9):
+        welded_model, report = get_welded_model(model, eps)
+        assert report.num_degenerate_triangles == 0
+        assert len(welded_model.triangles) == num_triangles
+    simplified_model = get_simplified_model(model, max_triangles=64)
+    assert 0 < len(simplified_model.triangles) <= 64
+
+
+def test_simplified_sphere():
+    model = get_sphere_model(16, 32)
+    simplified_model = get_simplified_model(model, max_triangles=64)
+    assert len(simplified_model.triangles) <= 64
+    assert len(simplified_model.lines) < len(model.lines)
+
+    # The simplified mesh stays closed and close to the unit sphere.
+    edge_counts: Dict[Tuple[Vec4, Vec4], int] = {}
+    for tr in simplified_model.triangles:
+        for p, q in ((tr.p, tr.q), (tr.q, tr.r), (tr.r, tr.p)):
+            edge = (p, q) if p < q else (q, p)
+            edge_counts[edge] = edge_counts.get(edge, 0) + 1
+            assert 0.9 < norm2_vec3(homogenious_vec4_to_vec3(p)) <= 1.0
+    assert all(count == 2 for count in edge_counts.values())
+
+
+def test_simplified_mesh_lines():
+    for n, m in ((16, 32), (32, 64)):
+        model = get_sphere_model(n, m)
+        simplified_model = get_simplified_model(model, 256, 256)
+        assert len(simplified_model.triangles) <= 256
+        assert len(simplified_model.lines) == 256
+
+
+def test_simplified_line_chain():
+    model = get_heart_model(64)
+    simplified_model = get_simplified_model(model, max_lines=16)
+    assert len(simplified_model.lines) == 16
+
+    # The chain stays closed.
+    degrees: Dict[Vec4, int] = {}
+    for ln in simplified_model.lines:
+        for p in (ln.p, ln.q):
+            degrees[p] = degrees.get(p, 0) + 1
+    assert all(degree == 2 for degree in degrees.values())
+
+
+def test_simplified_model_without_targets():
+    model = get_sphere_model(4, 8)
+    simplified_model = get_simplified_model(model)
+    assert len(simplified_model.triangles) == len(model.triangles)
+    assert len(simplified_model.lines) == len(model.lines)
@@ -0,0 +1,481 @@
+from threading import Event
+from threading import enumerate as enumerate_threads
+from time import monotonic, sleep
+from types import SimpleNamespace
+
+from pytest import raises
+
+from vecgl import viewer
+from vecgl.model import Model
+from vecgl.modellib import get_cube_model
+from vecgl.rendering import render
+from vecgl.viewer import (_BackgroundRenderer, _CanvasPainter,
+                          _get_camera_state, _RedrawScheduler, _RenderCache,
+                          kRenderChunk, kRenderDone, kRenderFailed)
+
+
+def _wait_for_results(renderer: _BackgroundRenderer, generation: int):
+
+    # Collect the results until the given generation is done or failed.
+    results = []
+    for _ in range(500):
+        results += renderer.poll()
+        if any(g == generation and kind != kRenderChunk
+               for g, kind, _ in results):
+            return results
+        sleep(0.01)
+    raise TimeoutError()
+
+
+def test_background_renderer_drops_superseded_requests():
+    started = Event()
+    proceed = Event()
+    rendered_models = []
+
+    def render_fn(model):
+        rendered_models.append(model)
+        started.set()
+        proceed.wait()
+        return [model]
+
+    # Block the first render and queue two more requests. Only the latest of
+    # the queued requests must be rendered.
+    renderer = _BackgroundRenderer(render_fn)
+    models = [Model() for _ in range(3)]
+    renderer.submit(1, models[0])
+    started.wait()
+    renderer.submit(2, models[1])
+    renderer.submit(3, models[2])
+    proceed.set()
+    results = _wait_for_results(renderer, 3)
+    assert rendered_models == [models[0], models[2]]
+    assert results[-2:] == [(3, kRenderChunk, models[2]),
+                            (3, kRenderDone, None)]
+
+
+def test_background_renderer_stops_cancelled_requests():
+    proceed = Event()
+
+    def render_fn(model):
+        for i in range(10):
+            yield model
+            proceed.wait()
+
+    # Cancel while the first chunk is being rendered. No further chunks must
+    # be rendered.
+    renderer = _BackgroundRenderer(render_fn)
+    renderer.submit(1, Model())
+    for _ in range(500):
+        results = renderer.poll()
+        if results:
+            break
+        sleep(0.01)
+    renderer.cancel(1)
+    proceed.set()
+    renderer.submit(2, Model())
+    results += _wait_for_results(renderer, 2)
+    assert [kind for g, kind, _ in results if g == 1] == [kRenderChunk]
+    assert [kind for g, kind, _ in results
+            if g == 2] == [kRenderChunk] * 10 + [kRenderDone]
+
+
+def test_background_renderer_reports_failures():
+
+    def render_fn(model):
+        raise RuntimeError("failed")
+
+    renderer = _BackgroundRenderer(render_fn)
+    renderer.submit(1, Model())
+    assert _wait_for_results(renderer, 1) == [(1, kRenderFailed, None)]
+
+
+def test_background_renderer_stops():
+    proceed = Event()
+
+    def render_fn(model):
+        for i in range(10):
+            yield model
+            proceed.wait()
+
+    # Stop while a request is in progress. The thread must end after the
+    # current chunk.
+    renderer = _BackgroundRenderer(render_fn)
+    renderer.submit(1, Model())
+    renderer.stop()
+    proceed.set()
+    renderer._thread.join(5.0)
+    assert not renderer._thread.is_alive()
+    assert len(renderer.poll()) <= 1
+
+    # Idle renderers end right away.
+    renderer = _BackgroundRenderer(render_fn)
+    renderer.stop()
+    renderer._thread.join(5.0)
+    assert not renderer._thread.is_alive()
+
+
+class _FakeCanvas:
+
+    def __init__(self):
+        self.items = {}
+
+    def configure(self, **options):
+        pass
+
+    def _create(self, coords, options):
+        item = len(self.items) + 1
+        self.items[item] = dict(options, coords=coords, state="normal")
+        return item
+
+    def create_polygon(self, *coords, **options):
+        return self._create(coords, options)
+
+    def create_line(self, *coords, **options):
+        return self._create(coords, options)
+
+    def create_text(self, *coords, **options):
+        return self._create(coords, options)
+
+    def coords(self, item, *coords):
+        self.items[item]["coords"] = coords
+
+    def itemconfigure(self, item, **options):
+        self.items[item].update(options)
+
+    def tag_raise(self, tag):
+        pass
+
+    def pack(self):
+        pass
+
+    def get_visible(self, tag):
+        return [
+            item for item in self.items.values()
+            if item.get("tags") == tag and item["state"] == "normal"
+        ]
+
+
+def test_canvas_painter_reuses_items():
+    canvas = _FakeCanvas()
+    painter = _CanvasPainter(canvas, 100, 100, "white", 1)
+    cube = get_cube_model()
+    painter.paint(cube, "text")
+    num_items = len(canvas.items)
+    assert len(canvas.get_visible("line")) == len(cube.lines)
+    assert len(canvas.get_visible("triangle")) == len(cube.triangles)
+
+    # Fewer primitives hide the surplus items and more primitives reuse them.
+    model = Model()
+    model.add_line((0.0, 0.0, 0.0), (1.0, 1.0, 0.0), "red")
+    painter.paint(model)
+    assert len(canvas.items) == num_items
+    lines = canvas.get_visible("line")
+    assert len(lines) == 1
+    assert lines[0]["coords"] == (50.0, 50.0, 100.0, 0.0)
+    assert lines[0]["fill"] == "red"
+    assert canvas.get_visible("triangle") == []
+    for _ in range(3):
+        painter.paint(cube)
+    assert len(canvas.items) == num_items
+    assert len(canvas.get_visible("line")) == len(cube.lines)
+
+
+def test_canvas_painter_paints_chunks():
+    canvas = _FakeCanvas()
+    painter = _CanvasPainter(canvas, 100, 100, "white", 1)
+    cube = get_cube_model()
+    painter.paint(cube)
+
+    # Items of the previous frame are hidden once the first chunk is finished.
+    model = Model()
+    model.add_line((0.0, 0.0, 0.0), (1.0, 1.0, 0.0), "red")
+    painter.begin()
+    painter.add(model)
+    painter.finish("Rendering...")
+    assert len(canvas.get_visible("line")) == 1
+    assert canvas.get_visible("triangle") == []
+    painter.add(model)
+    painter.add(model)
+    painter.finish()
+    assert len(canvas.get_visible("line")) == 3
+
+
+def test_render_cache_evicts_least_recently_used():
+    cache = _RenderCache(2)
+    a, b, c = Model(), Model(), Model()
+    cache.put((0, 0, 0), [a])
+    cache.put((1, 0, 0), [b])
+    assert cache.get((0, 0, 0)) == [a]
+    cache.put((2, 0, 0), [c])
+    assert len(cache) == 2
+    assert cache.get((1, 0, 0)) is None
+    assert cache.get((0, 0, 0)) == [a]
+    assert cache.get((2, 0, 0)) == [c]
+    assert cache.num_hits == 3
+    assert cache.num_misses == 1
+    assert str(cache) == "Render cache: 3/4 hits (75%)"
+
+
+def test_render_cache_disabled():
+    cache = _RenderCache(0)
+    cache.put((0, 0, 0), [Model()])
+    assert len(cache) == 0
+    assert cache.get((0, 0, 0)) is None
+
+
+def test_camera_state_is_quantized():
+    assert _get_camera_state(0.1, 0.2,
+                             1.0) == _get_camera_state(0.1 + 1e-6, 0.2 - 1e-6,
+                                                       1.0)
+    assert _get_camera_state(0.1, 0.2,
+                             1.0) != _get_camera_state(0.1, 0.2, 1.01)
+
+
+class _FakeWidget:
+
+    def __init__(self):
+        self.time = 0.0
+        self.jobs = {}
+
+    def after(self, delay, fn):
+        job = f"after#{len(self.jobs)}"
+        self.jobs[job] = self.time + delay / 1000.0, fn
+        return job
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+    def advance(self, dt):
+
+        # Run the due jobs in order.
+        self.time += dt
+        while True:
+            due = [(t, job) for job, (t, _) in self.jobs.items()
+                   if t <= self.time]
+            if not due:
+                return
+            _, job = min(due)
+            _, fn = self.jobs.pop(job)
+            fn()
+
+
+def test_redraw_scheduler_coalesces_requests():
+    widget = _FakeWidget()
+    calls = []
+    scheduler = _RedrawScheduler(widget, lambda: calls.append("redraw"),
+                                 lambda: calls.append("idle"), 10.0, 300,
+                                 lambda: widget.time)
+
+    # The first request is drawn right away. Later requests within the same
+    # frame interval are coalesced into one redraw.
+    scheduler.request()
+    widget.advance(0.0)
+    assert calls == ["redraw"]
+    for _ in range(5):
+        scheduler.request()
+        widget.advance(0.01)
+    assert calls == ["redraw"]
+    widget.advance(0.1)
+    assert calls == ["redraw", "redraw"]
+
+    # The idle function follows once there were no requests for a while.
+    widget.advance(0.2)
+    assert calls == ["redraw", "redraw"]
+    widget.advance(0.1)
+    assert calls == ["redraw", "redraw", "idle"]
+    assert widget.jobs == {}
+
+
+def test_redraw_scheduler_cancels_idle():
+    widget = _FakeWidget()
+    calls = []
+    scheduler = _RedrawScheduler(widget, lambda: calls.append("redraw"),
+                                 lambda: calls.append("idle"), 10.0, 300,
+                                 lambda: widget.time)
+    scheduler.redraw()
+    scheduler.cancel_idle()
+    widget.advance(1.0)
+    assert calls == ["redraw"]
+    scheduler.redraw()
+    scheduler.redraw()
+    widget.advance(1.0)
+    assert calls == ["redraw"] * 3 + ["idle"]
+
+
+def test_redraw_scheduler_without_idle():
+    widget = _FakeWidget()
+    calls = []
+    scheduler = _RedrawScheduler(widget, lambda: calls.append("redraw"),
+                                 lambda: calls.append("idle"), 10.0, None)
+    scheduler.redraw()
+    assert widget.jobs == {}
+    with raises(ValueError):
+        _RedrawScheduler(widget, lambda: None, lambda: None, 0.0, None)
+
+
+class _FakeTk:
+
+    def __init__(self):
+        self.handlers = {}
+        self.jobs = {}
+        self.num_jobs = 0
+        self.canvas = _FakeCanvas()
+
+    def title(self, title):
+        pass
+
+    def bind(self, sequence, fn):
+        self.handlers[sequence] = fn
+
+    def after(self, delay, fn):
+        self.num_jobs += 1
+        job = f"after#{self.num_jobs}"
+        self.jobs[job] = monotonic() + delay / 1000.0, fn
+        return job
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+    def run_until_idle(self):
+
+        # Run the scheduled jobs in real time, as the background threads do,
+        # until there are none left.
+        deadline = monotonic() + 10.0
+        while self.jobs:
+            if monotonic() > deadline:
+                raise TimeoutError()
+            now = monotonic()
+            due = [(t, job) for job, (t, _) in self.jobs.items() if t <= now]
+            if not due:
+                sleep(0.005)
+                continue
+            _, job = min(due)
+            _, fn = self.jobs.pop(job)
+            fn()
+
+    def fire(self, sequence, **event):
+        self.handlers[sequence](SimpleNamespace(**event))
+        self.run_until_idle()
+
+    def get_text(self):
+        return [
+            item["text"] for item in self.canvas.items.values()
+            if "text" in item
+        ][0]
+
+    def mainloop(self):
+        self.scenario(self)
+
+
+def _show_interactively(monkeypatch, scenario, model, **kwargs):
+    frame = _FakeTk()
+    frame.scenario = scenario
+    monkeypatch.setattr(viewer, "Tk", lambda: frame)
+    monkeypatch.setattr(viewer, "Canvas", lambda *args, **kwargs: frame.canvas)
+    viewer.show_interactively(model, **kwargs)
+
+
+def test_show_interactively(monkeypatch):
+    done = []
+
+    def scenario(frame):
+
+        # The initial view is rendered progressively.
+        frame.run_until_idle()
+        assert frame.get_text() == "Render cache: 0/1 hits (0%)"
+        assert len(frame.canvas.get_visible("line")) > 0
+
+        # Rotate and return to the initial view, which is cached.
+        frame.fire("<Button-1>", x=0, y=0)
+        frame.fire("<B1-Motion>", x=10, y=0)
+        frame.fire("<B1-Motion>", x=0, y=0)
+        frame.fire("<Key>", char=" ")
+        assert frame.get_text() == "Render cache: 3/5 hits (60%)"
+        done.append(True)
+
+    _show_interactively(monkeypatch, scenario, get_cube_model())
+    assert done
+
+
+def test_show_interactively_stops_its_threads(monkeypatch):
+    threads = set(enumerate_threads())
+    started_threads = set()
+
+    def scenario(frame):
+        frame.run_until_idle()
+        started_threads.update(set(enumerate_threads()) - threads)
+
+    # The background threads end once the viewer is closed.
+    for _ in range(3):
+        _show_interactively(monkeypatch, scenario, get_cube_model())
+    assert started_threads
+    for thread in started_threads:
+        thread.join(5.0)
+        assert not thread.is_alive()
+
+
+def test_show_interactively_renders_when_idle(monkeypatch):
+    texts = []
+
+    def scenario(frame):
+        frame.run_until_idle()
+        frame.fire("<Button-1>", x=0, y=0)
+        frame.fire("<B1-Motion>", x=10, y=0)
+        texts.append(frame.get_text())
+
+    # The full model is rendered once the camera is idle, unless opted out.
+    cube = get_cube_model()
+    _show_interactively(monkeypatch, scenario, cube, simple_model=cube)
+    _show_interactively(monkeypatch,
+                        scenario,
+                        cube,
+                        simple_model=cube,
+                        idle_render_delay=None)
+    assert texts == ["Render cache: 1/3 hits (33%)", "Press space to render"]
+
+
+def test_show_interactively_renders_cached_views_once(monkeypatch):
+    rendered_models = []
+    done = []
+
+    def render_fn(model):
+        rendered_models.append(model)
+        return render(model)
+
+    def scenario(frame):
+        frame.run_until_idle()
+        frame.fire("<Key>", char=" ")
+        frame.fire("<Button-4>")
+        frame.fire("<Button-5>")
+        assert len(rendered_models) == 2
+        done.append(True)
+
+    _show_interactively(monkeypatch,
+                        scenario,
+                        get_cube_model(),
+                        render_fn=render_fn)
+    assert done
+
+
+def test_show_interactively_reports_failures(monkeypatch):
+    done = []
+
+    def render_fn(model):
+        raise RuntimeError("failed")
+
+    def scenario(frame):
+        frame.run_until_idle()
+        assert frame.get_text() == "Rendering failed"
+        done.append(True)
+
+    _show_interactively(monkeypatch,
+                        scenario,
+                        get_cube_model(),
+                        render_fn=render_fn)
+    assert done
+    with raises(ValueError):
+        _show_interactively(monkeypatch,
+                            scenario,
+                            get_cube_model(),
+                            render_fn=render_fn,
+                            progressive=True)